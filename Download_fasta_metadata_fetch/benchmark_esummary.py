@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import argparse
+
+from download_viral_genomes_metadata_NCBI_fetch import summary_rows_xml, summary_rows_json
+
+__author__ = "Patricia Agudelo-Romero, PhD."
+
+XML_HEADER = ('<?xml version="1.0" encoding="UTF-8" ?>\n'
+              '<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary v1 20041029//EN" '
+              '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20041029/esummary-v1.dtd">\n')
+
+
+def make_responses(n_records):
+    """
+    Build esummary responses in the shape NCBI returns for nuccore (retmode=xml and retmode=json),
+    for when no recorded responses are given.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        n_records (int): Number of document summaries in each response.
+    Returns:
+        tuple: (XML response, JSON response) as bytes.
+    """
+    docs = []
+    result = {"uids": []}
+    for i in range(n_records):
+        uid = str(2000000000 + i)
+        accession = f"PX{i:06d}.1"
+        title = f"Synthetic phage {i}, complete genome"
+        docs.append(
+            f'<DocSum><Id>{uid}</Id><Item Name="Caption" Type="String">{accession[:-2]}</Item>'
+            f'<Item Name="Title" Type="String">{title}</Item><Item Name="Extra" Type="String">gi|{uid}|gb|{accession}|</Item>'
+            f'<Item Name="Gi" Type="Integer">{uid}</Item><Item Name="CreateDate" Type="Date">2024/01/02</Item>'
+            f'<Item Name="UpdateDate" Type="Date">2024/03/05</Item><Item Name="Flags" Type="Integer">0</Item>'
+            f'<Item Name="TaxId" Type="Integer">{10239 + i % 97}</Item><Item Name="Length" Type="Integer">150000</Item>'
+            f'<Item Name="Status" Type="String">live</Item><Item Name="ReplacedBy" Type="String"></Item>'
+            f'<Item Name="Comment" Type="String"><![CDATA[  ]]></Item>'
+            f'<Item Name="AccessionVersion" Type="String">{accession}</Item></DocSum>')
+        result["uids"].append(uid)
+        result[uid] = {
+            "uid": uid, "caption": accession[:-2], "title": title, "extra": f"gi|{uid}|gb|{accession}|",
+            "gi": int(uid), "createdate": "2024/01/02", "updatedate": "2024/03/05", "flags": "",
+            "taxid": 10239 + i % 97, "slen": 150000, "biomol": "genomic", "moltype": "dna",
+            "topology": "linear", "sourcedb": "insd", "genome": "genomic", "organism": f"Synthetic phage {i}",
+            "strain": "", "biosample": "", "accessionversion": accession,
+        }
+    xml = f"{XML_HEADER}<eSummaryResult>{''.join(docs)}</eSummaryResult>".encode()
+    return xml, json.dumps({"header": {"type": "esummary", "version": "0.3"}, "result": result}).encode()
+
+
+def time_parse(parse_rows, data, repeats):
+    """Parse the same response `repeats` times, as download_metadata does for every chunk."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        rows = parse_rows(data)
+    return len(rows) * repeats, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark XML versus JSON esummary parsing.")
+    parser.add_argument("--xml", help="Recorded esummary response (retmode=xml).")
+    parser.add_argument("--json", help="Recorded esummary response (retmode=json) for the same IDs.")
+    parser.add_argument("--records", type=int, default=500,
+                        help="Summaries per synthetic response (one chunk). Default: 500.")
+    parser.add_argument("--repeats", type=int, default=20, help="Times each response is parsed. Default: 20.")
+    args = parser.parse_args()
+
+    xml_data, json_data = make_responses(args.records)
+    if args.xml:
+        with open(args.xml, "rb") as in_f:
+            xml_data = in_f.read()
+    if args.json:
+        with open(args.json, "rb") as in_f:
+            json_data = in_f.read()
+
+    for name, parse_rows, data in (("XML (Entrez.read)", summary_rows_xml, xml_data),
+                                   ("JSON (json.loads)", summary_rows_json, json_data)):
+        rows, seconds = time_parse(parse_rows, data, args.repeats)
+        print(f"{name:18s} {len(data) / 1e6:6.2f} MB  {rows:8d} rows  {seconds:8.2f} s  {rows / seconds:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
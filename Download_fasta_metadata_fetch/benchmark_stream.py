@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import os
+import io
+import time
+import random
+import argparse
+import tempfile
+from Bio import SeqIO
+
+from download_viral_genomes_metadata_NCBI_fetch import copy_fasta_stream
+
+__author__ = "Patricia Agudelo-Romero, PhD."
+
+
+def write_fixture(path, n_genomes, genome_length, line_width=70, seed=1):
+    """
+    Write a synthetic efetch-style multi-FASTA fixture (NCBI wraps lines at 70 and
+    separates records with a blank line).
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        path (str): Output FASTA path.
+        n_genomes (int): Number of genomes.
+        genome_length (int): Length of each genome.
+        line_width (int): Sequence line width.
+        seed (int): Random seed.
+    """
+    rng = random.Random(seed)
+    block = "".join(rng.choice("ACGT") for _ in range(genome_length))
+    lines = "\n".join(block[i:i + line_width] for i in range(0, genome_length, line_width))
+    with open(path, "w") as out_f:
+        for i in range(n_genomes):
+            out_f.write(f">PX{i:06d}.1 Synthetic phage {i}, complete genome\n{lines}\n\n")
+
+
+def time_seqio(fixture, output):
+    """Parse the fixture with SeqIO and write it back out, as download_sequences does by default."""
+    start = time.perf_counter()
+    with open(fixture) as in_f, open(output, "w") as out_f:
+        data = in_f.read()  # download_sequences reads each chunk response into memory
+        records = 0
+        for record in SeqIO.parse(io.StringIO(data), "fasta"):
+            SeqIO.write(record, out_f, "fasta")
+            records += 1
+    return records, time.perf_counter() - start
+
+
+def time_passthrough(fixture, output):
+    """Copy the fixture with copy_fasta_stream, as download_sequences does with --stream."""
+    start = time.perf_counter()
+    with open(fixture, "rb") as in_f, open(output, "wb") as out_f:
+        records = copy_fasta_stream(in_f, out_f)
+    return records, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SeqIO parsing versus passthrough streaming of efetch FASTA.")
+    parser.add_argument("--genomes", type=int, default=500, help="Number of genomes in the fixture. Default: 500.")
+    parser.add_argument("--length", type=int, default=150000, help="Genome length (dsDNA phage scale). Default: 150000.")
+    parser.add_argument("--fixture", help="Existing FASTA fixture to use instead of a synthetic one.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixture = args.fixture
+        if not fixture:
+            fixture = os.path.join(tmp_dir, "fixture.fasta")
+            write_fixture(fixture, args.genomes, args.length)
+        size_mb = os.path.getsize(fixture) / 1e6
+        print(f"Fixture: {fixture} ({size_mb:.1f} MB)")
+
+        for name, func in (("SeqIO parse/write", time_seqio), ("passthrough stream", time_passthrough)):
+            records, seconds = func(fixture, os.path.join(tmp_dir, "out.fasta"))
+            print(f"{name:20s} {records:8d} records  {seconds:8.2f} s  {size_mb / seconds:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
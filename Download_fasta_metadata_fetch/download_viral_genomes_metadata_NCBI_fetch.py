@@ -1,16 +1,118 @@
 #!/usr/bin/env python3
 
 import os
+import io
+import sys
+import json
+import hashlib
 import argparse
 import csv
+import itertools
 import time
-import random
+import shutil
+import tempfile
+from datetime import datetime
+from collections import deque
+from contextlib import ExitStack, suppress
 from Bio import Entrez
 from Bio import SeqIO
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed for --parquet
+    pa = pq = None
+
+# Shared rate-limited E-utilities client (../eutils_client)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "eutils_client"))
+from eutils_client import EutilsClient
+
 __author__ = "Patricia Agudelo-Romero, PhD."
 
-def fetch_genome_ids(query, email, batch_size=5000, max_retries=5):
+EUTILS_TOOL = "download_viral_genomes"
+STREAM_BUFFER_SIZE = 1024 * 1024  # Bytes copied per read in streaming mode
+SPOOL_MAX_SIZE = 64 * 1024 * 1024  # Responses larger than this are spooled to a temporary file
+CHUNK_SIZE = 500  # IDs per efetch/esummary request
+VIRUSES_TAXID = "10239"  # Superset of every viral group
+METADATA_FIELDS = ["Accession", "Taxonomy ID", "Title", "Organism", "Length", "UpdateDate"]
+PARQUET_ROW_GROUP_SIZE = 64 * 1024  # Metadata rows per Parquet row group
+
+
+class HistorySearch:
+    """
+    Search result kept on the NCBI history server (WebEnv/query_key) instead of as a
+    client-side ID list. efetch/esummary read it in retstart/retmax windows.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        query (str): Search query for NCBI.
+        webenv (str): WebEnv returned by esearch.
+        query_key (str): query_key returned by esearch.
+        count (int): Number of records matched.
+        search_params (dict): Extra esearch parameters (e.g. a date window).
+    """
+
+    def __init__(self, query, webenv, query_key, count, search_params=None):
+        self.query = query
+        self.webenv = webenv
+        self.query_key = query_key
+        self.count = count
+        self.search_params = search_params or {}
+
+    def __len__(self):
+        return self.count
+
+    def params(self, start, end):
+        return {"WebEnv": self.webenv, "query_key": self.query_key, "retstart": start, "retmax": end - start}
+
+
+def chunk_params(genome_ids, start, end):
+    """Return the request parameters selecting records start..end of an ID list or HistorySearch."""
+    if isinstance(genome_ids, HistorySearch):
+        return genome_ids.params(start, end)
+    return {"id": ",".join(genome_ids[start:end])}
+
+
+def describe_record(genome_ids, position):
+    """Name a record of an ID list or HistorySearch for log messages."""
+    if isinstance(genome_ids, HistorySearch):
+        return f"record {position} of '{genome_ids.query}'"
+    return f"ID {genome_ids[position]}"
+
+
+def search_history(query, email, max_retries=5, client=None, **search_params):
+    """
+    Run a single esearch with usehistory=y and keep the result set on the NCBI history server.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        query (str): Search query for NCBI.
+        email (str): Email address for NCBI.
+        max_retries (int): Maximum retries for failed requests.
+        client (EutilsClient): Rate-limited E-utilities client (created from email if None).
+        **search_params: Extra esearch parameters (e.g. datetype, mindate, maxdate).
+    Returns:
+        HistorySearch: WebEnv, query_key and Count of the search.
+    """
+    Entrez.email = email
+    client = client or EutilsClient(email, tool=EUTILS_TOOL)
+    while True:
+        try:
+            print(f"Searching '{query}' on the NCBI history server...")
+            search_data = client.request("esearch", db="nuccore", term=query, usehistory="y", retmax=0,
+                                         **search_params)
+            search_results = Entrez.read(io.BytesIO(search_data))
+            return HistorySearch(query, search_results["WebEnv"], search_results["QueryKey"],
+                                 int(search_results["Count"]), search_params)
+        except Exception as e:
+            print(f"Error searching genome IDs: {e}. Retrying...")
+            max_retries -= 1
+            if max_retries <= 0:
+                raise RuntimeError("Exceeded maximum retries for genome ID search.")
+            time.sleep(5)
+
+
+def fetch_genome_ids(query, email, batch_size=5000, max_retries=5, client=None, **search_params):
     """
     Fetch genome IDs in smaller paginated batches to avoid timeouts.
     Patricia Agudelo-Romero, PhD.
@@ -20,25 +122,28 @@ def fetch_genome_ids(query, email, batch_size=5000, max_retries=5):
         email (str): Email address for NCBI.
         batch_size (int): Number of results per batch.
         max_retries (int): Maximum retries for failed requests.
+        client (EutilsClient): Rate-limited E-utilities client (created from email if None).
+        **search_params: Extra esearch parameters (e.g. datetype, mindate, maxdate).
     Returns:
         list: List of genome IDs.
     """
     Entrez.email = email
-    Entrez.timeout = 120
+    client = client or EutilsClient(email, tool=EUTILS_TOOL)
     genome_ids = []
     retstart = 0
 
     while True:
         try:
             print(f"Fetching batch starting at {retstart}...")
-            search_handle = Entrez.esearch(
+            search_data = client.request(
+                "esearch",
                 db="nuccore",
                 term=query,
                 retmax=batch_size,
-                retstart=retstart
+                retstart=retstart,
+                **search_params
             )
-            search_results = Entrez.read(search_handle)
-            search_handle.close()
+            search_results = Entrez.read(io.BytesIO(search_data))
 
             ids = search_results["IdList"]
             genome_ids.extend(ids)
@@ -46,7 +151,6 @@ def fetch_genome_ids(query, email, batch_size=5000, max_retries=5):
             if len(ids) < batch_size:
                 break  # No more results
             retstart += batch_size
-            time.sleep(random.uniform(0.5, 2))  # Random delay
         except Exception as e:
             print(f"Error fetching genome IDs: {e}. Retrying...")
             max_retries -= 1
@@ -57,71 +161,823 @@ def fetch_genome_ids(query, email, batch_size=5000, max_retries=5):
     return genome_ids
 
 
-def download_sequences(genome_ids, output_file):
+class HashingWriter:
+    """Binary file wrapper that tracks the SHA-256 and length of everything written through it."""
+
+    def __init__(self, out_f):
+        self.out_f = out_f
+        self.sha256 = hashlib.sha256()
+        self.length = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.length += len(data)
+        return self.out_f.write(data)
+
+
+class ChunkJournal:
+    """
+    Per-output journal of downloaded ID ranges (status, and byte offset, length and SHA-256 in
+    each output file), rewritten atomically after every chunk so an interrupted run can resume.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        path (str): Journal file path.
+        genome_ids (list or HistorySearch): Genome IDs the output is built from; a journal
+            written for a different ID list (or a different query/count) is discarded.
+    """
+
+    def __init__(self, path, genome_ids):
+        self.path = path
+        if isinstance(genome_ids, HistorySearch):
+            key = f"{genome_ids.query}\n{genome_ids.count}\n{sorted(genome_ids.search_params.items())}"
+        else:
+            key = "\n".join(genome_ids)
+        self.ids_digest = hashlib.sha1(key.encode()).hexdigest()
+        self.chunks = {}
+        if os.path.exists(path):
+            with open(path) as journal_f:
+                saved = json.load(journal_f)
+            if saved.get("ids_digest") == self.ids_digest:
+                self.chunks = saved["chunks"]
+            else:
+                print(f"Journal {path} was written for a different ID list; starting over.")
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as journal_f:
+            json.dump({"ids_digest": self.ids_digest, "chunks": self.chunks}, journal_f)
+        os.replace(tmp_path, self.path)
+
+    def record(self, start, end, status, offset=None, length=None, sha256=None):
+        self.chunks[f"{start}-{end}"] = {"status": status, "offset": offset, "length": length, "sha256": sha256}
+        self.save()
+
+    def done(self):
+        """Return the completed chunks as (start, end, entry), in output file order."""
+        done = []
+        for key, entry in self.chunks.items():
+            if entry["status"] == "done":
+                start, end = map(int, key.split("-"))
+                done.append((start, end, entry))
+        return sorted(done, key=lambda chunk: chunk[2]["offset"][0])
+
+    def verify(self, out_files, data_starts):
+        """
+        Check completed chunks against the output files and drop everything after the first
+        chunk whose bytes are missing or do not match.
+
+        Returns:
+            list: Byte offset at which writing should resume in each output file.
+        """
+        resume_at = list(data_starts)
+        verified = 0
+        for start, end, entry in self.done():
+            intact = True
+            for i, out_f in enumerate(out_files):
+                out_f.seek(entry["offset"][i])
+                data = out_f.read(entry["length"][i])
+                if entry["offset"][i] != resume_at[i] or hashlib.sha256(data).hexdigest() != entry["sha256"][i]:
+                    intact = False
+            if not intact:
+                break
+            resume_at = [offset + length for offset, length in zip(resume_at, entry["length"])]
+            verified += 1
+        for start, end, entry in self.done()[verified:]:
+            del self.chunks[f"{start}-{end}"]
+        self.save()
+        return resume_at
+
+    def pending(self, total, chunk_size):
+        """Return (start, end) ranges of the ID list not covered by completed chunks."""
+        covered = sorted((start, end) for start, end, _ in self.done())
+        ranges = []
+        position = 0
+        for start, end in covered + [(total, total)]:
+            for chunk_start in range(position, start, chunk_size):
+                ranges.append((chunk_start, min(chunk_start + chunk_size, start)))
+            position = max(position, end)
+        return ranges
+
+
+def download_chunks(genome_ids, output_file, fetch_chunk, write_chunk, client, header=b"",
+                    chunk_size=CHUNK_SIZE, max_attempts=4, backoff=2.0):
+    """
+    Download a list of genome IDs in journaled chunks, resuming an interrupted run.
+    Failed chunks go to a retry queue with exponential backoff; a chunk that keeps failing
+    is bisected until the offending (poison) IDs are isolated.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        genome_ids (list or HistorySearch): Genome IDs, or a result set on the NCBI history server.
+        output_file (str or list): Output file, or several output files written from the same
+            responses; the journal is kept next to the first one as <output_file>.journal.
+        fetch_chunk (callable): Takes the request parameters selecting a chunk (see chunk_params)
+            and returns the response.
+        write_chunk (callable): Takes (response, number of records expected, binary file, or a list
+            of binary files when several outputs are given) and writes the chunk, raising an
+            exception if the response is incomplete.
+        client (EutilsClient): Rate-limited E-utilities client used to keep requests in flight.
+        header (bytes or list): Written once at the start of each output (e.g. a CSV header).
+        chunk_size (int): Number of IDs per request.
+        max_attempts (int): Attempts per chunk before it is bisected.
+        backoff (float): Base delay in seconds between retries, doubled on each attempt.
+    Returns:
+        list: IDs that could not be downloaded.
+    """
+    single_output = isinstance(output_file, str)
+    output_files = [output_file] if single_output else list(output_file)
+    headers = [header] if single_output else list(header)
+    journal_file = f"{output_files[0]}.journal"
+    journal = ChunkJournal(journal_file, genome_ids)
+    resuming = bool(journal.done()) and all(os.path.exists(path) for path in output_files)
+    if not resuming and journal.chunks:
+        # The outputs are rebuilt from scratch: chunks the old journal marks done are no longer in them
+        journal.chunks = {}
+        journal.save()
+    with ExitStack() as stack:
+        out_files = [stack.enter_context(open(path, "r+b" if resuming else "w+b")) for path in output_files]
+        data_starts = [len(file_header) for file_header in headers]
+        resume_at = journal.verify(out_files, data_starts) if resuming else data_starts
+        for out_f, file_header, offset in zip(out_files, headers, resume_at):
+            out_f.seek(0)
+            out_f.write(file_header)
+            out_f.seek(offset)
+            out_f.truncate()
+        pending = journal.pending(len(genome_ids), chunk_size)
+        if resuming:
+            print(f"Resuming {', '.join(output_files)}: {len(pending)} chunks left.")
+
+        def fetch(chunk_range):
+            start, end = chunk_range
+            try:
+                return start, end, fetch_chunk(chunk_params(genome_ids, start, end)), None
+            except Exception as e:
+                return start, end, None, e
+
+        def write(start, end, response):
+            offsets = [out_f.tell() for out_f in out_files]
+            sinks = [HashingWriter(out_f) for out_f in out_files]
+            try:
+                write_chunk(response, end - start, sinks[0] if single_output else sinks)
+                for out_f in out_files:
+                    out_f.flush()
+                    os.fsync(out_f.fileno())
+            except Exception:
+                for out_f, offset in zip(out_files, offsets):
+                    out_f.seek(offset)
+                    out_f.truncate()
+                raise
+            journal.record(start, end, "done", offsets, [sink.length for sink in sinks],
+                           [sink.sha256.hexdigest() for sink in sinks])
+
+        retry_queue = deque()
+        for start, end, response, error in client.imap(fetch, pending):
+            try:
+                if error:
+                    raise error
+                write(start, end, response)
+            except Exception as e:
+                print(f"Error fetching IDs {start}-{end}: {e}. Queued for retry.")
+                retry_queue.append((start, end, 1, time.monotonic() + backoff))
+
+        def fetch_when_due(retry):
+            start, end, attempt, not_before = retry
+            time.sleep(max(0, not_before - time.monotonic()))
+            return fetch((start, end)) + (attempt,)
+
+        # Retries go back to the client's pool in rounds, so slow or backed-off chunks wait concurrently
+        unresolved = []
+        while retry_queue:
+            retries = sorted(retry_queue, key=lambda retry: retry[3])
+            retry_queue.clear()
+            for start, end, response, error, attempt in client.imap(fetch_when_due, retries):
+                try:
+                    if error:
+                        raise error
+                    write(start, end, response)
+                    print(f"Retry succeeded for IDs {start}-{end}.")
+                except Exception as e:
+                    if attempt < max_attempts:
+                        retry_queue.append((start, end, attempt + 1, time.monotonic() + backoff * 2 ** attempt))
+                    elif end - start > 1:
+                        middle = (start + end) // 2
+                        print(f"IDs {start}-{end} failed {attempt} times ({e}); splitting the chunk.")
+                        retry_queue.append((start, middle, 1, time.monotonic()))
+                        retry_queue.append((middle, end, 1, time.monotonic()))
+                    else:
+                        print(f"Giving up on {describe_record(genome_ids, start)}: {e}")
+                        journal.record(start, end, "failed")
+                        unresolved.append(describe_record(genome_ids, start))
+
+    if unresolved:
+        print(f"{len(unresolved)} records could not be downloaded into {', '.join(output_files)}; "
+              f"rerun to retry them.")
+    else:
+        with suppress(FileNotFoundError):  # Nothing is journaled when there was nothing to download
+            os.remove(journal_file)
+    return unresolved
+
+
+def copy_fasta_stream(src, dest, buffer_size=STREAM_BUFFER_SIZE):
+    """
+    Copy a FASTA byte stream to a binary file in fixed-size buffers without parsing it.
+    Records are counted with a header scan (">" at the start of a line); download_sequences
+    treats a count below the chunk size as a failed chunk (rolled back and retried), not a warning.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        src: Binary file object holding the FASTA response.
+        dest: Binary file object to append to.
+        buffer_size (int): Number of bytes copied per read.
+    Returns:
+        int: Number of records copied.
+    """
+    records = 0
+    previous = b"\n"
+    block = src.read(buffer_size)
+    if block and not block.lstrip().startswith(b">"):
+        raise ValueError(f"Response is not FASTA: {block[:100]!r}")
+    while block:
+        records += (previous + block).count(b"\n>")
+        previous = block[-1:]
+        dest.write(block)
+        block = src.read(buffer_size)
+    if previous != b"\n":
+        dest.write(b"\n")  # Keep the next record on its own line
+    return records
+
+
+def download_sequences(genome_ids, output_file, client=None, passthrough=False):
     """
     Fetch and save genome sequences for a list of genome IDs.
     Patricia Agudelo-Romero, PhD.
     
     Args:
-        genome_ids (list): List of genome IDs.
+        genome_ids (list or HistorySearch): List of genome IDs, or a result set on the NCBI history server.
         output_file (str): File to save sequences.
+        client (EutilsClient): Rate-limited E-utilities client (created from Entrez.email if None).
+        passthrough (bool): Copy the efetch stream to the output file without parsing it with SeqIO
+            (keeps NCBI's line wrapping).
+    Returns:
+        list: Records that could not be downloaded.
     """
+    client = client or EutilsClient(Entrez.email, tool=EUTILS_TOOL)
     print(f"Downloading sequences for {len(genome_ids)} genomes...")
-    with open(output_file, "w") as out_f:
-        for chunk in range(0, len(genome_ids), 500):
-            try:
-                chunk_ids = genome_ids[chunk:chunk + 500]
-                fetch_handle = Entrez.efetch(
-                    db="nuccore",
-                    id=",".join(chunk_ids),
-                    rettype="fasta",
-                    retmode="text"
-                )
-                for record in SeqIO.parse(fetch_handle, "fasta"):
-                    SeqIO.write(record, out_f, "fasta")
-                fetch_handle.close()
-                time.sleep(random.uniform(1, 3))  # Random delay
-            except Exception as e:
-                print(f"Error fetching sequences for chunk {chunk}: {e}. Retrying...")
+
+    def fetch_chunk(chunk):
+        params = dict(db="nuccore", rettype="fasta", retmode="text", **chunk)
+        if not passthrough:
+            return client.request("efetch", **params)
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            return client.stream("efetch", spool, **params)
+        except Exception:
+            spool.close()
+            raise
+
+    def write_chunk(data, expected, out_f):
+        if passthrough:
+            with data:
+                records = copy_fasta_stream(data, out_f)
+        else:
+            text = io.StringIO()
+            records = SeqIO.write(SeqIO.parse(io.StringIO(data.decode()), "fasta"), text, "fasta")
+            out_f.write(text.getvalue().encode())
+        if records != expected:
+            raise ValueError(f"returned {records} of {expected} sequences")
+
+    return download_chunks(genome_ids, output_file, fetch_chunk, write_chunk, client)
+
+
+def summary_value(record, key):
+    """Return an esummary field as a plain int or str (Entrez element reprs are not CSV friendly)."""
+    value = record.get(key, "N/A")
+    return int(value) if isinstance(value, int) else str(value)
 
 
-def download_metadata(genome_ids, metadata_file):
+def summary_rows_xml(data):
+    """
+    Parse an XML esummary response into metadata rows.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        data (bytes): esummary response (retmode=xml).
+    Returns:
+        list: One dict per document summary, keyed by METADATA_FIELDS.
+    """
+    return [{
+        "Accession": summary_value(record, "AccessionVersion"),
+        "Taxonomy ID": summary_value(record, "TaxId"),
+        "Title": summary_value(record, "Title"),
+        "Organism": summary_value(record, "Organism"),
+        "Length": summary_value(record, "Length"),
+        "UpdateDate": summary_value(record, "UpdateDate"),
+    } for record in Entrez.read(io.BytesIO(data))]
+
+
+def summary_rows_json(data):
+    """
+    Parse a JSON esummary response into metadata rows, without the XML DTD validation of Entrez.read.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        data (bytes): esummary response (retmode=json).
+    Returns:
+        list: One dict per document summary, keyed by METADATA_FIELDS.
+    """
+    result = json.loads(data)["result"]
+    rows = []
+    for uid in result["uids"]:
+        record = result[uid]
+        if "error" in record:
+            raise ValueError(f"esummary error for {uid}: {record['error']}")
+        rows.append({
+            "Accession": record.get("accessionversion") or "N/A",
+            "Taxonomy ID": record.get("taxid", "N/A"),
+            "Title": record.get("title") or "N/A",
+            # The XML (v1) document summary has no Organism item: leave it out here too, so both
+            # retmodes write the same CSV
+            "Organism": "N/A",
+            "Length": record.get("slen", "N/A"),
+            "UpdateDate": record.get("updatedate") or "N/A",
+        })
+    return rows
+
+
+def download_metadata(genome_ids, metadata_file, client=None, json_summary=False):
     """
     Fetch and save metadata for a list of genome IDs.
     Patricia Agudelo-Romero, PhD.
     
     Args:
-        genome_ids (list): List of genome IDs.
+        genome_ids (list or HistorySearch): List of genome IDs, or a result set on the NCBI history server.
         metadata_file (str): File to save metadata.
+        client (EutilsClient): Rate-limited E-utilities client (created from Entrez.email if None).
+        json_summary (bool): Request esummary as JSON (retmode=json) instead of XML.
+    Returns:
+        list: Records whose metadata could not be downloaded.
     """
+    client = client or EutilsClient(Entrez.email, tool=EUTILS_TOOL)
     print(f"Downloading metadata for {len(genome_ids)} genomes...")
-    with open(metadata_file, "w", newline="") as csvfile:
-        fieldnames = ["Accession", "Taxonomy ID", "Title", "Organism", "Length", "UpdateDate"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    header = io.StringIO()
+    csv.DictWriter(header, fieldnames=METADATA_FIELDS).writeheader()
+    retmode, parse_rows = ("json", summary_rows_json) if json_summary else ("xml", summary_rows_xml)
+
+    def fetch_chunk(chunk):
+        return client.request("esummary", db="nuccore", retmode=retmode, **chunk)
+
+    def write_chunk(data, expected, out_f):
+        metadata_rows = parse_rows(data)
+        if len(metadata_rows) != expected:
+            raise ValueError(f"returned {len(metadata_rows)} of {expected} summaries")
+        rows = io.StringIO()
+        csv.DictWriter(rows, fieldnames=METADATA_FIELDS).writerows(metadata_rows)
+        out_f.write(rows.getvalue().encode())
+
+    return download_chunks(genome_ids, metadata_file, fetch_chunk, write_chunk, client,
+                           header=header.getvalue().encode())
+
+
+def parquet_int(value):
+    """Return a CSV field as int, or None if it is empty or N/A."""
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def parquet_date(value):
+    """Return a YYYY/MM/DD CSV field as a date, or None if it is empty or N/A."""
+    try:
+        return datetime.strptime(value, "%Y/%m/%d").date()
+    except ValueError:
+        return None
+
+
+def write_metadata_parquet(metadata_file, parquet_file, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """
+    Write a metadata CSV to Parquet with typed columns (int64 Taxonomy ID and Length, date32
+    UpdateDate). The CSV is streamed in row groups, so memory use does not grow with the file.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        metadata_file (str): Metadata CSV.
+        parquet_file (str): Parquet file to write (replaced atomically).
+        row_group_size (int): Rows per Parquet row group.
+    Returns:
+        int: Number of rows written.
+    """
+    if pa is None:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow).")
+    schema = pa.schema([
+        ("Accession", pa.string()),
+        ("Taxonomy ID", pa.int64()),
+        ("Title", pa.string()),
+        ("Organism", pa.string()),
+        ("Length", pa.int64()),
+        ("UpdateDate", pa.date32()),
+    ])
+    converters = {"Taxonomy ID": parquet_int, "Length": parquet_int, "UpdateDate": parquet_date}
+    n_rows = 0
+    tmp_file = f"{parquet_file}.tmp"
+    writer = pq.ParquetWriter(tmp_file, schema)
+    try:
+        with open(metadata_file, newline="") as in_csv:
+            reader = csv.DictReader(in_csv)
+            while True:
+                batch = list(itertools.islice(reader, row_group_size))
+                if not batch:
+                    break
+                columns = {}
+                for field in METADATA_FIELDS:
+                    convert = converters.get(field)
+                    values = [row[field] for row in batch]
+                    columns[field] = [convert(value) for value in values] if convert else values
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+                n_rows += len(batch)
+    finally:
+        writer.close()
+    os.replace(tmp_file, parquet_file)
+    return n_rows
+
+
+def latest_update_date(metadata_file):
+    """
+    Return the most recent UpdateDate (YYYY/MM/DD) in a metadata CSV, or None if it has no dated rows.
+    Patricia Agudelo-Romero, PhD.
+    """
+    with open(metadata_file, newline="") as in_csv:
+        dates = [row["UpdateDate"] for row in csv.DictReader(in_csv) if row["UpdateDate"] not in ("", "N/A")]
+    return max(dates) if dates else None
+
+
+def merge_updates(output_file, metadata_file, update_fasta, update_metadata):
+    """
+    Merge updated and new records into an existing FASTA and metadata CSV. Records whose
+    accession (any version) appears in the update replace the old ones; every file is rewritten
+    in a single streaming pass to a temporary file. Once both temporary files are complete, a
+    merge journal (<metadata_file>.merge) lists the renames still to do, so a run interrupted
+    between the two renames is completed by finish_merge instead of leaving the FASTA and the
+    CSV from different generations.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        output_file (str): Existing FASTA file.
+        metadata_file (str): Existing metadata CSV.
+        update_fasta (str): FASTA with the updated records.
+        update_metadata (str): Metadata CSV with the updated records.
+    Returns:
+        tuple: (number of records replaced, number of new records).
+    """
+    with open(update_metadata, newline="") as in_csv:
+        updated = {row["Accession"].split(".")[0] for row in csv.DictReader(in_csv)}
+
+    replaced = 0
+    tmp_metadata = f"{metadata_file}.tmp"
+    with open(metadata_file, newline="") as in_csv, open(tmp_metadata, "w", newline="") as out_csv:
+        reader = csv.DictReader(in_csv)
+        writer = csv.DictWriter(out_csv, fieldnames=reader.fieldnames)
         writer.writeheader()
+        for row in reader:
+            if row["Accession"].split(".")[0] in updated:
+                replaced += 1
+            else:
+                writer.writerow(row)
+        with open(update_metadata, newline="") as update_csv:
+            writer.writerows(csv.DictReader(update_csv))
 
-        for chunk in range(0, len(genome_ids), 500):
-            try:
-                chunk_ids = genome_ids[chunk:chunk + 500]
-                metadata_handle = Entrez.esummary(db="nuccore", id=",".join(chunk_ids))
-                metadata_records = Entrez.read(metadata_handle)
-                metadata_handle.close()
-
-                for record in metadata_records:
-                    writer.writerow({
-                        "Accession": record.get("AccessionVersion", "N/A"),
-                        "Taxonomy ID": record.get("TaxId", "N/A"),
-                        "Title": record.get("Title", "N/A"),
-                        "Organism": record.get("Organism", "N/A"),
-                        "Length": record.get("Length", "N/A"),
-                        "UpdateDate": record.get("UpdateDate", "N/A"),
-                    })
-                time.sleep(random.uniform(1, 3))  # Random delay
-            except Exception as e:
-                print(f"Error fetching metadata for chunk {chunk}: {e}. Retrying...")
+    tmp_fasta = f"{output_file}.tmp"
+    with open(output_file, "rb") as in_f, open(tmp_fasta, "wb") as out_f:
+        keep = True
+        for line in in_f:
+            if line.startswith(b">"):
+                accession = line[1:].split(None, 1)[0].decode() if line[1:].strip() else ""
+                keep = accession.split(".")[0] not in updated
+            if keep:
+                out_f.write(line)
+        with open(update_fasta, "rb") as update_f:
+            shutil.copyfileobj(update_f, out_f, STREAM_BUFFER_SIZE)
+
+    for path in (tmp_fasta, tmp_metadata):
+        with open(path, "rb") as tmp_f:
+            os.fsync(tmp_f.fileno())
+    journal_file = f"{metadata_file}.merge"
+    with open(f"{journal_file}.tmp", "w") as journal_f:
+        json.dump([[tmp_fasta, output_file], [tmp_metadata, metadata_file]], journal_f)
+        journal_f.flush()
+        os.fsync(journal_f.fileno())
+    os.replace(f"{journal_file}.tmp", journal_file)
+    finish_merge(metadata_file)
+    return replaced, len(updated) - replaced
+
+
+def finish_merge(metadata_file):
+    """
+    Complete a merge interrupted after its journal was written: the renames listed in
+    <metadata_file>.merge whose temporary file is still present are applied, then the journal
+    is removed. Does nothing if there is no journal (a merge interrupted earlier left the
+    existing files untouched).
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        metadata_file (str): Metadata CSV the merge journal belongs to.
+    Returns:
+        bool: True if an interrupted merge was found and completed.
+    """
+    journal_file = f"{metadata_file}.merge"
+    if not os.path.exists(journal_file):
+        return False
+    with open(journal_file) as journal_f:
+        renames = json.load(journal_f)
+    for tmp_path, path in renames:
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+    os.remove(journal_file)
+    return True
+
+
+def genbank_metadata(record):
+    """
+    Build a metadata row (same columns as download_metadata) from a GenBank SeqRecord.
+    Patricia Agudelo-Romero, PhD.
+    """
+    tax_id = "N/A"
+    for feature in record.features:
+        if feature.type == "source":
+            for xref in feature.qualifiers.get("db_xref", []):
+                if xref.startswith("taxon:"):
+                    tax_id = int(xref[len("taxon:"):])
+            break
+    try:
+        update_date = datetime.strptime(record.annotations["date"], "%d-%b-%Y").strftime("%Y/%m/%d")
+    except (KeyError, ValueError):
+        update_date = "N/A"
+    return {
+        "Accession": record.id,
+        "Taxonomy ID": tax_id,
+        "Title": record.description,
+        "Organism": record.annotations.get("organism", "N/A"),
+        "Length": len(record),
+        "UpdateDate": update_date,
+    }
+
+
+def download_genbank(genome_ids, output_file, metadata_file, client=None):
+    """
+    Fetch GenBank records once per chunk and write both the FASTA sequences and the metadata
+    CSV from the same response, halving the number of requests.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        genome_ids (list or HistorySearch): List of genome IDs, or a result set on the NCBI history server.
+        output_file (str): File to save sequences.
+        metadata_file (str): File to save metadata.
+        client (EutilsClient): Rate-limited E-utilities client (created from Entrez.email if None).
+    Returns:
+        list: Records that could not be downloaded.
+    """
+    client = client or EutilsClient(Entrez.email, tool=EUTILS_TOOL)
+    print(f"Downloading GenBank records (sequences and metadata) for {len(genome_ids)} genomes...")
+    header = io.StringIO()
+    csv.DictWriter(header, fieldnames=METADATA_FIELDS).writeheader()
+
+    def fetch_chunk(chunk):
+        # gbwithparts includes the sequence of contig (CON) records as well; a real temporary
+        # file (rather than a spooled one) can be wrapped for text parsing on every Python 3 version
+        spool = tempfile.TemporaryFile()
+        try:
+            return client.stream("efetch", spool, db="nuccore", rettype="gbwithparts", retmode="text", **chunk)
+        except Exception:
+            spool.close()
+            raise
 
+    def write_chunk(data, expected, sinks):
+        fasta_f, metadata_f = sinks
+        records = 0
+        with data:
+            for record in SeqIO.parse(io.TextIOWrapper(data, encoding="utf-8"), "genbank"):
+                fasta = io.StringIO()
+                SeqIO.write(record, fasta, "fasta")
+                rows = io.StringIO()
+                csv.DictWriter(rows, fieldnames=METADATA_FIELDS).writerow(genbank_metadata(record))
+                fasta_f.write(fasta.getvalue().encode())
+                metadata_f.write(rows.getvalue().encode())
+                records += 1
+        if records != expected:
+            raise ValueError(f"returned {records} of {expected} GenBank records")
 
-def download_viral_genomes(taxonomic_ids, database, email, genome_type, output_dir):
+    return download_chunks(genome_ids, [output_file, metadata_file], fetch_chunk, write_chunk, client,
+                           header=[b"", header.getvalue().encode()])
+
+
+def download_group(group, taxon_id, database, email, genome_type, output_dir, client, passthrough=False,
+                   use_history=False, incremental=False, single_pass=False, json_summary=False, parquet=False):
+    """
+    Search, download and save the genomes and metadata of one taxonomic group.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        group (str): Name of the taxonomic group (used in the output file names).
+        taxon_id (str): NCBI taxonomy ID of the group.
+        database (str): 'genbank' or 'refseq'.
+        email (str): Email address for NCBI.
+        genome_type (str): Type of genome to search.
+        output_dir (str): Directory to save downloaded data.
+        client (EutilsClient): Rate-limited E-utilities client.
+        passthrough (bool): Stream FASTA straight to disk without parsing it with SeqIO.
+        use_history (bool): Keep the search on the NCBI history server and fetch by retstart windows
+            instead of building the ID list client-side.
+        incremental (bool): If the group was downloaded before, fetch only records modified since the
+            latest UpdateDate in its metadata CSV and merge them into the existing files.
+        single_pass (bool): Fetch GenBank records once and write FASTA and metadata from the same response.
+        json_summary (bool): Request esummary as JSON instead of XML.
+        parquet (bool): Also write the metadata as Parquet with typed columns.
+    Returns:
+        list: Records that could not be downloaded (sequence or metadata).
+    """
+    print(f"Processing {group} (TaxID: {taxon_id})...")
+    base_query = f"txid{taxon_id}[Organism] AND {genome_type}[Title]"
+    db_specific_query = f"{base_query} AND {database}[Filter]" if database == "refseq" else base_query
+
+    final_output_file = output_file = os.path.join(output_dir, f"{group}_{database}_genomes.fasta")
+    final_metadata_file = metadata_file = os.path.join(output_dir, f"{group}_{database}_metadata.csv")
+    ids_file = os.path.join(output_dir, f"{group}_{database}_ids.txt")
+
+    if finish_merge(final_metadata_file):
+        print(f"Completed an interrupted merge into {final_output_file} and {final_metadata_file}.")
+
+    search_params = {}
+    since = None
+    if incremental and os.path.exists(output_file) and os.path.exists(metadata_file):
+        since = latest_update_date(metadata_file)
+    if since:
+        # Fetch only records modified since the last run into side files, then merge them
+        print(f"Fetching {group} records modified since {since}...")
+        search_params = {"datetype": "mdat", "mindate": since, "maxdate": "3000"}
+        output_file = f"{final_output_file}.update"
+        metadata_file = f"{final_metadata_file}.update"
+        ids_file = os.path.join(output_dir, f"{group}_{database}_update_ids.txt")
+
+    if use_history:
+        genome_ids = search_history(db_specific_query, email, client=client, **search_params)
+        if not genome_ids:
+            print(f"No {group} records modified since {since}." if since else
+                  f"No genomes found for {group} (TaxID: {taxon_id}).")
+            return []
+    elif os.path.exists(ids_file):
+        # An interrupted run left its ID list behind: resume with the same IDs
+        with open(ids_file) as ids_f:
+            genome_ids = ids_f.read().split()
+        print(f"Resuming with {len(genome_ids)} IDs from {ids_file}.")
+    else:
+        genome_ids = fetch_genome_ids(db_specific_query, email, client=client, **search_params)
+        if not genome_ids:
+            print(f"No {group} records modified since {since}." if since else
+                  f"No genomes found for {group} (TaxID: {taxon_id}).")
+            return []
+        with open(ids_file, "w") as ids_f:
+            ids_f.write("\n".join(genome_ids) + "\n")
+
+    if single_pass:
+        unresolved = download_genbank(genome_ids, output_file, metadata_file, client)
+    else:
+        unresolved = download_sequences(genome_ids, output_file, client, passthrough)
+        unresolved += download_metadata(genome_ids, metadata_file, client, json_summary)
+    if unresolved:
+        return unresolved
+    if since:
+        replaced, added = merge_updates(final_output_file, final_metadata_file, output_file, metadata_file)
+        os.remove(output_file)
+        os.remove(metadata_file)
+        print(f"{group}: {replaced} records updated, {added} new records.")
+    if parquet:
+        write_metadata_parquet(final_metadata_file, f"{os.path.splitext(final_metadata_file)[0]}.parquet")
+    if os.path.exists(ids_file):
+        os.remove(ids_file)
+    return unresolved
+
+
+def read_nodes_dmp(nodes_dmp):
+    """
+    Read child -> parent taxids from an NCBI taxonomy nodes.dmp file.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        nodes_dmp (str): Path to nodes.dmp.
+    Returns:
+        dict: Parent taxid (str) for every taxid (str).
+    """
+    parents = {}
+    with open(nodes_dmp) as nodes_f:
+        for line in nodes_f:
+            tax_id, parent_id = line.split("\t|\t", 2)[:2]
+            parents[tax_id] = parent_id
+    return parents
+
+
+def lookup_lineages(taxids, client, nodes_dmp=None, batch_size=200):
+    """
+    Find the lineage (ancestor taxids, including the taxid itself) of each taxid,
+    from a local nodes.dmp or with efetch on the NCBI taxonomy database.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        taxids (iterable): Taxids (str) to look up.
+        client (EutilsClient): Rate-limited E-utilities client.
+        nodes_dmp (str): Path to nodes.dmp; if None, lineages are fetched from NCBI.
+        batch_size (int): Number of taxids per efetch request.
+    Returns:
+        dict: Set of lineage taxids (str) for every taxid (str).
+    """
+    taxids = sorted(set(taxids))
+    lineages = {}
+    if nodes_dmp:
+        parents = read_nodes_dmp(nodes_dmp)
+        for tax_id in taxids:
+            lineage = {tax_id}
+            node = tax_id
+            while node in parents and parents[node] != node:
+                node = parents[node]
+                lineage.add(node)
+            lineages[tax_id] = lineage
+        return lineages
+
+    def fetch(start):
+        data = client.request("efetch", db="taxonomy", id=",".join(taxids[start:start + batch_size]), retmode="xml")
+        return Entrez.read(io.BytesIO(data))
+
+    print(f"Looking up lineages for {len(taxids)} taxids...")
+    for taxa in client.imap(fetch, range(0, len(taxids), batch_size)):
+        for taxon in taxa:
+            lineage = {str(taxon["TaxId"])} | {str(node["TaxId"]) for node in taxon.get("LineageEx", [])}
+            lineages[str(taxon["TaxId"])] = lineage
+            # Merged taxids are reported under their current taxid
+            for old_id in taxon.get("AkaTaxIds", []):
+                lineages[str(old_id)] = lineage
+    return lineages
+
+
+def partition_group_files(superset_fasta, superset_metadata, group_files, lineages):
+    """
+    Split the superset FASTA and metadata CSV into per-group files, assigning each record
+    by the lineage of its TaxId.
+    Patricia Agudelo-Romero, PhD.
+
+    Args:
+        superset_fasta (str): FASTA downloaded for the superset group.
+        superset_metadata (str): Metadata CSV downloaded for the superset group.
+        group_files (dict): (FASTA path, metadata path) for every group taxid (str).
+        lineages (dict): Set of lineage taxids for every taxid, from lookup_lineages.
+    Returns:
+        tuple: (number of records written for every group taxid, accessions that matched no group
+            because their TaxId is unknown or outside every group).
+    """
+    accession_groups = {}
+    counts = dict.fromkeys(group_files, 0)
+    unassigned = []
+    with open(superset_metadata, newline="") as in_csv:
+        reader = csv.DictReader(in_csv)
+        writers = {}
+        handles = []
+        try:
+            for tax_id, (_, metadata_path) in group_files.items():
+                handle = open(metadata_path, "w", newline="")
+                handles.append(handle)
+                writers[tax_id] = csv.DictWriter(handle, fieldnames=reader.fieldnames)
+                writers[tax_id].writeheader()
+            for row in reader:
+                groups = [tax_id for tax_id in group_files
+                          if tax_id in lineages.get(row["Taxonomy ID"], ())]
+                accession_groups[row["Accession"]] = groups
+                if not groups:
+                    unassigned.append(row["Accession"])
+                for tax_id in groups:
+                    writers[tax_id].writerow(row)
+                    counts[tax_id] += 1
+        finally:
+            for handle in handles:
+                handle.close()
+
+    outputs = {tax_id: open(fasta_path, "wb") for tax_id, (fasta_path, _) in group_files.items()}
+    try:
+        targets = []
+        with open(superset_fasta, "rb") as in_f:
+            for line in in_f:
+                if line.startswith(b">"):
+                    accession = line[1:].split(None, 1)[0].decode() if line[1:].strip() else ""
+                    targets = [outputs[tax_id] for tax_id in accession_groups.get(accession, ())]
+                for out_f in targets:
+                    out_f.write(line)
+    finally:
+        for out_f in outputs.values():
+            out_f.close()
+    return counts, unassigned
+
+
+def download_viral_genomes(taxonomic_ids, database, email, genome_type, output_dir, client=None, passthrough=False,
+                           use_history=False, partition=False, nodes_dmp=None, incremental=False, single_pass=False,
+                           json_summary=False, parquet=False):
     """
     Download viral genomes and metadata for specified taxonomic groups.
     Patricia Agudelo-Romero, PhD.
@@ -132,25 +988,78 @@ def download_viral_genomes(taxonomic_ids, database, email, genome_type, output_d
         email (str): Email address for NCBI.
         genome_type (str): Type of genome to search.
         output_dir (str): Directory to save downloaded data.
+        client (EutilsClient): Rate-limited E-utilities client (created from email if None).
+        passthrough (bool): Stream FASTA straight to disk without parsing it with SeqIO.
+        use_history (bool): Keep the search on the NCBI history server and fetch by retstart windows
+            instead of building the ID list client-side.
+        partition (bool): Download only the superset group (TaxID 10239) and split it into the
+            other groups locally by TaxId lineage (skipped while superset records are unresolved).
+        nodes_dmp (str): Local NCBI taxonomy nodes.dmp used for the lineage lookup in partition mode
+            (optional; lineages are fetched from NCBI otherwise).
+        incremental (bool): Fetch only records modified since the previous run and merge them into
+            the existing files.
+        single_pass (bool): Fetch GenBank records once and write FASTA and metadata from the same response.
+        json_summary (bool): Request esummary as JSON instead of XML.
+        parquet (bool): Also write the metadata of every group as Parquet with typed columns.
+    Returns:
+        list: Records that could not be downloaded (sequence or metadata).
     """
+    client = client or EutilsClient(email, tool=EUTILS_TOOL)
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    for group, taxon_id in taxonomic_ids.items():
-        print(f"Processing {group} (TaxID: {taxon_id})...")
-        base_query = f"txid{taxon_id}[Organism] AND {genome_type}[Title]"
-        db_specific_query = f"{base_query} AND {database}[Filter]" if database == "refseq" else base_query
+    if not partition:
+        unresolved = []
+        for group, taxon_id in taxonomic_ids.items():
+            unresolved += download_group(group, taxon_id, database, email, genome_type, output_dir, client,
+                                         passthrough, use_history, incremental, single_pass, json_summary, parquet)
+        return unresolved
 
-        genome_ids = fetch_genome_ids(db_specific_query, email)
-        if not genome_ids:
-            print(f"No genomes found for {group} (TaxID: {taxon_id}).")
-            continue
+    superset = [group for group, taxon_id in taxonomic_ids.items() if taxon_id == VIRUSES_TAXID]
+    if not superset:
+        raise ValueError(f"Partition mode needs a group with TaxID {VIRUSES_TAXID} to download.")
+    superset = superset[0]
+    unresolved = download_group(superset, VIRUSES_TAXID, database, email, genome_type, output_dir, client,
+                                passthrough, use_history, incremental, single_pass, json_summary, parquet)
 
-        output_file = os.path.join(output_dir, f"{group}_{database}_genomes.fasta")
-        metadata_file = os.path.join(output_dir, f"{group}_{database}_metadata.csv")
+    others = [group for group in taxonomic_ids if group != superset]
+    if unresolved:
+        # The lineage of a missing record is unknown, so every group split from the superset would be incomplete
+        print(f"Not partitioning {superset}: {len(unresolved)} records are unresolved. "
+              f"{', '.join(others)} were not updated; rerun the same command to retry them.")
+        return unresolved
 
-        download_sequences(genome_ids, output_file)
-        download_metadata(genome_ids, metadata_file)
+    superset_fasta = os.path.join(output_dir, f"{superset}_{database}_genomes.fasta")
+    superset_metadata = os.path.join(output_dir, f"{superset}_{database}_metadata.csv")
+    if not os.path.exists(superset_metadata):
+        return unresolved
+    with open(superset_metadata, newline="") as in_csv:
+        taxids = {row["Taxonomy ID"] for row in csv.DictReader(in_csv)}
+    lineages = lookup_lineages(taxids, client, nodes_dmp)
+
+    group_files = {
+        taxon_id: (os.path.join(output_dir, f"{group}_{database}_genomes.fasta"),
+                   os.path.join(output_dir, f"{group}_{database}_metadata.csv"))
+        for group, taxon_id in taxonomic_ids.items() if group != superset
+    }
+    print(f"Partitioning {superset} into {len(group_files)} groups...")
+    counts, unassigned = partition_group_files(superset_fasta, superset_metadata, group_files, lineages)
+    for group, taxon_id in taxonomic_ids.items():
+        if group != superset:
+            print(f"{group} (TaxID: {taxon_id}): {counts[taxon_id]} genomes.")
+    unassigned_file = os.path.join(output_dir, f"{superset}_{database}_unassigned.txt")
+    if unassigned:
+        # Kept in the superset files only: list them so they are not lost from the per-group files unnoticed
+        with open(unassigned_file, "w") as out_f:
+            out_f.write("\n".join(unassigned) + "\n")
+        print(f"{len(unassigned)} {superset} records matched no group (unknown TaxId or outside every group); "
+              f"listed in {unassigned_file}.")
+    elif os.path.exists(unassigned_file):
+        os.remove(unassigned_file)
+    if parquet:
+        for _, metadata_path in group_files.values():
+            write_metadata_parquet(metadata_path, f"{os.path.splitext(metadata_path)[0]}.parquet")
+    return unresolved
 
 
 if __name__ == "__main__":
@@ -167,7 +1076,44 @@ if __name__ == "__main__":
     parser.add_argument("-e", "--email", required=True)
     parser.add_argument("-g", "--genome-type", default="complete genome")
     parser.add_argument("-o", "--output", default="genomes")
+    parser.add_argument("--api-key", default=os.environ.get("NCBI_API_KEY"),
+                        help="NCBI API key; raises the rate limit to 10 requests/s. Default: $NCBI_API_KEY.")
+    parser.add_argument("--tool", default=EUTILS_TOOL, help="Tool name reported to NCBI.")
+    parser.add_argument("--rate", type=float,
+                        help="Requests per second. Default: 10 with an API key, 3 without.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Copy the efetch FASTA straight to the output file without parsing it (keeps NCBI's line wrapping).")
+    parser.add_argument("--use-history", action="store_true",
+                        help="Keep search results on the NCBI history server and fetch them in concurrent windows "
+                             "instead of downloading the full ID list first.")
+    parser.add_argument("--partition-locally", action="store_true",
+                        help="Download allViruses once and split it into the other groups locally by TaxId lineage.")
+    parser.add_argument("--nodes-dmp",
+                        help="NCBI taxonomy nodes.dmp for the lineage lookup in --partition-locally mode "
+                             "(default: look lineages up on NCBI).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fetch only records modified since the latest UpdateDate in the existing metadata CSVs "
+                             "and merge them into the existing files.")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Fetch GenBank records once and write both the FASTA and the metadata CSV from the same "
+                             "response (one request per chunk instead of two).")
+    parser.add_argument("--json-summary", action="store_true",
+                        help="Request esummary metadata as JSON instead of XML (faster to parse).")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also write each metadata CSV as Parquet with typed columns (requires pyarrow).")
     args = parser.parse_args()
+    if args.parquet and pa is None:
+        parser.error("--parquet requires pyarrow (pip install pyarrow).")
+    if args.single_pass and (args.stream or args.json_summary):
+        parser.error("--single-pass cannot be combined with --stream or --json-summary "
+                     "(it fetches GenBank records instead of FASTA and esummary).")
 
-    download_viral_genomes(taxonomic_ids, args.database, args.email, args.genome_type, args.output)
+    client = EutilsClient(args.email, api_key=args.api_key, tool=args.tool, rate=args.rate)
+    unresolved = download_viral_genomes(taxonomic_ids, args.database, args.email, args.genome_type, args.output,
+                                        client, args.stream, args.use_history, args.partition_locally,
+                                        args.nodes_dmp, args.incremental, args.single_pass, args.json_summary,
+                                        args.parquet)
+    if unresolved:
+        print(f"Finished with {len(unresolved)} unresolved records; rerun the same command to retry them.")
+        sys.exit(1)
   
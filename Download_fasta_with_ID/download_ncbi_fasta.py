@@ -1,30 +1,158 @@
 #!/usr/bin/env python3
 
-import sys
 import os
-from Bio import Entrez
+import io
+import sys
+import argparse
+import time
+import sqlite3
+import tempfile
+import threading
+import zlib
+
+# Shared rate-limited E-utilities client (../eutils_client)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "eutils_client"))
+from eutils_client import EutilsClient
 
 __author__ = "Patricia Agudelo-Romero, PhD."
 
-def download_fasta(reference_id, email, output_folder):
+EUTILS_TOOL = "download_ncbi_fasta"
+SPOOL_MAX_SIZE = 64 * 1024 * 1024  # Batch responses larger than this are spooled to a temporary file
+DEFAULT_CACHE = os.environ.get(
+    "NCBI_FASTA_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "download_ncbi_fasta", "fasta_cache.sqlite")
+)
+
+
+def split_accession(reference_id):
+    """
+    Splits an accession into its base and version number.
+    Args:
+        reference_id (str): Accession with or without version (e.g., NC_074663.1 or NC_074663).
+
+    Returns:
+        tuple: (base accession, version as int or None).
+    """
+    base, _, version = reference_id.partition('.')
+    return base, int(version) if version.isdigit() else None
+
+
+class FastaCache:
+    """
+    Persistent on-disk FASTA cache keyed by versioned accession (SQLite, zlib-compressed).
+    A versionless ID resolves to the newest cached version. Entries older than
+    max_age are ignored, and the least recently used entries are evicted once
+    the cache grows beyond max_bytes.
+
+    Args:
+        path (str): Path to the SQLite cache file.
+        max_bytes (int): Maximum total size of the cached (compressed) records, or None for no limit.
+        max_age (float): Maximum age of a cached record in seconds, or None for no limit.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE, max_bytes=None, max_age=None):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fasta ("
+                "accession TEXT PRIMARY KEY, base TEXT NOT NULL, version INTEGER, "
+                "data BLOB NOT NULL, size INTEGER NOT NULL, fetched REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS fasta_base ON fasta (base, version)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS fasta_accessed ON fasta (accessed)")
+        # Running total of the cached sizes, so eviction does not sum the whole table on every put
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM fasta").fetchone()[0]
+
+    def get(self, reference_id):
+        """
+        Returns the cached FASTA text for an ID, or None on a miss.
+        Args:
+            reference_id (str): Accession with or without version.
+        """
+        base, version = split_accession(reference_id)
+        with self._lock:
+            if version is None:
+                row = self._conn.execute(
+                    "SELECT accession, data, fetched FROM fasta WHERE base = ? ORDER BY version DESC LIMIT 1", (base,)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT accession, data, fetched FROM fasta WHERE accession = ?", (reference_id,)
+                ).fetchone()
+            if row is None or (self.max_age is not None and time.time() - row[2] > self.max_age):
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE fasta SET accessed = ? WHERE accession = ?", (time.time(), row[0]))
+        return zlib.decompress(row[1]).decode()
+
+    def put(self, fasta_data):
+        """
+        Stores a single FASTA record under the versioned accession in its header.
+        Args:
+            fasta_data (str): FASTA text of one record.
+        """
+        header = fasta_data.split('\n', 1)[0]
+        if not header.startswith(">") or not header[1:].strip():
+            return
+        accession = header[1:].split()[0]
+        base, version = split_accession(accession)
+        data = zlib.compress(fasta_data.encode())
+        now = time.time()
+        with self._lock, self._conn:
+            replaced = self._conn.execute("SELECT size FROM fasta WHERE accession = ?", (accession,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fasta VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (accession, base, version, data, len(data), now, now)
+            )
+            self._total += len(data) - (replaced[0] if replaced else 0)
+            if self.max_bytes is not None:
+                self._evict()
+
+    def _evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        if self._total <= self.max_bytes:
+            return
+        evicted = []
+        for accession, size in self._conn.execute("SELECT accession, size FROM fasta ORDER BY accessed"):
+            if self._total <= self.max_bytes:
+                break
+            evicted.append((accession,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM fasta WHERE accession = ?", evicted)
+
+    def close(self):
+        self._conn.close()
+
+
+def download_fasta(reference_id, email, output_folder, client=None, cache=None):
     """
     Downloads a FASTA file from NCBI GenBank using a reference ID.
     Args:
         reference_id (str): The GenBank reference ID (e.g., NC_074663.1).
         email (str): Email address for NCBI API usage (required by NCBI).
         output_folder (str): Folder to save the downloaded FASTA.
+        client (EutilsClient): Rate-limited E-utilities client (created from email if None).
+        cache (FastaCache): Local accession cache checked before NCBI (optional).
     """
-    Entrez.email = email  # Required by NCBI
+    client = client or EutilsClient(email, tool=EUTILS_TOOL)  # Email is required by NCBI
     output_file = os.path.join(output_folder, f"{reference_id}.fasta")
 
     # Ensure the output folder exists
     os.makedirs(output_folder, exist_ok=True)
 
     try:
-        print(f"Fetching FASTA for {reference_id}...")
-        handle = Entrez.efetch(db="nucleotide", id=reference_id, rettype="fasta", retmode="text")
-        fasta_data = handle.read()
-        handle.close()
+        fasta_data = cache.get(reference_id) if cache else None
+        if fasta_data is None:
+            print(f"Fetching FASTA for {reference_id}...")
+            fasta_data = client.request("efetch", db="nucleotide", id=reference_id, rettype="fasta", retmode="text").decode()
+            if cache:
+                cache.put(fasta_data)
+        else:
+            print(f"Using cached FASTA for {reference_id}")
 
         # Save FASTA data to a file
         with open(output_file, 'w') as file:
@@ -34,9 +162,119 @@ def download_fasta(reference_id, email, output_folder):
     except Exception as e:
         print(f"Error fetching {reference_id}: {e}")
 
+def split_fasta_stream(handle, reference_ids, output_folder, cache=None):
+    """
+    Splits a multi-FASTA stream into one <id>.fasta file per requested ID.
+    Records are matched to the requested IDs by accession.version, or by
+    the bare accession when a versionless ID was requested.
+    Args:
+        handle: Text handle over the efetch response.
+        reference_ids (list): IDs requested in this batch.
+        output_folder (str): Folder to save the FASTA files.
+        cache (FastaCache): Local accession cache to store each record in (optional).
+
+    Returns:
+        set: The requested IDs for which a record was written.
+    """
+    lookup = {}
+    for ref_id in reference_ids:
+        lookup[ref_id] = ref_id
+        lookup.setdefault(ref_id.split('.')[0], ref_id)
+
+    found = set()
+
+    def save_record(lines):
+        accession = lines[0][1:].split()[0] if lines[0][1:].strip() else ""
+        ref_id = lookup.get(accession, lookup.get(accession.split('.')[0]))
+        if ref_id is None:
+            # Returned under an ID we did not ask for (e.g. a GI number was requested)
+            print(f"Warning: record {accession} does not match a requested ID; saving as {accession}.fasta")
+            ref_id = accession
+        else:
+            found.add(ref_id)
+        record = "".join(lines)
+        with open(os.path.join(output_folder, f"{ref_id}.fasta"), 'w') as out:
+            out.write(record)
+        if cache:
+            cache.put(record)
+
+    lines = []
+    for line in handle:
+        if line.startswith(">") and lines:
+            save_record(lines)
+            lines = []
+        if lines or line.startswith(">"):
+            lines.append(line)
+    if lines:
+        save_record(lines)
+    return found
+
+def download_fasta_batch(reference_ids, email, output_folder, batch_size=200, missing_report="missing_ids.txt", client=None, cache=None,
+                         failed_report="failed_ids.txt"):
+    """
+    Downloads FASTA files from NCBI GenBank in batches of IDs, one efetch per batch.
+    Batches are fetched concurrently within the client's rate limit, and batches
+    of more than 200 IDs are sent as HTTP POST. Each response is streamed into a
+    spooled temporary file and split into per-ID files as it is read back.
+    Args:
+        reference_ids (list): The GenBank reference IDs.
+        email (str): Email address for NCBI API usage (required by NCBI).
+        output_folder (str): Folder to save the downloaded FASTA files.
+        batch_size (int): Number of IDs sent per efetch request.
+        missing_report (str): File name (inside output_folder) listing IDs NCBI returned nothing for.
+        client (EutilsClient): Rate-limited E-utilities client (created from email if None).
+        cache (FastaCache): Local accession cache checked before NCBI (optional).
+        failed_report (str): File name (inside output_folder) listing IDs of batches that failed after all retries.
+
+    Returns:
+        tuple: (IDs for which no record was returned, IDs of batches that failed).
+    """
+    client = client or EutilsClient(email, tool=EUTILS_TOOL)  # Email is required by NCBI
+    os.makedirs(output_folder, exist_ok=True)
+
+    if cache:
+        to_fetch = []
+        for ref_id in reference_ids:
+            fasta_data = cache.get(ref_id)
+            if fasta_data is None:
+                to_fetch.append(ref_id)
+                continue
+            with open(os.path.join(output_folder, f"{ref_id}.fasta"), 'w') as file:
+                file.write(fasta_data)
+        print(f"Found {len(reference_ids) - len(to_fetch)} IDs in the local cache")
+        reference_ids = to_fetch
+
+    def fetch_batch(start):
+        batch = reference_ids[start:start + batch_size]
+        print(f"Fetching FASTA for IDs {start + 1}-{start + len(batch)} of {len(reference_ids)}...")
+        try:
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+                client.stream("efetch", spool, db="nucleotide", id=",".join(batch), rettype="fasta", retmode="text")
+                found = split_fasta_stream(io.TextIOWrapper(spool, encoding="utf-8"), batch, output_folder, cache)
+        except Exception as e:
+            print(f"Error fetching batch starting at {batch[0]}: {e}")
+            return [], batch
+        return [ref_id for ref_id in batch if ref_id not in found], []
+
+    missing, failed = [], []
+    for batch_missing, batch_failed in client.imap(fetch_batch, range(0, len(reference_ids), batch_size)):
+        missing.extend(batch_missing)
+        failed.extend(batch_failed)
+
+    for ids, report, message in ((missing, missing_report, "No record returned for"),
+                                 (failed, failed_report, "Download failed after all retries for")):
+        if ids:
+            report_file = os.path.join(output_folder, report)
+            with open(report_file, 'w') as file:
+                file.writelines(f"{ref_id}\n" for ref_id in ids)
+            print(f"{message} {len(ids)} IDs; list saved to {report_file}")
+    print(f"FASTA files saved to {output_folder}")
+    return missing, failed
+
 def process_input(input_path):
     """
     Reads reference IDs from a file or processes a single ID.
+    Duplicate IDs are collapsed, keeping the first occurrence.
     Args:
         input_path (str): Path to a file containing IDs or a single ID string.
 
@@ -46,23 +284,93 @@ def process_input(input_path):
     if os.path.isfile(input_path):
         with open(input_path, 'r') as file:
             ids = [line.strip() for line in file if line.strip()]
+        unique_ids = list(dict.fromkeys(ids))
         print(f"Loaded {len(ids)} IDs from {input_path}")
-        return ids
+        if len(unique_ids) < len(ids):
+            print(f"Collapsed {len(ids) - len(unique_ids)} duplicate IDs")
+        return unique_ids
     else:
         return [input_path]
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python script.py <input_path_or_id> <email> <output_folder>")
-        sys.exit(1)
+def skip_existing(reference_ids, output_folder):
+    """
+    Drops IDs whose <id>.fasta already exists (and is not empty) in the output folder.
+    Args:
+        reference_ids (list): The GenBank reference IDs.
+        output_folder (str): Folder where the FASTA files are saved.
+
+    Returns:
+        list: IDs that still need to be downloaded.
+    """
+    remaining = [
+        ref_id for ref_id in reference_ids
+        if not os.path.isfile(os.path.join(output_folder, f"{ref_id}.fasta"))
+        or os.path.getsize(os.path.join(output_folder, f"{ref_id}.fasta")) == 0
+    ]
+    if len(remaining) < len(reference_ids):
+        print(f"Skipping {len(reference_ids) - len(remaining)} IDs already saved in {output_folder}")
+    return remaining
 
-    input_path = sys.argv[1]
-    email = sys.argv[2]
-    output_folder = sys.argv[3]
+def main():
+    parser = argparse.ArgumentParser(description="Download FASTA files from NCBI GenBank using reference IDs.")
+    parser.add_argument("input_path", help="A single reference ID or a file with one ID per line.")
+    parser.add_argument("email", help="Email address for NCBI API usage.")
+    parser.add_argument("output_folder", help="Folder to save the downloaded FASTA files.")
+    parser.add_argument(
+        "--batch-size", type=int, default=1,
+        help="Number of IDs fetched per request. Values above 1 enable batched mode. Default: 1 (one request per ID)."
+    )
+    parser.add_argument(
+        "--api-key", default=os.environ.get("NCBI_API_KEY"),
+        help="NCBI API key; raises the rate limit to 10 requests/s. Default: $NCBI_API_KEY."
+    )
+    parser.add_argument("--tool", default=EUTILS_TOOL, help="Tool name reported to NCBI.")
+    parser.add_argument(
+        "--rate", type=float,
+        help="Requests per second. Default: 10 with an API key, 3 without."
+    )
+    parser.add_argument(
+        "--overwrite", action="store_true",
+        help="Download IDs even if <output_folder>/<id>.fasta already exists."
+    )
+    parser.add_argument(
+        "--cache", default=DEFAULT_CACHE,
+        help=f"Path to the local accession cache shared between runs. Default: {DEFAULT_CACHE} (or $NCBI_FASTA_CACHE)."
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the local accession cache.")
+    parser.add_argument(
+        "--cache-max-age", type=float,
+        help="Ignore cached records older than this many days. Default: no limit."
+    )
+    parser.add_argument(
+        "--cache-max-size", type=float, default=2048,
+        help="Maximum cache size in MB; least recently used records are evicted beyond it. Default: 2048."
+    )
+    args = parser.parse_args()
+    client = EutilsClient(args.email, api_key=args.api_key, tool=args.tool, rate=args.rate)
+    cache = None
+    if not args.no_cache:
+        cache = FastaCache(
+            args.cache,
+            max_bytes=int(args.cache_max_size * 1024 * 1024),
+            max_age=args.cache_max_age * 86400 if args.cache_max_age is not None else None
+        )
 
     # Process the input to extract IDs
-    reference_ids = process_input(input_path)
+    reference_ids = process_input(args.input_path)
+    if not args.overwrite:
+        reference_ids = skip_existing(reference_ids, args.output_folder)
 
-    # Download FASTA files for each ID
-    for ref_id in reference_ids:
-        download_fasta(ref_id, email, output_folder)
+    if args.batch_size > 1:
+        # Download FASTA files in batches and split them per ID
+        download_fasta_batch(reference_ids, args.email, args.output_folder, args.batch_size, client=client, cache=cache)
+    else:
+        # Download FASTA files for each ID, keeping the allowed number of requests in flight
+        for _ in client.imap(lambda ref_id: download_fasta(ref_id, args.email, args.output_folder, client, cache), reference_ids):
+            pass
+
+    if cache:
+        cache.close()
+
+if __name__ == "__main__":
+    main()
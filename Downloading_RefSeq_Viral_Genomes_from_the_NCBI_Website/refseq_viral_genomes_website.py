@@ -1,39 +1,84 @@
 #!/usr/bin/env python3
 
 import os
+import re
+import sys
+import gzip
+import math
+import shutil
+import heapq
+import itertools
 import argparse
+import hashlib
+import tempfile
 import subprocess
 import glob
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+# Shared in-process downloader (../parallel_download) for --downloader parallel
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "parallel_download"))
+try:
+    import parallel_download
+except ImportError:
+    parallel_download = None
 
 
 __author__ = "Patricia Agudelo-Romero, PhD."
 
+RELEASE_URL = "https://ftp.ncbi.nlm.nih.gov/refseq/release/viral/"
+RELEASE_PART = re.compile(r"viral\.(\d+)\.(\d+)\.genomic\.fna\.gz")  # viral.<part>.<version>.genomic.fna.gz
+CONNECTIONS = 8  # Parallel Range requests per file with --downloader parallel
+PART_CONNECTIONS = 4  # Per release file with --downloader parallel (as aria2c -x 4), several files run at once
+READ_BLOCK_SIZE = 1024 * 1024  # Bytes read per block when streaming FASTA records
+RANGE_SIZE = 64 * 1024 * 1024  # Bytes of FASTA hashed per worker task in sharded mode
+SPILL_DTYPE = np.dtype([("ordinal", "<i8"), ("hi", "<u8"), ("lo", "<u8"), ("reverse", "u1")])
+# Upper-cases the sequence (DNA/RNA IUPAC codes) so that case differences are not duplicates
+UPPER_TABLE = bytes.maketrans(b"acgtunrykmswbdhv", b"ACGTUNRYKMSWBDHV")
+# DNA IUPAC complement; sequences with U are RNA and are not reverse-complemented
+COMPLEMENT_TABLE = bytes.maketrans(b"ACGTNRYKMSWBDHV", b"TGCANYRMKSWVHDB")
+DIGEST_BATCH = 4096  # Records digested per vectorised DigestTable lookup in the native engine
+# 2-bit base codes for MinHash k-mers (A=0, C=1, G=2, T/U=3); 4 marks any other byte
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for bases, code in ((b"Aa", 0), (b"Cc", 1), (b"Gg", 2), (b"TtUu", 3)):
+    BASE_CODES[list(bases)] = code
+EMPTY_BIN = np.uint32(0xFFFFFFFF)  # Sketch value of a MinHash bin without k-mers
+MINHASH_SEED = 0x5EED5EED5EED5EED
+
 
-def download_and_unzip(url, output_dir):
+def download_and_unzip(url, output_dir, downloader="aria2c", connections=CONNECTIONS):
     """
-    Step 1: Download a file using aria2c and unzip it.
+    Step 1: Download a file using aria2c and unzip it. With downloader 'parallel' the file is fetched
+    in-process with parallel Range requests and decompressed while it downloads (no .gz is written).
     """
     # Ensure the output directory exists
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     print(f"Downloading from {url}...")
-    download_command = [
-        "aria2c",
-        "--file-allocation=none",
-        "-c",
-        "-x", "10",
-        "-s", "10",
-        "-d", output_dir,
-        url
-    ]
-    subprocess.run(download_command, check=True)
+    if downloader == "parallel":
+        name = os.path.basename(url)
+        extract = "gunzip" if name.endswith(".gz") else None
+        parallel_download.download(url, os.path.join(output_dir, name[:-len(".gz")] if extract else name),
+                                   extract, connections)
+    else:
+        download_command = [
+            "aria2c",
+            "--file-allocation=none",
+            "-c",
+            "-x", "10",
+            "-s", "10",
+            "-d", output_dir,
+            url
+        ]
+        subprocess.run(download_command, check=True)
 
-    # Unzip the downloaded file(s)
-    print("Unzipping downloaded files...")
-    gz_files = glob.glob(os.path.join(output_dir, "*.gz"))
-    for gz_file in gz_files:
-        subprocess.run(["gzip", "-d", gz_file], check=True)
+        # Unzip the downloaded file(s)
+        print("Unzipping downloaded files...")
+        gz_files = glob.glob(os.path.join(output_dir, "*.gz"))
+        for gz_file in gz_files:
+            subprocess.run(["gzip", "-d", gz_file], check=True)
 
     # Identify the unzipped file
     fasta_files = glob.glob(os.path.join(output_dir, "*.fna")) + \
@@ -45,11 +90,110 @@ def download_and_unzip(url, output_dir):
 
     return fasta_files[0]  # Return the first found FASTA file
 
+def list_release_parts(release_url=RELEASE_URL):
+    """
+    Return the URLs of the viral.*.genomic.fna.gz files listed in a RefSeq release directory, in part order.
+    """
+    with urllib.request.urlopen(release_url) as response:
+        listing = response.read().decode(errors="replace")
+    names = {match.group(0): (int(match.group(1)), int(match.group(2))) for match in RELEASE_PART.finditer(listing)}
+    if not names:
+        raise FileNotFoundError(f"No viral.*.genomic.fna.gz files listed at {release_url}")
+    return [urllib.request.urljoin(release_url.rstrip("/") + "/", name) for name in sorted(names, key=names.get)]
+
+def decompress_part(gz_file, fasta_file):
+    """
+    Decompress one release part to its own FASTA file.
+    """
+    with gzip.open(gz_file, "rb") as compressed, open(fasta_file, "wb") as fasta:
+        shutil.copyfileobj(compressed, fasta, READ_BLOCK_SIZE)
+    return fasta_file
+
+def fetch_part(url, fasta_file):
+    """
+    Download one release part in-process, decompressing it to its own FASTA file while it arrives.
+    """
+    parallel_download.download(url, fasta_file, "gunzip", PART_CONNECTIONS)
+    return fasta_file
+
+def download_release(release_url, output_dir, threads=None, downloader="aria2c"):
+    """
+    Step 1 (release mode): Download every viral.*.genomic.fna.gz part of a RefSeq release concurrently with
+    aria2c, decompress the parts in parallel and merge them in part order into viral.genomic.fna. With
+    downloader 'parallel' each part is decompressed while it downloads instead. If any part fails,
+    the merged file and the decompressed parts are removed, so no partial viral.genomic.fna is left.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    threads = threads or os.cpu_count() or 1
+    urls = list_release_parts(release_url)
+    output_fasta = os.path.join(output_dir, "viral.genomic.fna")
+    fasta_files = [os.path.join(output_dir, os.path.basename(url)[:-len(".gz")]) for url in urls]
+    if downloader == "parallel":
+        print(f"Downloading and decompressing {len(urls)} release files from {release_url}...")
+        try:
+            with ThreadPoolExecutor(min(threads, len(urls))) as pool, open(f"{output_fasta}.tmp", "wb") as merged:
+                parts = [pool.submit(fetch_part, url, fasta_file) for url, fasta_file in zip(urls, fasta_files)]
+                for part in parts:  # Merged in part order as soon as each part is ready
+                    with open(part.result(), "rb") as fasta:
+                        shutil.copyfileobj(fasta, merged, READ_BLOCK_SIZE)
+                    os.remove(fasta.name)
+        except BaseException:
+            remove_partial_release(output_fasta, fasta_files)
+            raise
+        os.replace(f"{output_fasta}.tmp", output_fasta)
+        return output_fasta
+
+    print(f"Downloading {len(urls)} release files from {release_url}...")
+    download_command = [
+        "aria2c",
+        "--file-allocation=none",
+        "-c",
+        "-j", str(min(threads, len(urls))),
+        "-x", "4",
+        "-s", "4",
+        "-d", output_dir,
+        "-i", "-"
+    ]
+    subprocess.run(download_command, input="\n".join(urls) + "\n", text=True, check=True)
+
+    print("Decompressing and merging release files...")
+    gz_files = [os.path.join(output_dir, os.path.basename(url)) for url in urls]
+    try:
+        with ThreadPoolExecutor(threads) as pool, open(f"{output_fasta}.tmp", "wb") as merged:
+            parts = [pool.submit(decompress_part, gz_file, fasta_file)
+                     for gz_file, fasta_file in zip(gz_files, fasta_files)]
+            for gz_file, part in zip(gz_files, parts):  # Merged in part order as soon as each part is ready
+                with open(part.result(), "rb") as fasta:
+                    shutil.copyfileobj(fasta, merged, READ_BLOCK_SIZE)
+                os.remove(fasta.name)
+                os.remove(gz_file)
+    except BaseException:
+        # The .gz files that are left are kept: aria2c -c resumes from them on the next run
+        remove_partial_release(output_fasta, fasta_files)
+        raise
+    os.replace(f"{output_fasta}.tmp", output_fasta)
+    return output_fasta
+
+def remove_partial_release(output_fasta, fasta_files):
+    """
+    Remove the merged file and the decompressed parts of a release download that failed.
+    """
+    for path in [f"{output_fasta}.tmp"] + fasta_files:
+        if os.path.exists(path):
+            os.remove(path)
+
+def filtered_path(input_fasta, suffix="_filtered"):
+    """
+    Return the path of the deduplicated FASTA (viral.1.1.genomic.fna -> viral.1.1.genomic_filtered.fna).
+    """
+    root, extension = os.path.splitext(input_fasta)
+    return f"{root}{suffix}{extension}"
+
 def filter_duplicates(input_fasta):
     """
     Step 2: Filter duplicates using dedupe.sh and save results to a new file.
     """
-    output_fasta = input_fasta.replace(".fna", "_filtered.fna").replace(".fasta", "_filtered.fasta").replace(".fa", "_filtered.fa")
+    output_fasta = filtered_path(input_fasta)
     log_file = os.path.join(os.path.dirname(input_fasta), "dedupe.log")
 
     print(f"Filtering duplicates from {input_fasta}...")
@@ -65,6 +209,441 @@ def filter_duplicates(input_fasta):
 
     return output_fasta
 
+def split_records(data):
+    """
+    Split a block of complete FASTA records into records (bytes, header and sequence lines as in the file).
+    Anything before the first header (blank lines, text) is skipped.
+    """
+    find = data.find
+    record_start = 0
+    if not data.startswith(b">"):
+        record_start = find(b"\n>") + 1
+        if not record_start:
+            return
+    start = find(b"\n>", record_start)
+    while start != -1:
+        yield data[record_start:start + 1]
+        record_start = start + 1
+        start = find(b"\n>", record_start)
+    last = data[record_start:]
+    if last.strip():
+        yield last if last.endswith(b"\n") else last + b"\n"
+
+def iter_fasta_records(input_fasta, block_size=READ_BLOCK_SIZE):
+    """
+    Stream the records of a FASTA file as bytes, reading it in blocks and splitting it at the lines
+    that start with '>'.
+    """
+    with open(input_fasta, "rb") as fasta:
+        pending = b""
+        while True:
+            block = fasta.read(block_size)
+            if not block:
+                break
+            data = pending + block
+            cut = data.rfind(b"\n>")  # The last record may continue in the next block
+            if cut == -1:
+                pending = data
+                continue
+            yield from split_records(data[:cut + 1])
+            pending = data[cut + 1:]
+        yield from split_records(pending)
+
+def record_id(record):
+    """
+    Return the sequence ID (first word of the header) of a FASTA record.
+    """
+    header = record.split(b"\n", 1)[0]
+    return header[1:].split(None, 1)[0].decode() if header[1:].strip() else ""
+
+def sequence_digest(record):
+    """
+    Return the 128-bit digest of a record's sequence as two 64-bit integers (high, low), and whether
+    the reverse complement was the strand hashed. A sequence and its reverse complement get the same
+    digest because the lexicographically smaller strand is hashed; case and line breaks are ignored.
+    RNA sequences (with U) are hashed as they are.
+    """
+    sequence = record.split(b"\n", 1)[1].translate(UPPER_TABLE, b"\r\n \t") if b"\n" in record else b""
+    reverse = sequence if b"U" in sequence else sequence.translate(COMPLEMENT_TABLE)[::-1]
+    canonical = min(sequence, reverse)
+    digest = hashlib.blake2b(canonical, digest_size=16).digest()
+    return (int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little"),
+            canonical is not sequence and reverse != sequence)
+
+class DigestTable:
+    """
+    Open-addressing (linear probing) hash table of 128-bit digests in NumPy arrays, mapping each digest
+    to an int64 value. Each slot takes 24 bytes and the table is kept at most half full, so memory
+    depends only on the number of unique digests. Lookups take arrays of digests and probe all of
+    them at once.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        self.hi = np.zeros(capacity, dtype=np.uint64)
+        self.lo = np.zeros(capacity, dtype=np.uint64)
+        self.values = np.full(capacity, -1, dtype=np.int64)  # -1 marks an empty slot
+        self.mask = capacity - 1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def setdefault(self, hi, lo, values):
+        """
+        Return the value stored for every digest (hi[i], lo[i]), inserting values[i] first if the digest
+        is new. Equivalent to inserting the digests one by one in order: a digest repeated in the arrays
+        gets the value of its first occurrence.
+        """
+        hi = np.asarray(hi, dtype=np.uint64)
+        lo = np.asarray(lo, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.int64)
+        # Sort by digest (stable, so input order within equal digests): every run is one distinct digest
+        order = np.lexsort((lo, hi))
+        distinct = np.ones(len(order), dtype=bool)
+        distinct[1:] = (hi[order][1:] != hi[order][:-1]) | (lo[order][1:] != lo[order][:-1])
+        first = order[distinct]
+        inverse = np.empty(len(order), dtype=np.int64)
+        inverse[order] = np.cumsum(distinct) - 1
+        while 2 * (self.size + len(first)) > len(self.values):
+            self._grow()
+        hi, lo, values = hi[first], lo[first], values[first]
+        found = np.empty(len(first), dtype=np.int64)
+        pending = np.arange(len(first))
+        slots = (lo & np.uint64(self.mask)).astype(np.int64)
+        while len(pending):
+            stored = self.values[slots]
+            empty = stored < 0
+            match = ~empty & (self.lo[slots] == lo[pending]) & (self.hi[slots] == hi[pending])
+            found[pending[match]] = stored[match]
+            # Digests probing the same empty slot: the first one takes it, the others probe on
+            claim = np.flatnonzero(empty)
+            claim = claim[np.unique(slots[claim], return_index=True)[1]]
+            new = pending[claim]
+            self.hi[slots[claim]], self.lo[slots[claim]] = hi[new], lo[new]
+            self.values[slots[claim]] = found[new] = values[new]
+            self.size += len(claim)
+            done = match
+            done[claim] = True
+            slots = np.where(empty, slots, (slots + 1) & self.mask)[~done]
+            pending = pending[~done]
+        return found[inverse]
+
+    def _grow(self):
+        """
+        Double the capacity and reinsert every digest.
+        """
+        used = np.flatnonzero(self.values >= 0)
+        hi, lo, values = self.hi[used], self.lo[used], self.values[used]
+        self.__init__(2 * len(self.values))
+        self.setdefault(hi, lo, values)
+
+def filter_duplicates_native(input_fasta):
+    """
+    Step 2 (native engine): Remove exact and reverse-complement duplicate sequences without dedupe.sh.
+    The FASTA is streamed and only a 128-bit digest per unique sequence is kept in memory; the first
+    record of each sequence is written to the _filtered file and the removed IDs are logged.
+    """
+    output_fasta = filtered_path(input_fasta)
+    log_file = os.path.join(os.path.dirname(input_fasta), "dedupe.log")
+
+    print(f"Filtering duplicates from {input_fasta} (native engine)...")
+    table = DigestTable()
+    kept_ids = {}  # Ordinal of the first record of every sequence -> (ID, strand hashed)
+    n_records = 0
+    records = iter_fasta_records(input_fasta)
+    with open(output_fasta, "wb") as output, open(log_file, "w") as log:
+        log.write("removed_id\tkept_id\tmatch\n")
+        for batch in iter(lambda: list(itertools.islice(records, DIGEST_BATCH)), []):
+            hi, lo, reverse = zip(*map(sequence_digest, batch))
+            ordinals = np.arange(n_records, n_records + len(batch))
+            kept_of = table.setdefault(hi, lo, ordinals)
+            for ordinal, kept, record, record_reverse in zip(ordinals.tolist(), kept_of.tolist(), batch, reverse):
+                if kept == ordinal:
+                    kept_ids[ordinal] = (record_id(record), record_reverse)
+                    output.write(record)
+                else:
+                    kept_id, kept_reverse = kept_ids[kept]
+                    log.write(f"{record_id(record)}\t{kept_id}\t"
+                              f"{'reverse_complement' if record_reverse != kept_reverse else 'exact'}\n")
+            n_records += len(batch)
+    print(f"Kept {len(kept_ids)} of {n_records} sequences; removed IDs are listed in {log_file}.")
+    return output_fasta
+
+def record_ranges(input_fasta, range_size=RANGE_SIZE):
+    """
+    Split a FASTA file into byte ranges of about range_size that start at a record.
+    """
+    size = os.path.getsize(input_fasta)
+    bounds = [0]
+    with open(input_fasta, "rb") as fasta:
+        while bounds[-1] + range_size < size:
+            fasta.seek(bounds[-1] + range_size)
+            fasta.readline()  # Move to the start of the next line
+            while True:
+                line_start = fasta.tell()
+                line = fasta.readline()
+                if not line or line.startswith(b">"):
+                    break
+            if line_start >= size:
+                break
+            bounds.append(line_start)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def hash_range(input_fasta, start, end):
+    """
+    Sharded mode, pass 1 (worker): digest the records in a byte range of the FASTA file.
+    Returns the digests as a SPILL_DTYPE array (ordinals relative to the range) and the record IDs.
+    """
+    with open(input_fasta, "rb") as fasta:
+        fasta.seek(start)
+        records = list(split_records(fasta.read(end - start)))
+    digests = np.zeros(len(records), dtype=SPILL_DTYPE)
+    digests["ordinal"] = np.arange(len(records))
+    for i, record in enumerate(records):
+        digests["hi"][i], digests["lo"][i], digests["reverse"][i] = sequence_digest(record)
+    return digests, [record_id(record) for record in records]
+
+def dedupe_shard(spill_file, ids_file, kept_file, log_file):
+    """
+    Sharded mode, pass 2 (worker): find the first record of every digest in one shard. Saves the kept
+    ordinals (sorted) and writes the log lines of the removed records, prefixed with their ordinal.
+    Memory is bounded by the size of the shard.
+    """
+    digests = np.fromfile(spill_file, dtype=SPILL_DTYPE)
+    with open(ids_file) as ids:
+        record_ids = ids.read().splitlines()
+    # Sort by digest, then input order: the first record of each run of equal digests is kept
+    order = np.lexsort((digests["ordinal"], digests["lo"], digests["hi"]))
+    hi, lo = digests["hi"][order], digests["lo"][order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (hi[1:] != hi[:-1]) | (lo[1:] != lo[:-1])
+    kept_of = order[np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))]
+    np.save(kept_file, np.sort(digests["ordinal"][order[first]]))
+    removed = np.flatnonzero(~first)
+    removed = removed[np.argsort(digests["ordinal"][order[removed]])]
+    with open(log_file, "w") as log:
+        for i in removed.tolist():
+            row, kept_row = order[i], kept_of[i]
+            match = "exact" if digests["reverse"][row] == digests["reverse"][kept_row] else "reverse_complement"
+            log.write(f"{digests['ordinal'][row]}\t{record_ids[row]}\t{record_ids[kept_row]}\t{match}\n")
+    return len(order) - len(removed)
+
+def filter_duplicates_sharded(input_fasta, threads=None, shards=64):
+    """
+    Step 2 (sharded engine): Remove exact and reverse-complement duplicates with a pool of worker processes.
+    Pass 1 digests record-aligned byte ranges in parallel and spills (ordinal, digest) entries into `shards`
+    files by digest; pass 2 deduplicates each shard in a worker; pass 3 streams the input again and writes
+    the kept records in input order. Per-worker memory is bounded by the shard size.
+    """
+    output_fasta = filtered_path(input_fasta)
+    log_file = os.path.join(os.path.dirname(input_fasta), "dedupe.log")
+    threads = threads or os.cpu_count() or 1
+
+    print(f"Filtering duplicates from {input_fasta} (sharded engine, {threads} workers, {shards} shards)...")
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(input_fasta))) as spill_dir, \
+            ProcessPoolExecutor(threads) as pool:
+        paths = [{name: os.path.join(spill_dir, f"shard{shard}.{name}") for name in ("spill", "ids", "kept", "log")}
+                 for shard in range(shards)]
+        for shard_paths in paths:
+            open(shard_paths["spill"], "wb").close()
+            open(shard_paths["ids"], "w").close()
+
+        # Pass 1: digest byte ranges in parallel, spill the digests by shard in input order
+        n_records = 0
+        ranges = record_ranges(input_fasta)
+        for digests, record_ids in pool.map(hash_range, [input_fasta] * len(ranges),
+                                            *zip(*ranges) if ranges else ((), ())):
+            digests["ordinal"] += n_records
+            n_records += len(digests)
+            shard_of = digests["hi"] % shards
+            for shard in np.unique(shard_of).tolist():
+                rows = np.flatnonzero(shard_of == shard)
+                with open(paths[shard]["spill"], "ab") as spill:
+                    digests[rows].tofile(spill)
+                with open(paths[shard]["ids"], "a") as ids:
+                    ids.write("".join(f"{record_ids[row]}\n" for row in rows.tolist()))
+
+        # Pass 2: deduplicate every shard independently
+        futures = [pool.submit(dedupe_shard, p["spill"], p["ids"], p["kept"] + ".npy", p["log"]) for p in paths]
+        n_kept = sum(future.result() for future in futures)
+
+        # Pass 3: write the kept records and the log in input order
+        keep = np.zeros(n_records, dtype=bool)
+        for shard_paths in paths:
+            keep[np.load(shard_paths["kept"] + ".npy")] = True
+        with open(output_fasta, "wb") as output:
+            for keep_record, record in zip(keep.tolist(), iter_fasta_records(input_fasta)):
+                if keep_record:
+                    output.write(record)
+        shard_logs = [open(shard_paths["log"]) for shard_paths in paths]
+        try:
+            with open(log_file, "w") as log:
+                log.write("removed_id\tkept_id\tmatch\n")
+                for line in heapq.merge(*shard_logs, key=lambda line: int(line.split("\t", 1)[0])):
+                    log.write(line.split("\t", 1)[1])
+        finally:
+            for shard_log in shard_logs:
+                shard_log.close()
+    print(f"Kept {n_kept} of {n_records} sequences; removed IDs are listed in {log_file}.")
+    return output_fasta
+
+def pack_kmers(codes, kmer_size):
+    """
+    Return the 2-bit packed k-mer starting at every position of codes (uint64 base codes), built by
+    doubling the k-mer length (log2(k) array passes instead of k).
+    """
+    packed, packed_size = None, 0  # k-mers assembled so far
+    block, block_size = codes, 1  # k-mers of a power-of-two length
+    while True:
+        if kmer_size & block_size:
+            if packed is None:
+                packed, packed_size = block, block_size
+            else:
+                n = len(codes) - packed_size - block_size + 1
+                packed = (packed[:n] << np.uint64(2 * block_size)) | block[packed_size:packed_size + n]
+                packed_size += block_size
+        if 2 * block_size > kmer_size:
+            return packed
+        block = (block[:-block_size] << np.uint64(2 * block_size)) | block[block_size:]
+        block_size *= 2
+
+def mix64(values):
+    """
+    SplitMix64 finaliser: scramble uint64 values into well-distributed hashes (in place).
+    """
+    values ^= values >> np.uint64(30)
+    values *= np.uint64(0xBF58476D1CE4E5B9)
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(0x94D049BB133111EB)
+    values ^= values >> np.uint64(31)
+    return values
+
+def minhash_sketch(record, kmer_size=21, sketch_size=256):
+    """
+    One-permutation MinHash sketch of a record's canonical k-mers: every k-mer is hashed once, the top
+    bits of the hash choose one of sketch_size bins and each bin keeps the low 32 bits of its smallest
+    hash (EMPTY_BIN when no k-mer falls in it). K-mers with bases other than ACGT/U are skipped.
+    """
+    sketch = np.full(sketch_size, EMPTY_BIN, dtype=np.uint32)
+    sequence = record.split(b"\n", 1)[1].translate(None, b"\r\n \t") if b"\n" in record else b""
+    if len(sequence) < kmer_size:
+        return sketch
+    codes = BASE_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+    invalid = np.concatenate(([0], np.cumsum(codes == 4)))
+    valid = invalid[kmer_size:] == invalid[:-kmer_size]
+    codes = np.where(codes == 4, 0, codes).astype(np.uint64)
+    forward = pack_kmers(codes, kmer_size)
+    reverse = pack_kmers((3 - codes)[::-1], kmer_size)[::-1]
+    hashes = mix64(np.minimum(forward, reverse)[valid] ^ np.uint64(MINHASH_SEED))
+    if len(hashes):
+        hashes.sort()
+        bins = (hashes >> np.uint64(64 - sketch_size.bit_length() + 1)).astype(np.int64)
+        first = np.concatenate(([True], bins[1:] != bins[:-1]))  # Smallest hash of each bin
+        sketch[bins[first]] = hashes[first].astype(np.uint32)
+    return sketch
+
+def sketch_range(input_fasta, start, end, kmer_size, sketch_size):
+    """
+    Clustering pass 1 (worker): sketch the records in a byte range of the FASTA file.
+    Returns the record IDs, their sequence lengths and their sketches (one row per record).
+    """
+    with open(input_fasta, "rb") as fasta:
+        fasta.seek(start)
+        records = list(split_records(fasta.read(end - start)))
+    sketches = np.empty((len(records), sketch_size), dtype=np.uint32)
+    lengths = np.empty(len(records), dtype=np.int64)
+    for i, record in enumerate(records):
+        sketches[i] = minhash_sketch(record, kmer_size, sketch_size)
+        lengths[i] = len(record.split(b"\n", 1)[1].translate(None, b"\r\n \t")) if b"\n" in record else 0
+    return [record_id(record) for record in records], lengths, sketches
+
+def ani_to_jaccard(ani, kmer_size):
+    """
+    Jaccard index of the k-mer sets of two genomes at a given ANI (inverse of the Mash distance).
+    """
+    shared = math.exp(-kmer_size * (1 - ani))
+    return shared / (2 - shared)
+
+def jaccard_to_ani(jaccard, kmer_size):
+    """
+    ANI estimated from the Jaccard index of two k-mer sets (Mash distance), element-wise.
+    """
+    jaccard = np.asarray(jaccard, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        ani = 1 + np.log(2 * jaccard / (1 + jaccard)) / kmer_size
+    return np.clip(ani, 0, 1)
+
+def lsh_rows(sketch_size, jaccard):
+    """
+    Rows per LSH band: the largest power of two whose banding threshold (1/bands)^(1/rows) stays at or
+    below 0.8 x the target Jaccard index, so pairs at the threshold almost always share a band.
+    """
+    rows = 1
+    while rows * 2 <= sketch_size and (rows * 2 / sketch_size) ** (1 / (rows * 2)) <= 0.8 * jaccard:
+        rows *= 2
+    return rows
+
+def cluster_genomes(input_fasta, ani=0.95, kmer_size=21, sketch_size=256, threads=None):
+    """
+    Step 3 (optional): Cluster near-identical genomes and keep one representative per cluster.
+    Every genome is sketched with MinHash in worker processes; candidate pairs come from LSH banding of
+    the sketches and are accepted when their estimated ANI is >= ani. Genomes are clustered greedily,
+    longest first, so the representative is the longest genome of its cluster. Representatives are written
+    to the _clustered file in input order and every genome's cluster is listed in clusters.tsv.
+    """
+    output_fasta = filtered_path(input_fasta, "_clustered")
+    cluster_file = os.path.join(os.path.dirname(input_fasta), "clusters.tsv")
+    threads = threads or os.cpu_count() or 1
+    rows = lsh_rows(sketch_size, ani_to_jaccard(ani, kmer_size))
+    bands = sketch_size // rows
+
+    print(f"Clustering {input_fasta} at {ani:.2%} ANI (k={kmer_size}, {sketch_size} bins, {bands} bands of {rows})...")
+    ids, lengths, sketches = [], [], []
+    ranges = record_ranges(input_fasta)
+    with ProcessPoolExecutor(threads) as pool:
+        for range_ids, range_lengths, range_sketches in pool.map(
+                sketch_range, *zip(*[(input_fasta, start, end, kmer_size, sketch_size) for start, end in ranges])):
+            ids.extend(range_ids)
+            lengths.append(range_lengths)
+            sketches.append(range_sketches)
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    sketches = np.concatenate(sketches) if sketches else np.zeros((0, sketch_size), dtype=np.uint32)
+    filled = sketches != EMPTY_BIN
+
+    representative = np.arange(len(ids))
+    identity = np.ones(len(ids))
+    buckets = [{} for _ in range(bands)]
+    for genome in np.lexsort((np.arange(len(ids)), -lengths)).tolist():
+        if not filled[genome].any():  # Shorter than k: its own cluster
+            continue
+        band_keys = [key.tobytes() for key in sketches[genome].reshape(bands, rows)]
+        candidates = {rep for band, key in enumerate(band_keys) for rep in buckets[band].get(key, ())}
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            shared = ((sketches[candidates] == sketches[genome]) & filled[genome]).sum(axis=1)
+            used = (filled[candidates] | filled[genome]).sum(axis=1)
+            estimates = jaccard_to_ani(shared / used, kmer_size)
+            best = int(np.argmax(estimates))
+            if estimates[best] >= ani:
+                representative[genome] = candidates[best]
+                identity[genome] = estimates[best]
+                continue
+        for band, key in enumerate(band_keys):
+            buckets[band].setdefault(key, []).append(genome)
+
+    with open(output_fasta, "wb") as output:
+        for genome, record in enumerate(iter_fasta_records(input_fasta)):
+            if representative[genome] == genome:
+                output.write(record)
+    with open(cluster_file, "w") as clusters:
+        clusters.write("member_id\trepresentative_id\tani\n")
+        for genome, rep in enumerate(representative.tolist()):
+            clusters.write(f"{ids[genome]}\t{ids[rep]}\t{identity[genome]:.4f}\n")
+    n_clusters = int((representative == np.arange(len(ids))).sum())
+    print(f"Kept {n_clusters} representatives of {len(ids)} genomes; cluster membership is listed in {cluster_file}.")
+    return output_fasta
+
 def main():
     parser = argparse.ArgumentParser(description="Download, unzip, and optionally filter duplicate FASTA sequences.")
 
@@ -74,6 +653,31 @@ def main():
         default="https://ftp.ncbi.nlm.nih.gov/refseq/release/viral/viral.1.1.genomic.fna.gz",
         help="URL to download the FASTA file. Default: RefSeq Viral Genomes"
     )
+    parser.add_argument(
+        "--release",
+        action="store_true",
+        help="Download every viral.*.genomic.fna.gz file of the RefSeq release (instead of --url) and merge them "
+             "in part order into viral.genomic.fna."
+    )
+    parser.add_argument(
+        "--release-url",
+        default=RELEASE_URL,
+        help=f"RefSeq release directory for --release. Default: {RELEASE_URL}"
+    )
+    parser.add_argument(
+        "--downloader",
+        choices=["aria2c", "parallel"],
+        default="aria2c",
+        help="Download with aria2c and then gunzip, or 'parallel': in-process parallel Range requests with the "
+             "file decompressed while it downloads (needs ../parallel_download). Default: aria2c."
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=CONNECTIONS,
+        help=f"Parallel Range requests for --downloader parallel (--release uses {PART_CONNECTIONS} per file). "
+             f"Default: {CONNECTIONS}."
+    )
     parser.add_argument(
         "--output-dir",
         default="my_output",
@@ -84,6 +688,46 @@ def main():
         action="store_true",
         help="Skip the duplicate filtering step. Default: False (perform deduplication)."
     )
+    parser.add_argument(
+        "--dedup-engine",
+        choices=["dedupe", "native", "sharded"],
+        default="dedupe",
+        help="Deduplication engine: 'dedupe' (BBTools dedupe.sh, needs Java and a 20 GB heap), 'native' "
+             "(built-in exact and reverse-complement deduplication with a compact digest table) or 'sharded' "
+             "(the native deduplication split into digest shards over --threads worker processes). Default: dedupe."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes for --dedup-engine sharded and --cluster-ani, and concurrent downloads and "
+             "decompressions for --release. Default: number of CPUs."
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=64,
+        help="Number of digest shards for --dedup-engine sharded; more shards lower the memory of each worker. Default: 64."
+    )
+    parser.add_argument(
+        "--cluster-ani",
+        type=float,
+        help="Cluster near-identical genomes after deduplication at this ANI (e.g. 0.95) with MinHash/LSH and keep "
+             "one representative (the longest genome) per cluster. Default: no clustering."
+    )
+    parser.add_argument(
+        "--kmer-size",
+        type=int,
+        default=21,
+        help="K-mer size for --cluster-ani (at most 32). Default: 21."
+    )
+    parser.add_argument(
+        "--sketch-size",
+        type=int,
+        default=256,
+        help="MinHash bins per genome for --cluster-ani (a power of two); larger sketches estimate ANI more "
+             "precisely. Default: 256."
+    )
     parser.add_argument(
         "--remove-intermediate",
         action="store_true",
@@ -91,18 +735,35 @@ def main():
     )
 
     args = parser.parse_args()
+    if args.cluster_ani is not None and not 0 < args.cluster_ani <= 1:
+        parser.error("--cluster-ani must be between 0 and 1.")
+    if not 1 <= args.kmer_size <= 32:
+        parser.error("--kmer-size must be between 1 and 32.")
+    if args.sketch_size < 2 or args.sketch_size & (args.sketch_size - 1):
+        parser.error("--sketch-size must be a power of two.")
+    if args.downloader == "parallel" and parallel_download is None:
+        parser.error("--downloader parallel needs parallel_download.py from the parallel_download directory of this repository.")
 
     # Step 1: Download and unzip
     try:
-        input_fasta = download_and_unzip(args.url, args.output_dir)
+        if args.release:
+            input_fasta = download_release(args.release_url, args.output_dir, args.threads, args.downloader)
+        else:
+            input_fasta = download_and_unzip(args.url, args.output_dir, args.downloader, args.connections)
     except Exception as e:
         print(f"Error during download/unzipping: {e}")
         return
 
     # Step 2: Filter duplicates (if not skipped)
+    filtered_fasta = input_fasta
     if not args.skip_deduplication:
         try:
-            filtered_fasta = filter_duplicates(input_fasta)
+            if args.dedup_engine == "native":
+                filtered_fasta = filter_duplicates_native(input_fasta)
+            elif args.dedup_engine == "sharded":
+                filtered_fasta = filter_duplicates_sharded(input_fasta, args.threads, args.shards)
+            else:
+                filtered_fasta = filter_duplicates(input_fasta)
             print(f"Filtered FASTA file saved to: {filtered_fasta}")
             
             # Remove intermediate files if requested
@@ -116,5 +777,15 @@ def main():
     else:
         print(f"Duplicate filtering skipped. Original file is: {input_fasta}")
 
+    # Step 3: Cluster near-identical genomes (if requested)
+    if args.cluster_ani is not None:
+        try:
+            clustered_fasta = cluster_genomes(filtered_fasta, args.cluster_ani, args.kmer_size, args.sketch_size,
+                                              args.threads)
+            print(f"Clustered FASTA file saved to: {clustered_fasta}")
+        except Exception as e:
+            print(f"Error during clustering: {e}")
+            return
+
 if __name__ == "__main__":
     main()
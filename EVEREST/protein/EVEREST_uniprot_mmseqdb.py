@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 
 import os
-import gzip
+import sys
+import zlib
+import hashlib
 import argparse
-import pandas as pd
 import subprocess
+from contextlib import ExitStack, suppress
+from tqdm import tqdm
+
+# Shared conditional download (../../parallel_download/download_state.py): .md5 sidecar and HTTP validator checks,
+# parallel Range requests and extraction while the taxonomy dump downloads.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "parallel_download"))
+from download_state import CONNECTIONS, download_if_changed, open_download, save_download_state
+
+# Shared FASTA header scanner (../../fasta_scan)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "fasta_scan"))
+from fasta_scan import SCAN_BLOCK_SIZE, block_headers, parse_uniprot_header
 
 __author__ = "Patricia Agudelo-Romero, PhD"
 
+STREAM_BUFFER_SIZE = 1024 * 1024  # Compressed bytes read per step by the fused decompress/parse stage
+TAXONOMY_FILES = ["nodes.dmp", "names.dmp"]  # Extracted files that must exist to skip an unchanged dump
+
 def check_file_exists(file_path, description="file"):
     """
     Check if a file exists and print an error message if it doesn't.
@@ -37,58 +52,243 @@ def download_with_progress(url, output_path):
         raise RuntimeError(f"aria2c failed with return code {process.returncode}.")
     print(f"Download completed: {output_path}")
 
-def decompress_fasta_gz(input_gz_path, output_fasta_path):
+def write_taxid_lines(data, taxid_file):
+    """
+    Write the accession/taxid TSV lines of the complete headers in a block of FASTA.
+
+    :param data: Block of FASTA data that starts with a newline or at the start of a line.
+    :param taxid_file: Binary file object of the TSV file.
+    :return: The data after the last line end, to prepend to the next block.
+    """
+    cut = data.rfind(b"\n")
+    if cut == -1:
+        return data
+    lines = "".join(f"{accession}\t{taxid}\n"
+                    for accession, taxid in map(parse_uniprot_header, block_headers(data, cut)))
+    taxid_file.write(lines.encode())
+    return data[cut:]
+
+def stream_fasta_and_taxids(compressed, fasta_path, taxid_path=None, gz_path=None, total=None):
+    """
+    Decompress a gzipped FASTA stream once, writing the decompressed FASTA and the taxid TSV at the same time.
+
+    Decompressing to disk and then parsing the FASTA would read the data three times. Outputs are written to temporary files and renamed when the stream is complete; they are removed if it fails.
+
+    :param compressed: Binary file object with gzipped FASTA (an open .gz file or an HTTP response).
+    :param fasta_path: Path to save the decompressed FASTA file.
+    :param taxid_path: Path to save the taxid TSV file (None to skip it).
+    :param gz_path: Path to also save the compressed stream (None to skip it).
+    :param total: Size of the compressed stream in bytes, for the progress bar (None if unknown).
+    """
+    print(f"Decompressing to {fasta_path}" + (f" and extracting taxids to {taxid_path}" if taxid_path else ""))
+    outputs = [(path, f"{path}.tmp") for path in (fasta_path, taxid_path, gz_path) if path]
+    for path, _ in outputs:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with ExitStack() as stack:
+            fasta_file = stack.enter_context(open(f"{fasta_path}.tmp", 'wb'))
+            taxid_file = stack.enter_context(open(f"{taxid_path}.tmp", 'wb')) if taxid_path else None
+            gz_file = stack.enter_context(open(f"{gz_path}.tmp", 'wb')) if gz_path else None
+            pbar = stack.enter_context(tqdm(total=total, unit="B", unit_scale=True, ncols=100, desc="Decompressing"))
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            in_member = False
+            carry = b"\n"  # A newline before the first line lets the header scan find a header on line 1
+            while True:
+                chunk = compressed.read(STREAM_BUFFER_SIZE)
+                if not chunk:
+                    break
+                pbar.update(len(chunk))
+                if gz_file:
+                    gz_file.write(chunk)
+                while chunk:
+                    data = decompressor.decompress(chunk)
+                    in_member = not decompressor.eof
+                    fasta_file.write(data)
+                    if taxid_file:
+                        carry = write_taxid_lines(carry + data, taxid_file)
+                    chunk = b""
+                    if decompressor.eof:  # Concatenated gzip members
+                        chunk = decompressor.unused_data
+                        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            if in_member:
+                raise EOFError("Compressed FASTA stream ended before the end of the gzip data.")
+            if taxid_file and carry.startswith(b"\n>"):  # The last header has no line end
+                write_taxid_lines(carry + b"\n", taxid_file)
+    except Exception:
+        for _, tmp_path in outputs:  # A truncated or failed stream leaves no partial outputs behind
+            with suppress(FileNotFoundError):
+                os.remove(tmp_path)
+        raise
+    for path, tmp_path in outputs:
+        os.replace(tmp_path, path)
+    print(f"Decompressed to: {fasta_path}")
+    if taxid_path:
+        print(f"Output written to: {taxid_path}")
+
+def iter_fasta_records(path, progress=None, block_size=SCAN_BLOCK_SIZE):
     """
-    Decompress a .fasta.gz file to .fasta format.
+    Yield the records of a FASTA file as (header, sequence) bytes, with the sequence lines joined.
 
-    :param input_gz_path: Path to the input .fasta.gz file.
-    :param output_fasta_path: Path to save the decompressed .fasta file.
+    :param path: Path to the FASTA file.
+    :param progress: Optional tqdm bar (total = file size) updated with the bytes read.
+    :param block_size: Bytes read per block.
     """
-    print(f"Decompressing: {input_gz_path} to {output_fasta_path}")
-    with gzip.open(input_gz_path, 'rt') as gz_file:
-        with open(output_fasta_path, 'w') as fasta_file:
-            fasta_file.writelines(gz_file)
-    print(f"Decompressed to: {output_fasta_path}")
+    with open(path, 'rb') as fasta:
+        pending = b""
+        while True:
+            block = fasta.read(block_size)
+            if progress is not None:
+                progress.update(len(block))
+            data = pending + block
+            cut = data.rfind(b"\n>") if block else len(data)  # The last record may continue in the next block
+            if cut == -1:
+                pending = data
+                continue
+            for record in data[:cut].split(b"\n>"):
+                if record.strip():
+                    header, _, sequence = record.lstrip(b">").partition(b"\n")
+                    yield header.rstrip(b"\r"), sequence.translate(None, b"\r\n ")
+            if not block:
+                break
+            pending = data[cut + 1:]
 
-def parse_fasta_to_dataframe_with_progress(file_path, output_file):
+def load_taxonomy_tree(taxonomy_dir):
     """
-    Parse a FASTA file and extract taxonomic IDs and sequence identifiers.
+    Load the parent of every taxid from nodes.dmp, and the merged taxids from merged.dmp if present.
 
-    :param file_path: Path to the input FASTA file.
-    :param output_file: Path to the output TSV file.
+    :param taxonomy_dir: Directory containing the NCBI taxonomy files.
+    :return: Tuple (parents, merged): dicts taxid -> parent taxid and old taxid -> current taxid (int).
     """
-    rows = []
-    print(f"Parsing FASTA file: {file_path}")
-    with open(file_path, 'r') as fasta_file:
-        for line in fasta_file:
-            if line.startswith(">"):
-                parts = line.split('|')
-                between_pipes = parts[1] if len(parts) > 1 else "N/A"
-                ox_index = line.find("OX=")
-                ox_string = line[ox_index + 3:].split()[0] if ox_index != -1 else "N/A"
-                rows.append([between_pipes, ox_string])
-    df = pd.DataFrame(rows)
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    df.to_csv(output_file, sep="\t", index=False, header=False)
-    print(f"Output written to: {output_file}")
+    parents = {}
+    with open(os.path.join(taxonomy_dir, "nodes.dmp")) as nodes:
+        for line in nodes:
+            taxid, parent, _ = line.split("\t|\t", 2)
+            parents[int(taxid)] = int(parent)
+    merged = {}
+    merged_path = os.path.join(taxonomy_dir, "merged.dmp")
+    if os.path.isfile(merged_path):
+        with open(merged_path) as merged_file:
+            for line in merged_file:
+                old_taxid, new_taxid = line.rstrip("\t|\n").split("\t|\t")
+                merged[int(old_taxid)] = int(new_taxid)
+    return parents, merged
 
-def download_and_extract_taxonomy(url, output_dir):
+def lowest_common_ancestor(taxids, parents, merged):
     """
-    Download and extract NCBI taxonomy dump.
+    Return the lowest common ancestor of a set of taxids.
+
+    Taxids missing from nodes.dmp (after resolving merged taxids) are ignored; if none is known,
+    the smallest taxid is returned unchanged.
+
+    :param taxids: Taxids (str, as in the UniProt OX= field).
+    :param parents: Dict taxid -> parent taxid from nodes.dmp.
+    :param merged: Dict old taxid -> current taxid from merged.dmp.
+    :return: The LCA taxid (str).
+    """
+    known = []
+    for taxid in taxids:
+        if taxid.isdigit():
+            taxid = merged.get(int(taxid), int(taxid))
+            if taxid in parents:
+                known.append(taxid)
+    if not known:
+        return min(taxids)
+    lineage = [known[0]]  # Path from the first taxid to the root
+    while parents[lineage[-1]] != lineage[-1]:
+        lineage.append(parents[lineage[-1]])
+    depth = {taxid: i for i, taxid in enumerate(lineage)}
+    lca = 0  # Index of the LCA in lineage
+    for taxid in known[1:]:
+        while taxid not in depth:
+            taxid = parents[taxid]
+        lca = max(lca, depth[taxid])
+    return str(lineage[lca])
+
+def collapse_identical_proteins(fasta_path, taxonomy_dir, collapsed_fasta_path, collapsed_taxid_path, members_path):
+    """
+    Collapse byte-identical protein sequences before the MMseqs2 database is built.
+
+    The first record of each sequence is kept as the representative. It is mapped to the lowest common
+    ancestor (from nodes.dmp) of the taxids (OX=) of all records with that sequence. Sequences are
+    compared by their 128-bit BLAKE2b digest.
+
+    :param fasta_path: Path to the input FASTA file.
+    :param taxonomy_dir: Directory containing the NCBI taxonomy files (nodes.dmp, merged.dmp).
+    :param collapsed_fasta_path: Path to save the FASTA file with one record per unique sequence.
+    :param collapsed_taxid_path: Path to save the taxid TSV of the representatives.
+    :param members_path: Path to save the TSV listing the representative of every collapsed accession.
+    """
+    print(f"Collapsing identical sequences in: {fasta_path}")
+    parents, merged = load_taxonomy_tree(taxonomy_dir)
+    representatives = {}  # Sequence digest -> index in rep_accessions
+    rep_accessions, rep_taxids = [], []  # Taxid per representative: str, or a set when members differ
+    members = []  # (representative index, accession) of every collapsed record
+    for path in (collapsed_fasta_path, collapsed_taxid_path, members_path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(collapsed_fasta_path, 'wb') as fasta_file, \
+            tqdm(total=os.path.getsize(fasta_path), unit="B", unit_scale=True, ncols=100, desc="Collapsing") as pbar:
+        for header, sequence in iter_fasta_records(fasta_path, pbar):
+            accession, taxid = parse_uniprot_header(header)
+            digest = hashlib.blake2b(sequence.upper(), digest_size=16).digest()
+            index = representatives.setdefault(digest, len(rep_accessions))
+            if index == len(rep_accessions):
+                rep_accessions.append(accession)
+                rep_taxids.append(taxid)
+                fasta_file.write(b">" + header + b"\n" + sequence + b"\n")
+            else:
+                members.append((index, accession))
+                if rep_taxids[index] != taxid:
+                    if isinstance(rep_taxids[index], str):
+                        rep_taxids[index] = {rep_taxids[index]}
+                    rep_taxids[index].add(taxid)
+
+    with open(collapsed_taxid_path, 'w') as taxid_file:
+        for accession, taxid in zip(rep_accessions, rep_taxids):
+            if not isinstance(taxid, str):
+                taxid = lowest_common_ancestor(taxid, parents, merged)
+            taxid_file.write(f"{accession}\t{taxid}\n")
+    with open(members_path, 'w') as members_file:
+        members_file.write("representative\tmember\n")
+        for index, accession in members:
+            members_file.write(f"{rep_accessions[index]}\t{accession}\n")
+    print(f"Kept {len(rep_accessions)} of {len(rep_accessions) + len(members)} sequences; "
+          f"collapsed accessions are listed in {members_path}")
+
+def tqdm_progress(stream, total, description):
+    """
+    Progress hook for download_if_changed: a tqdm bar over the bytes read from the download.
+
+    :param stream: Open download.
+    :param total: Size of the download in bytes (None if unknown).
+    :param description: Label of the progress bar.
+    :return: Context manager yielding the wrapped stream.
+    """
+    return tqdm.wrapattr(stream, "read", total=total, ncols=100, desc=description)
+
+def download_and_extract_taxonomy(url, output_dir, force=False, connections=CONNECTIONS):
+    """
+    Download and extract NCBI taxonomy dump, unless it is unchanged since the last run.
 
     :param url: URL to download the taxonomy dump.
     :param output_dir: Directory to save the downloaded and extracted files.
+    :param force: If True, download and extract even if the .md5 sidecar or HTTP validators show no change.
+    :param connections: Parallel Range requests with the parallel_download module.
     """
     os.makedirs(output_dir, exist_ok=True)
     print(f"Downloading taxonomy data from: {url}")
-    download_command = [
-        "aria2c", "--file-allocation=none", "-c", "-x", "10", "-s", "10", "-d", output_dir, url
-    ]
-    subprocess.run(download_command, check=True)
-    downloaded_file = os.path.join(output_dir, os.path.basename(url))
-    print(f"Extracting taxonomy data: {downloaded_file}")
-    subprocess.run(["tar", "-xvzf", downloaded_file, "-C", output_dir], check=True)
-    os.remove(downloaded_file)
+    downloaded = download_if_changed(url, output_dir, [os.path.join(output_dir, name) for name in TAXONOMY_FILES],
+                                     force, ("untar", output_dir), connections, tqdm_progress)
+    if downloaded is None:
+        print(f"Taxonomy data is up to date in: {output_dir}")
+        return
+    downloaded_file, entry = downloaded
+    if downloaded_file is not None:  # Downloaded without parallel_download: extract in a second pass
+        print(f"Extracting taxonomy data: {downloaded_file}")
+        subprocess.run(["tar", "-xvzf", downloaded_file, "-C", output_dir], check=True)
+        os.remove(downloaded_file)
+    save_download_state(output_dir, url, entry)
     print(f"Taxonomy data extracted to: {output_dir}")
 
 def build_mmseqs_db(fasta_path, taxid_path, taxonomy_dir, db_output_dir):
@@ -123,8 +323,12 @@ def main():
     parser.add_argument("--output", type=str, default="taxid_aa/taxid_aa.tsv", help="Path to the output TSV file (default: taxid_aa/taxid_aa.tsv).")
     parser.add_argument("--keep-intermediate", action="store_true", help="Keep the intermediate .fasta.gz file after decompression.")
     parser.add_argument("--skip-taxonomy", action="store_true", help="Skip downloading and extracting taxonomy data.")
+    parser.add_argument("--force-taxonomy", action="store_true", help="Download and extract the taxonomy data even if it is unchanged since the last run.")
     parser.add_argument("--skip-taxid", action="store_true", help="Skip extracting taxid and parsing FASTA to TSV.")
     parser.add_argument("--skip-mmseqs", action="store_true", help="Skip building the MMseqs2 database.")
+    parser.add_argument("--collapse-identical", action="store_true", help="Collapse identical protein sequences before building the MMseqs2 database; each representative is mapped to the LCA taxid of its members.")
+    parser.add_argument("--stream-download", action="store_true", help="Decompress and parse the UniProt download as it arrives instead of saving the .fasta.gz first (with --keep-intermediate the .fasta.gz is saved from the same stream).")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS, help=f"Parallel Range requests per download when the server supports them and ../../parallel_download is available (default: {CONNECTIONS}).")
 
     args = parser.parse_args()
 
@@ -137,25 +341,39 @@ def main():
     gz_path = os.path.join(output_dir, f"viral_proteomes_{args.db}.fasta.gz")
     fasta_path = gz_path.replace(".fasta.gz", ".fasta")
 
-    download_with_progress(db_urls[args.db], gz_path)
-    decompress_fasta_gz(gz_path, fasta_path)
-
-    if not args.skip_taxid:
-        parse_fasta_to_dataframe_with_progress(fasta_path, args.output)
-
-    if not args.keep_intermediate:
-        os.remove(gz_path)
-        print(f"Intermediate file '{gz_path}' has been deleted.")
+    taxid_path = None if args.skip_taxid else args.output
+    if args.stream_download:
+        # Decompress and parse the HTTP response directly: the .fasta.gz never has to be written to disk
+        print(f"Starting download: {db_urls[args.db]}")
+        with open_download(db_urls[args.db], connections=args.connections) as response:
+            total = getattr(response, "size", None) or int(response.headers.get("Content-Length") or 0) or None
+            stream_fasta_and_taxids(response, fasta_path, taxid_path, gz_path if args.keep_intermediate else None, total)
+    else:
+        download_with_progress(db_urls[args.db], gz_path)
+        with open(gz_path, 'rb') as gz_file:
+            stream_fasta_and_taxids(gz_file, fasta_path, taxid_path, total=os.path.getsize(gz_path))
+        if not args.keep_intermediate:
+            os.remove(gz_path)
+            print(f"Intermediate file '{gz_path}' has been deleted.")
 
     if not args.skip_taxonomy:
         taxonomy_url = "ftp://ftp.ncbi.nlm.nih.gov/pub/taxonomy/taxdump.tar.gz"
-        download_and_extract_taxonomy(taxonomy_url, "TAX")
+        download_and_extract_taxonomy(taxonomy_url, "TAX", args.force_taxonomy, args.connections)
 
-    if not args.skip_mmseqs:
+    db_fasta_path, db_taxid_path = fasta_path, args.output
+    if args.collapse_identical:
         check_file_exists(fasta_path, "FASTA file")
-        check_file_exists(args.output, "TaxID file")
         check_file_exists("TAX/nodes.dmp", "taxonomy nodes.dmp file")
-        build_mmseqs_db(fasta_path, args.output, "TAX", "DB_MMSEQ2_aa")
+        db_fasta_path = fasta_path.replace(".fasta", "_collapsed.fasta")
+        db_taxid_path = os.path.splitext(args.output)[0] + "_collapsed.tsv"
+        members_path = os.path.splitext(args.output)[0] + "_collapsed_members.tsv"
+        collapse_identical_proteins(fasta_path, "TAX", db_fasta_path, db_taxid_path, members_path)
+
+    if not args.skip_mmseqs:
+        check_file_exists(db_fasta_path, "FASTA file")
+        check_file_exists(db_taxid_path, "TaxID file")
+        check_file_exists("TAX/nodes.dmp", "taxonomy nodes.dmp file")
+        build_mmseqs_db(db_fasta_path, db_taxid_path, "TAX", "DB_MMSEQ2_aa")
 
     print("All steps completed successfully.")
 
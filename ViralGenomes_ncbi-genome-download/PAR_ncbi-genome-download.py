@@ -1,16 +1,42 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import gzip
+import time
+import hashlib
 import argparse
 import subprocess
 import glob
 import shutil
+import tempfile
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared retry backoff (../eutils_client)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "eutils_client"))
+from eutils_client import BACKOFF, retry_delay
 
 
 __author__ = "Patricia Agudelo-Romero, PhD."
 
+STREAM_BLOCK_SIZE = 1024 * 1024  # Decompressed bytes read per step
+MAX_IN_MEMORY = 16 * 1024 * 1024  # Larger genomes are decompressed into a temporary segment file
+NCBI_GENOMES_URL = "https://ftp.ncbi.nlm.nih.gov/genomes"
+# --assembly-levels names (as in ncbi-genome-download) -> assembly_level column of assembly_summary.txt
+ASSEMBLY_LEVELS = {"complete": "Complete Genome", "chromosome": "Chromosome", "scaffold": "Scaffold", "contig": "Contig"}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+RETRY_JITTER = 0.5  # Up to this fraction of the backoff is added at random between attempts
+
 
-def download_viral_genomes(database, output_dir, parallel, assembly_levels="complete", formats="fasta", dry_run=False, metadata_table=None):
+def download_viral_genomes(database, output_dir, parallel, assembly_levels="complete", formats="fasta", dry_run=False, metadata_table=None,
+                           stream_concat=False, workers=None):
     """
     Download viral genomes using ncbi-genome-download with user-defined parameters.
     Process the downloaded files: unzip, concatenate, and clean up.
@@ -23,6 +49,8 @@ def download_viral_genomes(database, output_dir, parallel, assembly_levels="comp
         formats (str): File format to download (default: 'fasta').
         dry_run (bool): If True, perform a dry run without actual downloads.
         metadata_table (str): Path to save the metadata table (if specified).
+        stream_concat (bool): If True, decompress and concatenate in a worker pool without intermediate .fna files.
+        workers (int): Number of decompression workers for stream_concat (default: number of CPUs).
     """
     # Ensure the output directory exists
     if not os.path.exists(output_dir):
@@ -58,22 +86,136 @@ def download_viral_genomes(database, output_dir, parallel, assembly_levels="comp
 
     if not dry_run:
         # Process downloaded files
-        process_downloaded_files(output_dir, database)
+        process_downloaded_files(output_dir, database, stream_concat, workers)
+
+
+def decompress_stream(compressed, spool_dir, max_in_memory=MAX_IN_MEMORY):
+    """
+    Decompress one gzipped genome from a binary file object (an open file or an HTTP response).
+
+    Args:
+        compressed (file): Binary file object with the gzipped FASTA.
+        spool_dir (str): Directory for the temporary segment of genomes larger than max_in_memory.
+        max_in_memory (int): Largest decompressed size kept in memory, in bytes.
+    Returns:
+        bytes or str: The decompressed FASTA, or the path of the temporary segment file holding it.
+    """
+    chunks, size = [], 0
+    with gzip.GzipFile(fileobj=compressed) as infile:
+        while True:
+            block = infile.read(STREAM_BLOCK_SIZE)
+            if not block:
+                return b"".join(chunks)
+            chunks.append(block)
+            size += len(block)
+            if size > max_in_memory:
+                with tempfile.NamedTemporaryFile(dir=spool_dir, suffix=".fna", delete=False) as segment:
+                    segment.writelines(chunks)
+                    shutil.copyfileobj(infile, segment, STREAM_BLOCK_SIZE)
+                return segment.name
 
 
-def process_downloaded_files(output_dir, database):
+def decompress_genome(gz_file, spool_dir, max_in_memory=MAX_IN_MEMORY):
+    """
+    Decompress one assembly .fna.gz file.
+
+    Args:
+        gz_file (str): Path to the .fna.gz file.
+        spool_dir (str): Directory for the temporary segment of genomes larger than max_in_memory.
+        max_in_memory (int): Largest decompressed size kept in memory, in bytes.
+    Returns:
+        bytes or str: The decompressed FASTA, or the path of the temporary segment file holding it.
+    """
+    with open(gz_file, "rb") as compressed:
+        return decompress_stream(compressed, spool_dir, max_in_memory)
+
+
+def write_genome(outfile, genome):
+    """
+    Append a decompressed genome (bytes or temporary segment path) to the multi-FASTA file.
+    A line end is added when the file does not end with one, so the next header starts on its own line.
+
+    Args:
+        outfile (file): Multi-FASTA file opened in binary mode.
+        genome (bytes or str): Output of decompress_genome.
+    """
+    last = b"\n"
+    if isinstance(genome, bytes):
+        outfile.write(genome)
+        last = genome[-1:] or last
+    else:
+        with open(genome, "rb") as segment:
+            for block in iter(lambda: segment.read(STREAM_BLOCK_SIZE), b""):
+                outfile.write(block)
+                last = block[-1:]
+        os.remove(genome)
+    if last != b"\n":
+        outfile.write(b"\n")
+
+
+def stream_concatenate(gz_files, output_file, workers=None, max_in_memory=MAX_IN_MEMORY, decompress=decompress_genome):
+    """
+    Decompress .fna.gz files in a pool of worker threads and stream them into one multi-FASTA file,
+    in the order given, without writing intermediate .fna files.
+    At most 2 x workers decompressed genomes are held at a time; genomes larger than max_in_memory are
+    decompressed into temporary segment files next to the output.
+
+    Args:
+        gz_files (list): Paths of the .fna.gz files (or URLs, with a downloading `decompress`), in output order.
+        output_file (str): Path of the multi-FASTA file.
+        workers (int): Number of decompression threads (default: number of CPUs).
+        max_in_memory (int): Largest decompressed genome kept in memory, in bytes.
+        decompress (callable): Function (source, spool_dir, max_in_memory) returning a decompressed genome.
+    """
+    workers = workers or os.cpu_count() or 1
+    spool_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        with ThreadPoolExecutor(workers) as pool, open(f"{output_file}.tmp", "wb") as outfile:
+            pending = deque()
+            for gz_file in gz_files:
+                pending.append(pool.submit(decompress, gz_file, spool_dir, max_in_memory))
+                if len(pending) >= 2 * workers:
+                    write_genome(outfile, pending.popleft().result())
+            while pending:
+                write_genome(outfile, pending.popleft().result())
+        os.replace(f"{output_file}.tmp", output_file)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        if os.path.exists(f"{output_file}.tmp"):  # Left by a failed run
+            os.remove(f"{output_file}.tmp")
+
+
+def process_downloaded_files(output_dir, database, stream_concat=False, workers=None):
     """
     Process the downloaded genome files: unzip, concatenate, and clean up.
     
     Args:
         output_dir (str): Directory where genomes are saved.
         database (str): Database used for downloading ('genbank' or 'refseq').
+        stream_concat (bool): If True, decompress and concatenate in a worker pool without intermediate
+            .fna files, in assembly accession order.
+        workers (int): Number of decompression workers for stream_concat (default: number of CPUs).
     """
     data_path = os.path.join(output_dir, database, "viral")
     if not os.path.exists(data_path):
         print(f"Error: Expected data path '{data_path}' not found.")
         return
 
+    if stream_concat:
+        # One directory per assembly accession: sort by accession for a deterministic order
+        gz_files = sorted(glob.glob(os.path.join(data_path, "*", "*.fna.gz")),
+                          key=lambda path: (os.path.basename(os.path.dirname(path)), os.path.basename(path)))
+        output_file = os.path.join(output_dir, f"viral_complete_genomes_{database}.fna")
+        print(f"Decompressing and concatenating {len(gz_files)} .fna.gz files...")
+        stream_concatenate(gz_files, output_file, workers)
+        print(f"Concatenated genomes saved to: {output_file}")
+
+        print("Cleaning up intermediate files...")
+        shutil.rmtree(os.path.join(output_dir, database))
+
+        print(f"Cleanup completed. All data saved in: {output_dir}")
+        return
+
     print("Unzipping .fna.gz files...")
     gz_files = glob.glob(os.path.join(data_path, "*", "*.fna.gz"))
     for gz_file in gz_files:
@@ -95,6 +237,475 @@ def process_downloaded_files(output_dir, database):
     print(f"Cleanup completed. All data saved in: {output_dir}")
 
 
+class PooledHTTPClient:
+    """
+    Minimal HTTP(S) client for many downloads from few hosts. Each worker thread keeps one persistent
+    (keep-alive) connection per host, so a pool of N threads reuses at most N connections per host
+    instead of opening one per file. Redirects (up to MAX_REDIRECTS) are followed and failed requests
+    are retried on a new connection, after an exponential backoff with jitter (or the server's Retry-After).
+
+    Args:
+        timeout (int): Socket timeout in seconds.
+        max_tries (int): Attempts per request before giving up.
+        backoff (float): Seconds before the first retry; doubled for every further attempt.
+    """
+
+    def __init__(self, timeout=120, max_tries=3, backoff=BACKOFF):
+        self.timeout = timeout
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self._local = threading.local()
+
+    def _connection(self, scheme, netloc):
+        """Return this thread's connection to (scheme, netloc), opening it if needed."""
+        connections = self._local.__dict__.setdefault("connections", {})
+        if (scheme, netloc) not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connections[(scheme, netloc)] = connection_class(netloc, timeout=self.timeout)
+        return connections[(scheme, netloc)]
+
+    def request(self, url, read):
+        """
+        GET a URL and pass the response to `read`; the response must be read to the end so the
+        connection can be reused.
+
+        Args:
+            url (str): URL to download.
+            read (callable): Function called with the http.client.HTTPResponse.
+        Returns:
+            The value returned by read.
+        """
+        for attempt in range(1, self.max_tries + 1):
+            target = url
+            try:
+                for _ in range(MAX_REDIRECTS + 1):
+                    response = self._get(target)
+                    location = response.getheader("Location")
+                    if response.status not in REDIRECT_STATUSES or not location:
+                        break
+                    response.read()
+                    target = urllib.parse.urljoin(target, location)
+                if response.status != 200:
+                    response.read()
+                    raise urllib.error.HTTPError(target, response.status, response.reason, response.headers, None)
+                result = read(response)
+                response.read()  # Drain anything `read` left, to keep the connection usable
+                return result
+            except urllib.error.HTTPError as e:
+                if e.code < 500 and e.code != 429 or attempt == self.max_tries:
+                    raise
+                time.sleep(retry_delay(attempt, self.backoff, e.headers.get("Retry-After"), RETRY_JITTER))
+            except (http.client.HTTPException, OSError, EOFError):
+                parts = urllib.parse.urlsplit(target)
+                self._connection(parts.scheme, parts.netloc).close()
+                if attempt == self.max_tries:
+                    raise
+                time.sleep(retry_delay(attempt, self.backoff, jitter=RETRY_JITTER))
+
+    def _get(self, url):
+        """Send a GET request for a URL on this thread's connection to its host and return the response."""
+        parts = urllib.parse.urlsplit(url)
+        connection = self._connection(parts.scheme, parts.netloc)
+        connection.request("GET", parts.path + (f"?{parts.query}" if parts.query else ""))
+        return connection.getresponse()
+
+
+def parse_assembly_levels(assembly_levels):
+    """
+    Check a comma-separated --assembly-levels value (argparse type): every level must be one of
+    ASSEMBLY_LEVELS, or the value must be 'all'.
+
+    Args:
+        assembly_levels (str): Comma-separated assembly levels, or 'all'.
+    Returns:
+        str: The value, unchanged.
+    """
+    unknown = [level for level in assembly_levels.split(",") if level not in ASSEMBLY_LEVELS]
+    if assembly_levels != "all" and unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown assembly level(s) {', '.join(unknown)} (choose from 'all' or a comma-separated list of "
+            f"{', '.join(ASSEMBLY_LEVELS)})")
+    return assembly_levels
+
+
+def read_assembly_summary(lines, assembly_levels="complete"):
+    """
+    Parse an assembly_summary.txt file and keep the assemblies of the requested levels that have files.
+
+    Args:
+        lines (iterable): Lines (str) of assembly_summary.txt.
+        assembly_levels (str): Comma-separated levels ('complete', 'chromosome', 'scaffold', 'contig') or 'all'.
+    Returns:
+        tuple: (column names, list of rows as lists of str), sorted by assembly accession.
+    """
+    try:
+        parse_assembly_levels(assembly_levels)
+    except argparse.ArgumentTypeError as e:
+        raise ValueError(str(e)) from None
+    levels = None if assembly_levels == "all" else {ASSEMBLY_LEVELS[level] for level in assembly_levels.split(",")}
+    columns, rows = None, []
+    for line in lines:
+        if line.startswith("#"):
+            columns = line.lstrip("#").strip().split("\t")  # The last comment line names the columns
+            continue
+        if not line.strip():
+            continue
+        if columns is None:
+            raise ValueError("assembly_summary.txt has no header line.")
+        row = line.rstrip("\n").split("\t")
+        record = dict(zip(columns, row))
+        if record.get("ftp_path", "na") != "na" and (levels is None or record.get("assembly_level") in levels):
+            rows.append(row)
+    rows.sort(key=lambda row: row[columns.index("assembly_accession")])
+    return columns, rows
+
+
+def genome_url(ftp_path, base_url=NCBI_GENOMES_URL):
+    """
+    Return the URL of an assembly's _genomic.fna.gz file from its ftp_path, served from base_url.
+
+    Args:
+        ftp_path (str): ftp_path column of assembly_summary.txt.
+        base_url (str): Base URL of the NCBI genomes tree (override to point at a local mirror).
+    Returns:
+        str: URL of the genomic FASTA.
+    """
+    path = urllib.parse.urlsplit(ftp_path).path
+    path = path[path.index("/genomes/") + len("/genomes/"):] if "/genomes/" in path else path.lstrip("/")
+    return f"{base_url.rstrip('/')}/{path}/{os.path.basename(path)}_genomic.fna.gz"
+
+
+class MD5Reader:
+    """
+    Binary file object wrapper that computes the MD5 of the bytes read through it, so a download can be
+    verified while it is decompressed instead of in a second read.
+
+    Args:
+        fileobj (file): Binary file object to read from (e.g. an HTTP response).
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.md5 = hashlib.md5()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.md5.update(data)
+        return data
+
+
+class SHA256Writer:
+    """
+    Binary file object wrapper that computes the SHA-256 of the bytes written through it, so the manifest
+    can record a digest of every assembly's range without reading the output again.
+
+    Args:
+        fileobj (file): Binary file object to write to.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.fileobj.write(data)
+
+
+def fetch_genome(client, url, spool_dir, max_in_memory=MAX_IN_MEMORY, md5=None, missing=None):
+    """
+    Download and decompress one genome in the same pass; a missing file is skipped with a warning
+    and its URL is added to `missing`.
+
+    Args:
+        client (PooledHTTPClient): HTTP client.
+        url (str): URL of the _genomic.fna.gz file.
+        spool_dir (str): Directory for the temporary segment of genomes larger than max_in_memory.
+        max_in_memory (int): Largest decompressed size kept in memory, in bytes.
+        md5 (str): Expected MD5 of the compressed file (None to skip the check).
+        missing (list): URLs of missing files are appended to it (shared by the worker threads).
+    Returns:
+        bytes or str: The decompressed FASTA (b"" if the file is missing), or the path of its temporary segment.
+    """
+    def read(response):
+        reader = MD5Reader(response)
+        genome = decompress_stream(reader, spool_dir, max_in_memory)
+        reader.read()  # Anything after the gzip data is part of the file too
+        if md5 and reader.md5.hexdigest() != md5:
+            raise ValueError(f"MD5 mismatch for {url}: expected {md5}, got {reader.md5.hexdigest()}.")
+        return genome
+
+    try:
+        return client.request(url, read)
+    except urllib.error.HTTPError as e:
+        if e.code != 404:
+            raise
+        print(f"Warning: {url} not found; skipping.")
+        if missing is not None:
+            missing.append(url)
+        return b""
+
+
+def fetch_md5(client, url):
+    """
+    Return the MD5 of a file as listed in the md5checksums.txt of its directory.
+
+    Args:
+        client (PooledHTTPClient): HTTP client.
+        url (str): URL of the file.
+    Returns:
+        str: The MD5 digest, or None if md5checksums.txt is missing or does not list the file.
+    """
+    directory, name = url.rsplit("/", 1)
+    try:
+        listing = client.request(f"{directory}/md5checksums.txt", lambda response: response.read().decode())
+    except urllib.error.HTTPError as e:
+        if e.code != 404:
+            raise
+        return None
+    for line in listing.splitlines():
+        digest, _, path = line.strip().partition(" ")
+        if os.path.basename(path.strip()) == name:
+            return digest
+    return None
+
+
+def read_manifest(manifest_file, fasta_file):
+    """
+    Read the manifest of a multi-FASTA file built by sync_genomes. The ranges must cover the file
+    end to end and each must start with a FASTA header; otherwise the file was modified and nothing
+    is reused.
+
+    Args:
+        manifest_file (str): Path of the manifest TSV (assembly_accession, md5, offset, length, sha256, row_sha256).
+        fasta_file (str): Path of the multi-FASTA file it describes.
+    Returns:
+        dict: assembly accession -> (md5, offset, length, sha256, row_sha256); empty if either file is missing or
+        they do not match. sha256 and row_sha256 are None in manifests written before they were recorded.
+    """
+    if not (os.path.isfile(manifest_file) and os.path.isfile(fasta_file)):
+        return {}
+    entries = {}
+    with open(manifest_file) as manifest:
+        next(manifest, None)
+        for line in manifest:
+            fields = line.rstrip("\n").split("\t")
+            accession, md5, offset, length = fields[:4]
+            sha256, row_sha256 = (fields[4:] + [None, None])[:2]
+            entries[accession] = (md5, int(offset), int(length), sha256 or None, row_sha256 or None)
+    end = 0
+    with open(fasta_file, "rb") as fasta:
+        for _, offset, length, _, _ in sorted(entries.values(), key=lambda entry: entry[1]):
+            fasta.seek(offset)
+            if offset != end or length <= 0 or fasta.read(1) != b">":
+                end = None
+                break
+            end = offset + length
+    if end != os.path.getsize(fasta_file):
+        print(f"Warning: {fasta_file} does not match {manifest_file}; downloading all assemblies.")
+        return {}
+    return entries
+
+
+class ManifestMismatch(ValueError):
+    """A range copied from the previous multi-FASTA file does not match its manifest digest."""
+
+
+def copy_range(source, destination, offset, length, sha256=None):
+    """
+    Copy `length` bytes starting at `offset` from one binary file object to another, checking their
+    SHA-256 against the manifest when it is known.
+    """
+    hashed = hashlib.sha256()
+    source.seek(offset)
+    while length:
+        block = source.read(min(length, STREAM_BLOCK_SIZE))
+        if not block:
+            raise EOFError(f"Unexpected end of file while copying {length} bytes at offset {offset}.")
+        hashed.update(block)
+        destination.write(block)
+        length -= len(block)
+    if sha256 and hashed.hexdigest() != sha256:
+        raise ManifestMismatch(f"The range at offset {offset} of the previous file does not match its manifest digest.")
+
+
+def build_from_manifest(client, accessions, urls, md5s, unchanged, previous_entries, output_file, manifest_file,
+                        parallel, max_in_memory=MAX_IN_MEMORY, missing=None, row_digests=None):
+    """
+    Write the new multi-FASTA file and its manifest for sync_genomes: unchanged assemblies are copied from
+    the previous file (and checked against their manifest digest), the others are downloaded.
+
+    Args:
+        client (PooledHTTPClient): HTTP client.
+        accessions (list): Assembly accessions, in output order.
+        urls (list): URLs of their _genomic.fna.gz files.
+        md5s (list): Their md5checksums.txt digests (None when unknown).
+        unchanged (list): Whether each assembly can be copied from the previous file.
+        previous_entries (dict): Entries of the previous manifest (see read_manifest).
+        output_file (str): Path of the multi-FASTA file.
+        manifest_file (str): Path of its manifest.
+        parallel (int): Number of concurrent requests.
+        max_in_memory (int): Largest decompressed genome kept in memory, in bytes.
+        missing (list): URLs of genome files that were not found are appended to it.
+        row_digests (list): SHA-256 of each assembly's assembly_summary.txt row (None when unknown).
+    """
+    row_digests = row_digests or [None] * len(accessions)
+    spool_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        with ExitStack() as stack:
+            pool = stack.enter_context(ThreadPoolExecutor(parallel))
+            outfile = stack.enter_context(open(f"{output_file}.tmp", "wb"))
+            manifest = stack.enter_context(open(f"{manifest_file}.tmp", "w"))
+            previous = stack.enter_context(open(output_file, "rb")) if previous_entries else None
+            manifest.write("assembly_accession\tmd5\toffset\tlength\tsha256\trow_sha256\n")
+
+            def write_entry(accession, md5, row_digest, job):
+                """Append one assembly (copied range or downloaded genome) and record it in the manifest."""
+                offset = outfile.tell()
+                writer = SHA256Writer(outfile)
+                if isinstance(job, tuple):
+                    copy_range(previous, writer, *job)
+                else:
+                    write_genome(writer, job.result())
+                if outfile.tell() > offset:
+                    manifest.write(f"{accession}\t{md5 or ''}\t{offset}\t{outfile.tell() - offset}\t"
+                                   f"{writer.sha256.hexdigest()}\t{row_digest or ''}\n")
+
+            pending = deque()
+            for accession, url, md5, keep, row_digest in zip(accessions, urls, md5s, unchanged, row_digests):
+                if keep:
+                    job = previous_entries[accession][1:4]
+                else:
+                    job = pool.submit(fetch_genome, client, url, spool_dir, max_in_memory, md5, missing)
+                pending.append((accession, md5, row_digest, job))
+                if len(pending) >= 2 * parallel:
+                    write_entry(*pending.popleft())
+            while pending:
+                write_entry(*pending.popleft())
+        os.replace(f"{output_file}.tmp", output_file)
+        os.replace(f"{manifest_file}.tmp", manifest_file)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        for tmp_file in (f"{output_file}.tmp", f"{manifest_file}.tmp"):  # Left by a failed run
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+def sync_genomes(client, accessions, urls, output_file, parallel, max_in_memory=MAX_IN_MEMORY, missing=None,
+                 row_digests=None):
+    """
+    Incrementally rebuild a multi-FASTA file. A manifest next to it (<output>.manifest.tsv) records the
+    md5checksums.txt digest, byte offset, length and SHA-256 of every assembly, and the SHA-256 of its
+    assembly_summary.txt row. md5checksums.txt is only requested for assemblies whose row changed (or is
+    not in the manifest); only new or changed assemblies are downloaded (and MD5-verified while they
+    stream); unchanged ones are copied from the previous file and withdrawn ones are dropped. If a copied
+    range does not match its SHA-256, the previous file was modified and every assembly is downloaded again.
+
+    Args:
+        client (PooledHTTPClient): HTTP client.
+        accessions (list): Assembly accessions, in output order.
+        urls (list): URLs of their _genomic.fna.gz files.
+        output_file (str): Path of the multi-FASTA file.
+        parallel (int): Number of concurrent requests.
+        max_in_memory (int): Largest decompressed genome kept in memory, in bytes.
+        missing (list): URLs of genome files that were not found are appended to it.
+        row_digests (list): SHA-256 of each assembly's assembly_summary.txt row (None to check every
+            md5checksums.txt).
+    """
+    manifest_file = f"{os.path.splitext(output_file)[0]}.manifest.tsv"
+    previous_entries = read_manifest(manifest_file, output_file)
+    row_digests = row_digests or [None] * len(accessions)
+    # The MD5 recorded for an assembly whose summary row has not changed is reused without a request
+    md5s = [previous_entries[accession][0] or None
+            if row_digest and previous_entries.get(accession, (None,) * 5)[4] == row_digest else None
+            for accession, row_digest in zip(accessions, row_digests)]
+    to_check = [index for index, md5 in enumerate(md5s) if md5 is None]
+    print(f"Checking {len(to_check)} md5checksums.txt files ({len(urls) - len(to_check)} summary rows unchanged)...")
+    with ThreadPoolExecutor(parallel) as pool:
+        for index, md5 in zip(to_check, pool.map(lambda index: fetch_md5(client, urls[index]), to_check)):
+            md5s[index] = md5
+    unchanged = [bool(md5) and previous_entries.get(accession, ("",))[0] == md5 for accession, md5 in zip(accessions, md5s)]
+    n_new = sum(accession not in previous_entries for accession in accessions)
+    n_withdrawn = len(previous_entries.keys() - set(accessions))
+    print(f"{n_new} new, {len(accessions) - n_new - sum(unchanged)} changed, {sum(unchanged)} unchanged "
+          f"and {n_withdrawn} withdrawn assemblies.")
+
+    try:
+        build_from_manifest(client, accessions, urls, md5s, unchanged, previous_entries, output_file, manifest_file,
+                            parallel, max_in_memory, missing, row_digests)
+    except ManifestMismatch as e:
+        print(f"Warning: {e} Downloading all assemblies.")
+        if missing is not None:
+            del missing[:]  # Found again (or not) by the full rebuild
+        build_from_manifest(client, accessions, urls, md5s, [False] * len(urls), {}, output_file, manifest_file,
+                            parallel, max_in_memory, missing, row_digests)
+    print(f"Manifest saved to: {manifest_file}")
+
+
+def download_viral_genomes_native(database, output_dir, parallel, assembly_levels="complete", dry_run=False,
+                                  metadata_table=None, base_url=NCBI_GENOMES_URL, incremental=False):
+    """
+    Download viral genomes without ncbi-genome-download: read the section's assembly_summary.txt, select
+    the assemblies of the requested levels and stream each _genomic.fna.gz through a decompressor straight
+    into the multi-FASTA file, in assembly accession order. No per-assembly directories are written.
+
+    Args:
+        database (str): 'genbank' or 'refseq'.
+        output_dir (str): Directory to save the multi-FASTA file.
+        parallel (int): Number of concurrent downloads (each keeps one connection open).
+        assembly_levels (str): Comma-separated assembly levels, or 'all' (default: 'complete').
+        dry_run (bool): If True, only list the assemblies that would be downloaded.
+        metadata_table (str): Path to save the assembly_summary.txt rows of the selected assemblies.
+        base_url (str): Base URL of the NCBI genomes tree (override to point at a local mirror).
+        incremental (bool): If True, only download new or changed assemblies (see sync_genomes).
+    Returns:
+        list: Accessions of the selected assemblies whose genome file was not found on the server; they
+        are also listed, with their URLs, in viral_complete_genomes_<database>.missing.tsv.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    client = PooledHTTPClient()
+    summary_url = f"{base_url.rstrip('/')}/{database}/viral/assembly_summary.txt"
+    print(f"Reading {summary_url}...")
+    summary = client.request(summary_url, lambda response: response.read().decode())
+    columns, rows = read_assembly_summary(summary.splitlines(), assembly_levels)
+    print(f"Selected {len(rows)} viral assemblies from {database} ({assembly_levels}).")
+
+    if metadata_table:
+        with open(metadata_table, "w") as table:
+            table.write("\t".join(columns) + "\n")
+            table.writelines("\t".join(row) + "\n" for row in rows)
+    ftp_paths = [row[columns.index("ftp_path")] for row in rows]
+    if dry_run:
+        for row, ftp_path in zip(rows, ftp_paths):
+            print(f"{row[columns.index('assembly_accession')]}\t{genome_url(ftp_path, base_url)}")
+        return []
+
+    output_file = os.path.join(output_dir, f"viral_complete_genomes_{database}.fna")
+    accessions = [row[columns.index("assembly_accession")] for row in rows]
+    urls = [genome_url(ftp_path, base_url) for ftp_path in ftp_paths]
+    missing = []
+    if incremental:
+        row_digests = [hashlib.sha256("\t".join(row).encode()).hexdigest() for row in rows]
+        sync_genomes(client, accessions, urls, output_file, parallel, missing=missing, row_digests=row_digests)
+    else:
+        stream_concatenate(urls, output_file, parallel,
+                           decompress=lambda url, spool_dir, max_in_memory: fetch_genome(client, url, spool_dir,
+                                                                                         max_in_memory, missing=missing))
+    print(f"Concatenated genomes saved to: {output_file}")
+
+    missing_file = f"{os.path.splitext(output_file)[0]}.missing.tsv"
+    missing = set(missing)
+    missing_rows = [(accession, url) for accession, url in zip(accessions, urls) if url in missing]
+    if missing_rows:
+        with open(missing_file, "w") as report:
+            report.write("assembly_accession\turl\n")
+            report.writelines(f"{accession}\t{url}\n" for accession, url in missing_rows)
+        print(f"{len(missing_rows)} genome files were not found; listed in {missing_file}.")
+    elif os.path.exists(missing_file):  # Left by a previous run
+        os.remove(missing_file)
+    return [accession for accession, _ in missing_rows]
+
+
 if __name__ == "__main__":
     # Command-line argument parsing
     parser = argparse.ArgumentParser(description="Download and process viral genomes using ncbi-genome-download.")
@@ -111,8 +722,9 @@ if __name__ == "__main__":
         help="Number of parallel downloads. Default is 6."
     )
     parser.add_argument(
-        "--assembly-levels", default="complete",
-        help="Assembly levels to download (e.g., 'complete', 'scaffold'). Default is 'complete'."
+        "--assembly-levels", default="complete", type=parse_assembly_levels,
+        help="Assembly levels to download: 'all' or a comma-separated list of 'complete', 'chromosome', 'scaffold' "
+             "and 'contig'. Default is 'complete'."
     )
     parser.add_argument(
         "--formats", default="fasta",
@@ -126,18 +738,61 @@ if __name__ == "__main__":
         "--metadata-table", type=str,
         help="Path to save the metadata table."
     )
+    parser.add_argument(
+        "--engine", choices=["ncbi-genome-download", "native"], default="ncbi-genome-download",
+        help="Download engine: 'ncbi-genome-download' (the CLI tool) or 'native' (reads assembly_summary.txt and streams the genomes straight into the multi-FASTA file). Default is 'ncbi-genome-download'."
+    )
+    parser.add_argument(
+        "--base-url", default=NCBI_GENOMES_URL,
+        help=f"Base URL of the NCBI genomes tree for --engine native. Default is '{NCBI_GENOMES_URL}'."
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="With --engine native, only download new or changed assemblies (per md5checksums.txt) and copy the unchanged ones from the previous multi-FASTA file, using its manifest."
+    )
+    parser.add_argument(
+        "--stream-concat", action="store_true",
+        help="Decompress and concatenate the genomes in a worker pool, in assembly accession order, without writing intermediate .fna files."
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help="Number of decompression workers for --stream-concat. Default is the number of CPUs."
+    )
 
     # Parse the command-line arguments
     args = parser.parse_args()
+    if args.incremental and args.engine != "native":
+        parser.error("--incremental requires --engine native.")
+    if args.engine == "native" and args.formats != "fasta":
+        parser.error("--engine native only downloads genomic FASTA; use --engine ncbi-genome-download for --formats.")
+    if args.engine == "native" and (args.stream_concat or args.workers):
+        parser.error("--stream-concat and --workers apply to --engine ncbi-genome-download; --engine native always "
+                     "streams the genomes into the multi-FASTA file, with --parallel connections.")
 
     # Execute the genome download function
-    download_viral_genomes(
-        database=args.database,
-        output_dir=args.output,
-        parallel=args.parallel,
-        assembly_levels=args.assembly_levels,
-        formats=args.formats,
-        dry_run=args.dry_run,
-        metadata_table=args.metadata_table
-    )
+    if args.engine == "native":
+        missing = download_viral_genomes_native(
+            database=args.database,
+            output_dir=args.output,
+            parallel=args.parallel,
+            assembly_levels=args.assembly_levels,
+            dry_run=args.dry_run,
+            metadata_table=args.metadata_table,
+            base_url=args.base_url,
+            incremental=args.incremental
+        )
+        if missing:
+            sys.exit(1)
+    else:
+        download_viral_genomes(
+            database=args.database,
+            output_dir=args.output,
+            parallel=args.parallel,
+            assembly_levels=args.assembly_levels,
+            formats=args.formats,
+            dry_run=args.dry_run,
+            metadata_table=args.metadata_table,
+            stream_concat=args.stream_concat,
+            workers=args.workers
+        )
 
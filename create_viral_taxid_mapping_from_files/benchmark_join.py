@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from create_viral_taxid_mapping_from_files import (
+    filter_seq_ids, filter_taxid_mapping, create_taxid_mapping, join_taxid_mapping
+)
+
+__author__ = "Patricia Agudelo-Romero, PhD."
+
+
+def write_fixture(taxid_file, fasta_file, n_accessions, n_viral, seed=1):
+    """
+    Write a synthetic nucl_gb.accession2taxid file and a multi-FASTA file with a sample of its accessions.
+
+    :param taxid_file: Path to save the accession taxid file.
+    :param fasta_file: Path to save the multi-FASTA file.
+    :param n_accessions: Number of rows in the accession taxid file.
+    :param n_viral: Number of accessions in the multi-FASTA file.
+    :param seed: Random seed.
+    """
+    rng = random.Random(seed)
+    prefixes = ["MN", "MT", "OQ", "OR", "KX", "AB", "CP", "NC_"]
+    with open(taxid_file, "w") as out_f:
+        out_f.write("accession\taccession.version\ttaxid\tgi\n")
+        for i in range(n_accessions):
+            accession = f"{prefixes[i % len(prefixes)]}{i:08d}"
+            out_f.write(f"{accession}\t{accession}.{rng.randint(1, 3)}\t{rng.randint(1, 3000000)}\t{i + 1}\n")
+    sample = sorted(rng.sample(range(n_accessions), n_viral))
+    with open(taxid_file) as in_f, open(fasta_file, "w") as out_f:
+        next(in_f)
+        wanted = iter(sample)
+        target = next(wanted, None)
+        for i, line in enumerate(in_f):
+            if i == target:
+                out_f.write(f">{line.split(chr(9))[1]} synthetic virus {i}, complete genome\nACGTACGT\n")
+                target = next(wanted, None)
+
+
+def time_current(fasta_file, taxid_file, tmp_dir):
+    """Run the three-step path (filter_seq_ids -> filter_taxid_mapping -> create_taxid_mapping)."""
+    output = os.path.join(tmp_dir, "current.txt")
+    seq_ids = os.path.join(tmp_dir, "seq_ids.txt")
+    filtered = os.path.join(tmp_dir, "filtered.txt")
+    start = time.perf_counter()
+    filter_seq_ids(fasta_file, seq_ids)
+    filter_taxid_mapping(taxid_file, filtered, 2, 3)
+    create_taxid_mapping(seq_ids, filtered, output)
+    return output, time.perf_counter() - start
+
+
+def time_fused(fasta_file, taxid_file, tmp_dir, threads):
+    """Run the single-pass parallel join."""
+    output = os.path.join(tmp_dir, "fused.txt")
+    start = time.perf_counter()
+    join_taxid_mapping(fasta_file, taxid_file, output, 2, 3, threads)
+    return output, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the three-step taxid mapping against the fused parallel join.")
+    parser.add_argument("--accessions", type=int, default=5000000,
+                        help="Rows in the synthetic accession taxid file. Default: 5000000.")
+    parser.add_argument("--viral", type=int, default=20000, help="Accessions in the synthetic FASTA. Default: 20000.")
+    parser.add_argument("--genbank-taxid", help="Existing accession taxid file to use instead of a synthetic one.")
+    parser.add_argument("--fasta", help="Existing multi-FASTA file to use with --genbank-taxid.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Worker processes for the fused join.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        taxid_file, fasta_file = args.genbank_taxid, args.fasta
+        if not taxid_file:
+            taxid_file = os.path.join(tmp_dir, "nucl_gb.accession2taxid")
+            fasta_file = os.path.join(tmp_dir, "viral.fasta")
+            write_fixture(taxid_file, fasta_file, args.accessions, args.viral)
+        size_mb = os.path.getsize(taxid_file) / 1e6
+
+        results = {}
+        for name, run in (("three-step (pandas)", lambda: time_current(fasta_file, taxid_file, tmp_dir)),
+                          (f"fused ({args.threads} procs)", lambda: time_fused(fasta_file, taxid_file, tmp_dir,
+                                                                                 args.threads))):
+            output, seconds = run()
+            with open(output) as in_f:
+                results[name] = in_f.read().splitlines()
+            print(f"{name:20s} {len(results[name]):8d} mappings  {seconds:8.2f} s  {size_mb / seconds:8.1f} MB/s")
+
+        current, fused = results.values()
+        print(f"Accession taxid file: {size_mb:.1f} MB")
+        print("Identical output." if current == fused else
+              f"Outputs differ: {len(set(current) - set(fused))} lines only in the three-step output, "
+              f"{len(set(fused) - set(current))} only in the fused output.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,46 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import gzip
+import struct
 import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+# Shared FASTA header scanner (../fasta_scan)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "fasta_scan"))
+from fasta_scan import scan_fasta_headers
+
 __author__ = "Patricia Agudelo-Romero, PhD."
 
+INDEX_MAGIC = b"A2TAXIDX"
+INDEX_FORMAT_VERSION = 1
+INDEX_HEADER = struct.Struct("<8sIIQ")  # magic, format version, key width, number of records
+INDEX_HEADER_SIZE = 64  # Header is padded so the key column starts on an aligned offset
+MAX_ACCESSION_LENGTH = 32  # Longest accession (without version) accepted when building the index
+BUCKET_PREFIX_LENGTH = 3  # Accession prefix used to partition records for the external sort
+JOIN_BLOCK_SIZE = 64 * 1024 * 1024  # Bytes of the accession taxid file scanned per worker task
+
 
 def filter_seq_ids(fasta_file, output_file):
     """
     Extract sequence IDs (e.g., NC_029989.1) from the headers of a multi-FASTA file.
     
-    :param fasta_file: Path to the input multi-FASTA file.
+    :param fasta_file: Path to the input multi-FASTA file (plain or .gz).
     :param output_file: Path to save the extracted sequence IDs.
     """
     print("Filtering sequence IDs...")
-    with open(fasta_file, 'r') as fasta, open(output_file, 'w') as output:
-        total_lines = sum(1 for line in fasta)
-        fasta.seek(0)  # Reset the file pointer
-        with tqdm(total=total_lines, unit="line", ncols=100, desc="Filtering sequence IDs") as pbar:
-            for line in fasta:
-                if line.startswith(">"):
-                    seq_id = line.split()[0][1:]  # Extract the sequence ID without ">"
-                    output.write(seq_id + "\n")
-                pbar.update(1)
+    with open(output_file, 'wb') as output, \
+            tqdm(total=os.path.getsize(fasta_file), unit="B", unit_scale=True, ncols=100,
+                 desc="Filtering sequence IDs") as pbar:
+        for header in scan_fasta_headers(fasta_file, pbar):
+            if header.strip():
+                output.write(header.split(None, 1)[0] + b"\n")  # Extract the sequence ID
     print(f"Sequence IDs saved to {output_file}.")
 
 
@@ -77,6 +93,325 @@ def create_taxid_mapping(seq_ids_file, filtered_taxid_mapping, output_file):
     print(f"Viral taxid mapping file saved to {output_file}.")
 
 
+def split_accessions(accessions):
+    """
+    Split accession.version strings into accessions and version numbers.
+
+    :param accessions: Array of accession.version byte strings.
+    :return: Tuple (accessions, versions); version 0 means the accession had no version.
+    """
+    parts = np.char.rpartition(accessions, b".")
+    unversioned = (parts[:, 1] == b"") | ~np.char.isdigit(parts[:, 2])
+    keys = np.where(unversioned, accessions, parts[:, 0])
+    versions = np.where(unversioned, b"0", parts[:, 2]).astype(np.int64)
+    return keys, versions
+
+
+def _section_offsets(key_width, n_records):
+    """Return the byte offsets of the key, version and taxid columns of an index file."""
+    keys_offset = INDEX_HEADER_SIZE
+    versions_offset = keys_offset + -(-key_width * n_records // 8) * 8
+    taxids_offset = versions_offset + -(-2 * n_records // 8) * 8
+    return keys_offset, versions_offset, taxids_offset, taxids_offset + 4 * n_records
+
+
+def build_taxid_index(genbank_file, index_file, col1=2, col2=3, chunksize=2000000):
+    """
+    Build a sorted, memory-mappable binary index of accession -> taxid from a GenBank accession taxid file.
+
+    The file is read once. Records are partitioned by accession prefix into temporary bucket files,
+    then each bucket is sorted in memory and copied into the index, so the build never holds the whole
+    table in memory. The index stores fixed-width accession keys, uint16 versions and int32 taxids as
+    three columns sorted by (accession, version).
+
+    :param genbank_file: Path to the nucleotide GenBank accession taxid file.
+    :param index_file: Path to save the binary index.
+    :param col1: Column number for accession ID (accession.version, default is 2).
+    :param col2: Column number for taxid (default is 3).
+    :param chunksize: The number of lines to read at a time.
+    :return: Number of records in the index.
+    """
+    print("Building taxid index...")
+    record_dtype = np.dtype([("key", f"S{MAX_ACCESSION_LENGTH}"), ("version", "<u2"), ("taxid", "<i4")])
+    index_dir = os.path.dirname(os.path.abspath(index_file))
+    n_records = 0
+    key_width = 1
+    with tempfile.TemporaryDirectory(dir=index_dir) as bucket_dir:
+        buckets = set()
+        chunk_iter = pd.read_csv(genbank_file, sep="\t", header=None, usecols=[col1-1, col2-1], dtype=str,
+                                 chunksize=chunksize)
+        with tqdm(unit="line", ncols=100, desc="Partitioning accessions") as pbar:
+            for chunk in chunk_iter:
+                pbar.update(len(chunk))
+                taxids = pd.to_numeric(chunk[col2-1], errors="coerce")
+                chunk = chunk[taxids.notna()]  # Skips the header line
+                if chunk.empty:
+                    continue
+                keys, versions = split_accessions(chunk[col1-1].to_numpy().astype(bytes))
+                width = np.char.str_len(keys).max()
+                if width > MAX_ACCESSION_LENGTH:
+                    raise ValueError(f"Accession longer than {MAX_ACCESSION_LENGTH} characters in {genbank_file}.")
+                key_width = max(key_width, int(width))
+                records = np.empty(len(keys), dtype=record_dtype)
+                records["key"] = keys
+                records["version"] = versions
+                records["taxid"] = taxids[taxids.notna()].to_numpy(dtype=np.int64)
+                prefixes, inverse = np.unique(keys.astype(f"S{BUCKET_PREFIX_LENGTH}"), return_inverse=True)
+                order = np.argsort(inverse, kind="stable")
+                bounds = np.searchsorted(inverse[order], np.arange(len(prefixes) + 1))
+                for i, prefix in enumerate(prefixes):
+                    bucket = prefix.hex()
+                    with open(os.path.join(bucket_dir, bucket), "ab") as bucket_f:
+                        records[order[bounds[i]:bounds[i + 1]]].tofile(bucket_f)
+                    buckets.add(prefix)
+                n_records += len(records)
+
+        keys_offset, versions_offset, taxids_offset, size = _section_offsets(key_width, n_records)
+        tmp_file = f"{index_file}.tmp"
+        with open(tmp_file, "wb") as index_f:
+            index_f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, key_width, n_records))
+            index_f.truncate(size)
+        if n_records:
+            index_keys = np.memmap(tmp_file, dtype=f"S{key_width}", mode="r+", offset=keys_offset, shape=(n_records,))
+            index_versions = np.memmap(tmp_file, dtype="<u2", mode="r+", offset=versions_offset, shape=(n_records,))
+            index_taxids = np.memmap(tmp_file, dtype="<i4", mode="r+", offset=taxids_offset, shape=(n_records,))
+            start = 0
+            # Buckets are disjoint prefix ranges, so sorting each one and concatenating them in prefix order
+            # sorts the whole index
+            for prefix in tqdm(sorted(buckets), unit="bucket", ncols=100, desc="Sorting accessions"):
+                records = np.fromfile(os.path.join(bucket_dir, prefix.hex()), dtype=record_dtype)
+                records = records[np.lexsort((records["version"], records["key"]))]
+                end = start + len(records)
+                index_keys[start:end] = records["key"]
+                index_versions[start:end] = records["version"]
+                index_taxids[start:end] = records["taxid"]
+                start = end
+            for column in (index_keys, index_versions, index_taxids):
+                column.flush()
+            del index_keys, index_versions, index_taxids
+    os.replace(tmp_file, index_file)
+    print(f"Taxid index with {n_records} accessions saved to {index_file}.")
+    return n_records
+
+
+class TaxidIndex:
+    """
+    Memory-mapped accession -> taxid index written by build_taxid_index.
+
+    Only the pages touched by the binary searches are read, so opening the index is instant and
+    batch lookups do not scan the table.
+
+    :param index_file: Path to the binary index.
+    """
+
+    def __init__(self, index_file):
+        with open(index_file, "rb") as index_f:
+            magic, format_version, key_width, n_records = INDEX_HEADER.unpack(index_f.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC or format_version != INDEX_FORMAT_VERSION:
+            raise ValueError(f"{index_file} is not a taxid index (format version {INDEX_FORMAT_VERSION}).")
+        self.key_width = key_width
+        self.n_records = n_records
+        keys_offset, versions_offset, taxids_offset, _ = _section_offsets(key_width, n_records)
+        if n_records:
+            self.keys = np.memmap(index_file, dtype=f"S{key_width}", mode="r", offset=keys_offset, shape=(n_records,))
+            self.versions = np.memmap(index_file, dtype="<u2", mode="r", offset=versions_offset, shape=(n_records,))
+            self.taxids = np.memmap(index_file, dtype="<i4", mode="r", offset=taxids_offset, shape=(n_records,))
+        else:
+            self.keys = np.empty(0, dtype=f"S{key_width}")
+            self.versions = np.empty(0, dtype="<u2")
+            self.taxids = np.empty(0, dtype="<i4")
+
+    def __len__(self):
+        return self.n_records
+
+    def lookup(self, accessions):
+        """
+        Look up the taxids of a batch of accessions.
+
+        An accession with a version (NC_029989.1) must match that version; an accession without a
+        version matches the latest version in the index.
+
+        :param accessions: List of accession or accession.version strings.
+        :return: List of taxids (int), with None for accessions not in the index.
+        """
+        if not len(accessions):
+            return []
+        queries = np.array([accession.encode() for accession in accessions])
+        keys, versions = split_accessions(queries)
+        too_long = np.char.str_len(keys) > self.key_width
+        keys = keys.astype(f"S{self.key_width}")
+        # Sorted queries make the binary searches walk the mapped pages in order
+        order = np.argsort(keys)
+        left = np.empty(len(keys), dtype=np.int64)
+        right = np.empty(len(keys), dtype=np.int64)
+        left[order] = np.searchsorted(self.keys, keys[order], side="left")
+        right[order] = np.searchsorted(self.keys, keys[order], side="right")
+        found = (right > left) & ~too_long
+        result = np.full(len(keys), -1, dtype=np.int64)
+
+        # Most accessions have a single version in the index: resolve those in one vectorized step
+        single = np.flatnonzero(found & (right - left == 1))
+        single_ok = (versions[single] == 0) | (self.versions[left[single]] == versions[single])
+        result[single[single_ok]] = self.taxids[left[single[single_ok]]]
+        for i in np.flatnonzero(found & (right - left > 1)):
+            positions = np.arange(left[i], right[i])
+            if versions[i]:
+                positions = positions[self.versions[left[i]:right[i]] == versions[i]]
+            if len(positions):
+                result[i] = self.taxids[positions[-1]]
+        return [None if taxid < 0 else int(taxid) for taxid in result]
+
+
+def create_taxid_mapping_from_index(seq_ids_file, index_file, output_file):
+    """
+    Map the sequence IDs in seq_ids_file to taxids with batch lookups in a binary taxid index.
+
+    :param seq_ids_file: Path to the file containing sequence IDs to map.
+    :param index_file: Path to the binary taxid index (see build_taxid_index).
+    :param output_file: Path to save the taxid mapping file.
+    """
+    print("Mapping sequence IDs with the taxid index...")
+    with open(seq_ids_file, 'r') as seq_ids:
+        seq_id_list = list(dict.fromkeys(seq_id.strip() for seq_id in seq_ids if seq_id.strip()))
+    taxids = TaxidIndex(index_file).lookup(seq_id_list)
+    mapped = 0
+    with open(output_file, 'w') as output:
+        for seq_id, taxid in zip(seq_id_list, taxids):
+            if taxid is not None:
+                output.write(f"{seq_id} {taxid}\n")
+                mapped += 1
+    print(f"Mapped {mapped} of {len(seq_id_list)} sequence IDs.")
+    print(f"Viral taxid mapping file saved to {output_file}.")
+
+
+def lookup_accessions(index_file, accessions):
+    """
+    Print the taxid of each accession (NA if it is not in the index).
+
+    :param index_file: Path to the binary taxid index.
+    :param accessions: List of accession or accession.version strings.
+    """
+    for accession, taxid in zip(accessions, TaxidIndex(index_file).lookup(accessions)):
+        print(f"{accession} {'NA' if taxid is None else taxid}")
+
+
+def fasta_seq_ids(fasta_file):
+    """
+    Read the set of sequence IDs from the headers of a multi-FASTA file.
+
+    :param fasta_file: Path to the input multi-FASTA file (plain or .gz).
+    :return: Set of sequence IDs (bytes).
+    """
+    return {header.split(None, 1)[0] for header in scan_fasta_headers(fasta_file) if header.strip()}
+
+
+def _init_join_worker(seq_ids, col1, col2):
+    """Store the sequence ID set and column numbers in a join worker process."""
+    global _join_seq_ids, _join_cols
+    _join_seq_ids = seq_ids
+    _join_cols = (col1 - 1, col2 - 1, max(col1, col2))
+
+
+def _join_lines(block):
+    """Return the 'accession taxid' lines of a block of the accession taxid file whose accession is in the ID set."""
+    accession_col, taxid_col, n_fields = _join_cols
+    matches = []
+    for line in block.split(b"\n"):
+        fields = line.rstrip(b"\r").split(b"\t", n_fields)
+        if len(fields) >= n_fields and fields[accession_col] in _join_seq_ids:
+            matches.append(fields[accession_col] + b" " + fields[taxid_col] + b"\n")
+    return b"".join(matches), block.count(b"\n")
+
+
+def _join_range(path, start, end):
+    """Scan the byte range [start, end) of an uncompressed accession taxid file (start and end are line-aligned)."""
+    with open(path, "rb") as in_f:
+        in_f.seek(start)
+        return _join_lines(in_f.read(end - start))
+
+
+def _line_ranges(path, block_size):
+    """Split an uncompressed file into byte ranges of about block_size that start and end on line boundaries."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as in_f:
+        while bounds[-1] < size:
+            in_f.seek(min(bounds[-1] + block_size, size))
+            in_f.readline()
+            bounds.append(min(in_f.tell(), size))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _gzip_blocks(path, block_size):
+    """Yield line-aligned blocks of decompressed data from a gzipped file."""
+    with gzip.open(path, "rb") as in_f:
+        remainder = b""
+        while True:
+            data = in_f.read(block_size)
+            if not data:
+                break
+            data = remainder + data
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                remainder = data[cut:]
+                yield data[:cut]
+            else:
+                remainder = data
+        if remainder:
+            yield remainder
+
+
+def join_taxid_mapping(fasta_file, genbank_file, output_file, col1=2, col2=3, threads=None,
+                       block_size=JOIN_BLOCK_SIZE):
+    """
+    Map the sequence IDs of a multi-FASTA file to taxids in a single pass over the accession taxid file,
+    without intermediate files.
+
+    The FASTA ID set is loaded once and shared with a pool of worker processes. An uncompressed
+    accession taxid file is split into line-aligned byte ranges that the workers read and scan
+    independently; a gzipped file is decompressed in the main process and its blocks are scanned
+    by the workers. Matches are written in file order, as create_taxid_mapping does.
+
+    :param fasta_file: Path to the input multi-FASTA file.
+    :param genbank_file: Path to the nucleotide GenBank accession taxid file (plain or .gz).
+    :param output_file: Path to save the taxid mapping file.
+    :param col1: Column number for accession ID (default is 2).
+    :param col2: Column number for taxid (default is 3).
+    :param threads: Number of worker processes (default: number of CPUs).
+    :param block_size: Bytes scanned per worker task.
+    :return: Number of mapping lines written.
+    """
+    print("Joining sequence IDs with the taxid mapping...")
+    seq_ids = fasta_seq_ids(fasta_file)
+    print(f"Loaded {len(seq_ids)} sequence IDs from {fasta_file}.")
+    threads = threads or os.cpu_count() or 1
+    mapped = 0
+    with ProcessPoolExecutor(threads, initializer=_init_join_worker, initargs=(seq_ids, col1, col2)) as pool, \
+            open(output_file, 'wb') as output, \
+            tqdm(unit="line", ncols=100, desc="Joining taxid mapping") as pbar:
+        if genbank_file.endswith(".gz"):
+            tasks = ((_join_lines, block) for block in _gzip_blocks(genbank_file, block_size))
+        else:
+            tasks = ((_join_range, genbank_file, start, end) for start, end in _line_ranges(genbank_file, block_size))
+        # Keep a bounded number of blocks in flight and write the results in order
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(*task))
+            if len(pending) >= 2 * threads:
+                matches, lines = pending.popleft().result()
+                output.write(matches)
+                mapped += matches.count(b"\n")
+                pbar.update(lines)
+        while pending:
+            matches, lines = pending.popleft().result()
+            output.write(matches)
+            mapped += matches.count(b"\n")
+            pbar.update(lines)
+    print(f"Mapped {mapped} lines for {len(seq_ids)} sequence IDs.")
+    print(f"Viral taxid mapping file saved to {output_file}.")
+    return mapped
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Create a viral taxid mapping file by filtering sequence IDs from a multi-FASTA file and mapping them to taxids from a GenBank accession taxid file."
@@ -85,13 +420,11 @@ def main():
     parser.add_argument(
         "--fasta",
         type=str,
-        required=True,
-        help="Path to the input multi-FASTA file."
+        help="Path to the input multi-FASTA file (plain or .gz)."
     )
     parser.add_argument(
         "--genbank-taxid",
         type=str,
-        required=True,
         help="Path to the nucleotide GenBank accession taxid file."
     )
     parser.add_argument(
@@ -129,8 +462,67 @@ def main():
         action="store_true",
         help="Save intermediate files instead of removing them."
     )
+    parser.add_argument(
+        "--taxid-index",
+        type=str,
+        help="Path to a binary taxid index. It is built from --genbank-taxid if it does not exist yet, "
+             "and reused by later runs instead of scanning the GenBank accession taxid file."
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Rebuild --taxid-index from --genbank-taxid even if it exists."
+    )
+    parser.add_argument(
+        "--lookup",
+        type=str,
+        nargs="+",
+        metavar="ACCESSION",
+        help="Print the taxids of these accessions from --taxid-index and exit. Use - to read accessions from stdin."
+    )
+    parser.add_argument(
+        "--fused",
+        action="store_true",
+        help="Join the FASTA IDs with the GenBank accession taxid file (plain or .gz) in a single parallel pass, "
+             "without intermediate files."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes for --fused. Default: number of CPUs."
+    )
     args = parser.parse_args()
 
+    if args.taxid_index:
+        if args.rebuild_index or not os.path.exists(args.taxid_index):
+            if not args.genbank_taxid:
+                parser.error("--genbank-taxid is required to build the taxid index.")
+            build_taxid_index(args.genbank_taxid, args.taxid_index, args.col1, args.col2)
+        if args.lookup:
+            accessions = sys.stdin.read().split() if args.lookup == ["-"] else args.lookup
+            lookup_accessions(args.taxid_index, accessions)
+            return
+        if not args.fasta:
+            return  # Build only
+    elif args.lookup:
+        parser.error("--lookup requires --taxid-index.")
+    if not args.fasta:
+        parser.error("--fasta is required.")
+
+    if args.taxid_index:
+        filter_seq_ids(args.fasta, args.output_seq_ids)
+        create_taxid_mapping_from_index(args.output_seq_ids, args.taxid_index, args.output_taxid_mapping)
+        if not args.save_intermediate:
+            os.remove(args.output_seq_ids)
+        return
+    if not args.genbank_taxid:
+        parser.error("--genbank-taxid or --taxid-index is required.")
+    if args.fused:
+        join_taxid_mapping(args.fasta, args.genbank_taxid, args.output_taxid_mapping, args.col1, args.col2,
+                           args.threads)
+        return
+
     # Step 1: Extract sequence IDs from the multi-FASTA file
     filter_seq_ids(args.fasta, args.output_seq_ids)
 
@@ -1,9 +1,15 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import argparse
 import subprocess
 
+# Shared conditional download (../parallel_download/download_state.py): .md5 sidecar and HTTP validator checks,
+# parallel Range requests and decompression while the file downloads.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "parallel_download"))
+from download_state import CONNECTIONS, download_if_changed, save_download_state
+
 
 __author__ = "Patricia Agudelo-Romero, PhD."
 
@@ -42,6 +48,22 @@ def main():
         default="my_taxid",
         help="Output directory for the downloaded and extracted file. Default: 'my_taxid'",
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Download and extract even if the .md5 sidecar or HTTP validators show the file is unchanged.",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=CONNECTIONS,
+        help=f"Parallel Range requests for the conditional download (needs ../parallel_download). Default: {CONNECTIONS}",
+    )
+    parser.add_argument(
+        "--aria2c",
+        action="store_true",
+        help="Download with aria2c (10 connections) on every run instead of the conditional download.",
+    )
 
     args = parser.parse_args()
 
@@ -52,11 +74,24 @@ def main():
     gz_file_path = os.path.join(args.output_dir, os.path.basename(args.url))
     txt_file_path = gz_file_path.replace(".gz", "")
 
-    # Download the file
-    download_file(args.url, args.output_dir)
+    if args.aria2c:
+        # Download the file
+        download_file(args.url, args.output_dir)
 
-    # Extract the file
-    extract_file(gz_file_path)
+        # Extract the file
+        extract_file(gz_file_path)
+    else:
+        # Download and extract only if the file changed since the last run
+        downloaded = download_if_changed(args.url, args.output_dir, [txt_file_path], args.force,
+                                         ("gunzip", txt_file_path), args.connections)
+        if downloaded is None:
+            print(f"File is up to date: {txt_file_path}")
+            return
+        if downloaded[0] is not None:  # Downloaded without parallel_download: extract in a second pass
+            if os.path.exists(txt_file_path):
+                os.remove(txt_file_path)  # gzip -d does not overwrite
+            extract_file(downloaded[0])
+        save_download_state(args.output_dir, args.url, downloaded[1])
 
     print(f"File extracted to: {txt_file_path}")
 
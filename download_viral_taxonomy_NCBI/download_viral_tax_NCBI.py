@@ -1,42 +1,75 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import tarfile
 import argparse
 import subprocess
+import urllib.error
+
+# Shared conditional download (../parallel_download/download_state.py): .md5 sidecar and HTTP validator checks,
+# parallel Range requests and extraction while the dump downloads.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "parallel_download"))
+from download_state import CONNECTIONS, download_if_changed, save_download_state
 
 
 __author__ = "Patricia Agudelo-Romero, PhD."
 
+TAXONOMY_FILES = ["nodes.dmp", "names.dmp"]  # Extracted files that must exist to skip an unchanged dump
+
 
-def download_and_extract_taxonomy(url, output_dir):
+def download_and_extract_taxonomy(url, output_dir, conditional=True, force=False, connections=CONNECTIONS):
     """
     Download the NCBI taxonomy dump and extract its contents.
 
     Args:
         url (str): URL to download the taxonomy dump.
         output_dir (str): Directory to save the downloaded and extracted files.
+        conditional (bool): If True, skip the download and extraction when the dump is unchanged since the
+            last run (.md5 sidecar or HTTP validators); if False, download with aria2c on every run.
+        force (bool): With conditional, download and extract even if the dump is unchanged.
+        connections (int): With conditional, parallel Range requests (parallel_download module).
     """
     # Ensure the output directory exists
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    # Step 1: Download the file
-    print(f"Downloading taxonomy dump from: {url}")
-    download_command = [
-        "aria2c",
-        "--file-allocation=none",
-        "-c",  # Continue downloads
-        "-x", "10",  # Use 10 connections
-        "-s", "10",  # Use 10 split parts
-        "-d", output_dir,
-        url
-    ]
-    try:
-        subprocess.run(download_command, check=True)
+    # Step 1: Download the file (with conditional, only if it changed since the last run)
+    entry = None
+    if conditional:
+        try:
+            downloaded = download_if_changed(url, output_dir,
+                                             [os.path.join(output_dir, name) for name in TAXONOMY_FILES], force,
+                                             ("untar", output_dir), connections)
+        except (urllib.error.URLError, OSError, ValueError, tarfile.TarError) as e:
+            print(f"Error during download: {e}")
+            return
+        if downloaded is None:
+            print(f"Taxonomy files are up to date in: {output_dir}")
+            return
+        entry = downloaded[1]
         print("Download completed successfully.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error during download: {e}")
-        return
+        if downloaded[0] is None:  # Extracted while downloading: there is no .tar.gz to extract or remove
+            save_download_state(output_dir, url, entry)
+            print(f"Extraction completed. Files are saved in: {output_dir}")
+            return
+    else:
+        print(f"Downloading taxonomy dump from: {url}")
+        download_command = [
+            "aria2c",
+            "--file-allocation=none",
+            "-c",  # Continue downloads
+            "-x", "10",  # Use 10 connections
+            "-s", "10",  # Use 10 split parts
+            "-d", output_dir,
+            url
+        ]
+        try:
+            subprocess.run(download_command, check=True)
+            print("Download completed successfully.")
+        except subprocess.CalledProcessError as e:
+            print(f"Error during download: {e}")
+            return
 
     # Step 2: Extract the downloaded file
     downloaded_file = os.path.join(output_dir, os.path.basename(url))
@@ -50,6 +83,8 @@ def download_and_extract_taxonomy(url, output_dir):
     except subprocess.CalledProcessError as e:
         print(f"Error during extraction: {e}")
         return
+    if entry:
+        save_download_state(output_dir, url, entry)
 
     # Step 3: Remove the tar.gz file
     print(f"Removing downloaded file: {downloaded_file}")
@@ -76,8 +111,22 @@ if __name__ == "__main__":
         help="Output directory for downloaded and extracted files. Default: 'TAX_nt'."
     )
 
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Download and extract even if the .md5 sidecar or HTTP validators show the dump is unchanged."
+    )
+    parser.add_argument(
+        "--connections", type=int, default=CONNECTIONS,
+        help=f"Parallel Range requests for the conditional download over HTTP(S) (needs ../parallel_download). Default: {CONNECTIONS}."
+    )
+    parser.add_argument(
+        "--aria2c", action="store_true",
+        help="Download with aria2c (10 connections) on every run instead of the conditional download."
+    )
+
     # Parse arguments
     args = parser.parse_args()
 
     # Execute the download and extraction process
-    download_and_extract_taxonomy(url=args.url, output_dir=args.output_dir)
+    download_and_extract_taxonomy(url=args.url, output_dir=args.output_dir, conditional=not args.aria2c, force=args.force,
+                                  connections=args.connections)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import math
+import time
+import random
+import shutil
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+__author__ = "Patricia Agudelo-Romero, PhD."
+
+EUTILS_TOOL = "eutils_client"
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+STREAM_BUFFER_SIZE = 1024 * 1024  # Bytes copied per read by EutilsClient.stream
+BACKOFF = 1.0  # Seconds before the first retry; doubled for every further attempt
+MAX_BACKOFF = 60.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that spaces requests evenly at `rate` per second.
+
+    Args:
+        rate (float): Maximum number of requests per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the next request slot is available."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def retry_delay(attempt, backoff=BACKOFF, retry_after=None, jitter=0.0):
+    """
+    Seconds to wait before retrying a failed request: exponential backoff, or the server's
+    Retry-After (in seconds) if that is longer.
+
+    Args:
+        attempt (int): Number of the attempt that failed (1 for the first).
+        backoff (float): Delay after the first failure.
+        retry_after (str): Value of the Retry-After response header, if any.
+        jitter (float): Up to this fraction of the delay is added at random, so clients that
+            failed together do not all retry at the same moment.
+    Returns:
+        float: Delay in seconds.
+    """
+    delay = min(backoff * 2 ** (attempt - 1), MAX_BACKOFF)
+    if retry_after and retry_after.strip().isdigit():
+        delay = max(delay, min(float(retry_after), MAX_BACKOFF))
+    return delay * (1 + random.uniform(0, jitter))
+
+
+class EutilsClient:
+    """
+    Concurrent NCBI E-utilities client sharing one token-bucket rate limit.
+    NCBI allows 3 requests/s, or 10 requests/s with an API key; the client keeps
+    that many requests in flight. Failed requests (429, 5xx, network errors) are
+    retried with exponential backoff, so a struggling server is not hit at the
+    full token rate.
+
+    Args:
+        email (str): Email address for NCBI.
+        api_key (str): NCBI API key (optional).
+        tool (str): Tool name reported to NCBI.
+        rate (float): Requests per second (default: 10 with an API key, 3 without).
+        max_workers (int): Requests kept in flight (default: the rate, rounded up).
+        base_url (str): E-utilities base URL (override to point at a local stub server).
+        timeout (int): Socket timeout in seconds.
+        max_tries (int): Attempts per request before giving up.
+        backoff (float): Seconds before the first retry; doubled for every further attempt.
+    """
+
+    def __init__(self, email, api_key=None, tool=EUTILS_TOOL, rate=None, max_workers=None,
+                 base_url=EUTILS_URL, timeout=120, max_tries=3, backoff=BACKOFF):
+        self.email = email
+        self.api_key = api_key
+        self.tool = tool
+        self.rate = rate or (10 if api_key else 3)
+        self.max_workers = max_workers or math.ceil(self.rate)
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self.limiter = TokenBucket(self.rate)
+
+    def _build_request(self, utility, params):
+        """Build the HTTP request; requests with more than 200 IDs are sent as HTTP POST."""
+        params = {key: value for key, value in params.items() if value is not None}
+        params["email"] = self.email
+        params["tool"] = self.tool
+        if self.api_key:
+            params["api_key"] = self.api_key
+        url = f"{self.base_url}/{utility}.fcgi"
+        data = urllib.parse.urlencode(params)
+        if str(params.get("id", "")).count(",") >= 200:
+            return urllib.request.Request(url, data=data.encode())
+        return urllib.request.Request(f"{url}?{data}")
+
+    def _send(self, utility, params, read):
+        """Send a rate-limited request, retrying transient failures with backoff, and pass the response to `read`."""
+        request = self._build_request(utility, params)
+        for attempt in range(1, self.max_tries + 1):
+            self.limiter.acquire()
+            retry_after = None
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return read(response)
+            except urllib.error.HTTPError as e:
+                if e.code < 500 and e.code != 429 or attempt == self.max_tries:
+                    raise
+                retry_after = e.headers.get("Retry-After") if e.headers else None
+            except (urllib.error.URLError, http.client.HTTPException, OSError):
+                if attempt == self.max_tries:
+                    raise
+            time.sleep(retry_delay(attempt, self.backoff, retry_after))
+
+    def request(self, utility, **params):
+        """
+        Send one rate-limited E-utilities request and return the response body.
+
+        Args:
+            utility (str): E-utility name (e.g. 'efetch', 'esummary', 'esearch').
+            **params: Query parameters.
+        Returns:
+            bytes: Response body.
+        """
+        return self._send(utility, params, lambda response: response.read())
+
+    def stream(self, utility, dest, **params):
+        """
+        Send one rate-limited E-utilities request and copy the response body into
+        a binary file object in fixed-size buffers.
+
+        Args:
+            utility (str): E-utility name (e.g. 'efetch').
+            dest: Seekable binary file object; it is truncated before every attempt.
+            **params: Query parameters.
+        Returns:
+            The `dest` file object, rewound to the start.
+        """
+        def copy(response):
+            dest.seek(0)
+            dest.truncate()
+            shutil.copyfileobj(response, dest, STREAM_BUFFER_SIZE)
+            dest.seek(0)
+            return dest
+
+        return self._send(utility, params, copy)
+
+    def imap(self, func, items):
+        """
+        Apply `func` to every item concurrently, yielding results in input order.
+        At most twice `max_workers` calls are pending at any time.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= 2 * self.max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
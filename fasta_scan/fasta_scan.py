@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import gzip
+
+__author__ = "Patricia Agudelo-Romero, PhD."
+
+SCAN_BLOCK_SIZE = 1024 * 1024  # Bytes read per block when scanning FASTA headers (small enough to stay in cache)
+
+
+def block_headers(data, cut):
+    """
+    Yield the header lines (bytes, without '>' and the line end) that start before `cut` in a block of FASTA.
+
+    :param data: Block of FASTA data that starts with a newline or at the start of a line.
+    :param cut: Offset of the last complete line end in data (headers after it are ignored).
+    """
+    find = data.find
+    start = find(b">", 0, cut)
+    while start != -1:
+        end = find(b"\n", start, cut + 1)
+        if start == 0 or data[start - 1] == 10:  # '>' at the start of a line
+            yield data[start + 1:end].rstrip(b"\r")
+        start = find(b">", end, cut)
+
+
+def scan_fasta_headers(path, progress=None, block_size=SCAN_BLOCK_SIZE):
+    """
+    Yield the header lines of a FASTA file as bytes (without '>' and the line end).
+
+    The file is read in blocks and headers are located with bytes.find, which jumps from one '>'
+    to the next without splitting or decoding the sequence lines in between. Gzipped files (.gz)
+    are decompressed on the fly.
+
+    :param path: Path to the FASTA file (plain or .gz).
+    :param progress: Optional tqdm bar (total = file size) updated with the bytes read from disk.
+    :param block_size: Bytes read per block.
+    """
+    with open(path, 'rb') as raw:
+        fasta = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+        carry = b"\n"  # A newline before the first line lets the same test find a header on line 1
+        while True:
+            block = fasta.read(block_size)
+            if not block:
+                break
+            data = carry + block
+            cut = data.rfind(b"\n")  # The line after the last line end continues in the next block
+            yield from block_headers(data, cut)
+            carry = data[cut:]
+            if progress is not None:
+                progress.update(raw.tell() - progress.n)
+        if carry.startswith(b"\n>"):  # The last header has no line end
+            yield carry[2:].rstrip(b"\r")
+
+
+def parse_uniprot_header(header):
+    """
+    Extract the accession (between the first two pipes) and the taxonomic ID (OX=) from a UniProt header.
+
+    :param header: FASTA header line (bytes).
+    :return: Tuple (accession, taxid) as str; "N/A" for missing fields.
+    """
+    parts = header.split(b"|", 2)
+    between_pipes = parts[1].decode() if len(parts) > 1 else "N/A"
+    ox_index = header.find(b"OX=")
+    ox_string = header[ox_index + 3:].split(None, 1)[0].decode() if ox_index != -1 else "N/A"
+    return between_pipes, ox_string
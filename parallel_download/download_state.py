@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import hashlib
+import urllib.error
+import urllib.request
+from contextlib import nullcontext
+
+# Downloads go through parallel_download.py (same directory) when it is importable; otherwise they use
+# one urllib connection and are never extracted on the fly.
+try:
+    import parallel_download
+except ImportError:
+    parallel_download = None
+
+
+__author__ = "Patricia Agudelo-Romero, PhD."
+
+STATE_FILE = ".download_state.json"  # Per output directory: validators of the last completed download of each URL
+CHUNK_SIZE = 1024 * 1024
+CONNECTIONS = 8  # Parallel Range requests per download with the parallel_download module
+TIMEOUT = 120
+
+
+def fetch_md5_sidecar(url):
+    """
+    Return the MD5 that NCBI publishes next to a file (<url>.md5).
+
+    Args:
+        url (str): URL of the file.
+    Returns:
+        str: The MD5 digest, or None if there is no sidecar.
+    """
+    try:
+        with urllib.request.urlopen(f"{url}.md5", timeout=60) as response:
+            return response.read().decode().split()[0].lower()
+    except (urllib.error.URLError, OSError, IndexError):
+        return None
+
+
+def load_download_state(output_dir):
+    """
+    Load the download state store of an output directory.
+
+    Args:
+        output_dir (str): Output directory.
+    Returns:
+        dict: {url: {"md5", "etag", "last_modified"}} of the last completed downloads.
+    """
+    state_path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.isfile(state_path):
+        return {}
+    with open(state_path) as state_file:
+        return json.load(state_file)
+
+
+def save_download_state(output_dir, url, entry):
+    """
+    Record a completed download (and extraction) in the state store.
+
+    Args:
+        output_dir (str): Output directory.
+        url (str): Downloaded URL.
+        entry (dict): State entry returned by download_if_changed.
+    """
+    state = load_download_state(output_dir)
+    state[url] = entry
+    with open(os.path.join(output_dir, f"{STATE_FILE}.tmp"), "w") as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(os.path.join(output_dir, f"{STATE_FILE}.tmp"), os.path.join(output_dir, STATE_FILE))
+
+
+def open_download(url, headers=None, connections=CONNECTIONS):
+    """
+    Open a download with the parallel_download module if it is available, else with a single urllib connection.
+
+    Args:
+        url (str): URL to download.
+        headers (dict): Extra request headers (e.g. conditional validators).
+        connections (int): Parallel Range requests (only used by parallel_download, for servers that support them).
+    Returns:
+        Binary file object with .headers.
+    """
+    if parallel_download is not None:
+        return parallel_download.open_download(url, connections, headers=headers)
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=TIMEOUT)
+
+
+def no_progress(stream, total, description):
+    """Default progress hook of download_if_changed: read the download directly."""
+    return nullcontext(stream)
+
+
+def download_if_changed(url, output_dir, outputs, force=False, extract=None, connections=CONNECTIONS,
+                        progress=no_progress):
+    """
+    Download a file unless the state store shows that its extracted outputs are up to date.
+    The .md5 sidecar is compared first; without one, the request carries the stored ETag/Last-Modified
+    validators. The MD5 is computed while the file streams to disk and checked against the sidecar.
+    With the parallel_download module the file is fetched with parallel Range requests (when the server
+    supports them) and, with extract, extracted while it downloads so no compressed file is written.
+
+    Args:
+        url (str): URL to download.
+        output_dir (str): Directory to save the file.
+        outputs (list): Extracted files that must exist for the download to be skipped.
+        force (bool): If True, always download.
+        extract (tuple): (mode, target) to extract on the fly: ('gunzip', file) or ('untar', directory).
+        connections (int): Parallel Range requests with the parallel_download module.
+        progress (callable): progress(stream, total, description) returning a context manager that yields
+            the stream to read from (e.g. a tqdm wrapper).
+    Returns:
+        tuple: (path, state entry) of the downloaded file (path is None if it was extracted on the fly),
+        or None when nothing changed. Record the entry with save_download_state once the file has been
+        extracted.
+    """
+    previous = load_download_state(output_dir).get(url, {})
+    up_to_date = not force and bool(previous) and all(os.path.exists(path) for path in outputs)
+    md5 = fetch_md5_sidecar(url)
+    if up_to_date and md5 and previous.get("md5") == md5:
+        print(f"{url} is unchanged (MD5 {md5}); skipping download and extraction.")
+        return None
+
+    headers = {}
+    if up_to_date and not md5:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+    try:
+        response = open_download(url, headers, connections)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            print(f"{url} is unchanged (HTTP 304); skipping download and extraction.")
+            return None
+        raise
+    with response:
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if up_to_date and not md5 and (etag or last_modified) and \
+                (etag, last_modified) == (previous.get("etag"), previous.get("last_modified")):
+            print(f"{url} is unchanged (same validators); skipping download and extraction.")
+            return None
+        total = getattr(response, "size", None) or int(response.headers.get("Content-Length") or 0) or None
+        if extract and parallel_download is not None:
+            mode, target = extract
+            print(f"Downloading and extracting {url} to {target}...")
+            with progress(response, total, "Downloading and extracting") as reader:
+                parallel_download.EXTRACTORS[mode](reader, target, md5)
+            return None, {"md5": response.md5.hexdigest(), "etag": etag, "last_modified": last_modified}
+        path = os.path.join(output_dir, os.path.basename(url))
+        print(f"Downloading {url} to {output_dir}...")
+        digest = hashlib.md5()
+        with open(f"{path}.part", "wb") as out_file, progress(response, total, "Downloading") as reader:
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out_file.write(chunk)
+    if md5 and digest.hexdigest() != md5:
+        os.remove(f"{path}.part")
+        raise ValueError(f"MD5 mismatch for {url}: expected {md5}, got {digest.hexdigest()}.")
+    os.replace(f"{path}.part", path)
+    return path, {"md5": digest.hexdigest(), "etag": etag, "last_modified": last_modified}
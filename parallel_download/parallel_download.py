@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import gzip
+import time
+import shutil
+import hashlib
+import tarfile
+import argparse
+import tempfile
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+__author__ = "Patricia Agudelo-Romero, PhD."
+
+CONNECTIONS = 8  # Range requests in flight (aria2c -x 10 -s 10 in the scripts this replaces)
+CHUNK_SIZE = 4 * 1024 * 1024  # Bytes per Range request; at most 2 x CONNECTIONS chunks are held in memory
+BLOCK_SIZE = 1024 * 1024  # Bytes copied per step when decompressing or saving
+TIMEOUT = 120
+MAX_TRIES = 3
+BACKOFF = 0.5  # Seconds before retrying a failed Range request; doubled for every further attempt
+
+
+class DownloadStream:
+    """
+    Read-only binary file object over a download, delivering the bytes in order while they arrive.
+
+    For URLs whose server honours Range requests the file is fetched as CHUNK_SIZE ranges by a pool of
+    `connections` threads (If-Range guards against the file changing mid-download); other URLs (for
+    example the UniProt stream endpoint or ftp://) are read from a single connection. The MD5 of the
+    bytes read is computed on the fly and the bytes can be copied to `save_to`, so the compressed file
+    is optional. Use open_download to create one.
+
+    Args:
+        url (str): URL to download.
+        connections (int): Maximum number of concurrent Range requests.
+        chunk_size (int): Bytes per Range request.
+        headers (dict): Extra request headers (e.g. If-None-Match); a 304 answer raises urllib.error.HTTPError.
+        save_to (str): Path to also save the downloaded bytes to (None to skip).
+        timeout (int): Socket timeout in seconds.
+        max_tries (int): Attempts per Range request before giving up.
+        backoff (float): Seconds before the first retry of a Range request; doubled for every further attempt.
+    """
+
+    def __init__(self, url, connections=CONNECTIONS, chunk_size=CHUNK_SIZE, headers=None, save_to=None,
+                 timeout=TIMEOUT, max_tries=MAX_TRIES, backoff=BACKOFF):
+        self.url = url
+        self.connections = max(1, connections)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self.md5 = hashlib.md5()
+        self.bytes_read = 0
+        self._save_to = save_to
+        self._pool = None
+        self._pending = deque()
+        self._buffer, self._position = b"", 0
+
+        request_headers = dict(headers or {})
+        rangeable = url.startswith(("http://", "https://"))
+        if rangeable:
+            request_headers["Range"] = f"bytes=0-{chunk_size - 1}"
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=request_headers), timeout=timeout)
+        self.headers = response.headers
+        content_range = response.headers.get("Content-Range", "")
+        if rangeable and getattr(response, "status", None) == 206 and "/" in content_range \
+                and not content_range.endswith("/*"):
+            # Ranged download: the first chunk came with the probe, the rest is fetched by the pool
+            self.size = int(content_range.rsplit("/", 1)[1])
+            self._validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            with response:
+                self._buffer = response.read()
+            self._response = None
+            self._next_offset = len(self._buffer)
+        else:
+            if rangeable and getattr(response, "status", None) == 206:
+                # A first range of unknown total size (bytes 0-N/*) cannot be split: request the whole file
+                response.close()
+                del request_headers["Range"]
+                response = urllib.request.urlopen(urllib.request.Request(url, headers=request_headers),
+                                                  timeout=timeout)
+                self.headers = response.headers
+                if getattr(response, "status", None) == 206:
+                    response.close()
+                    raise IOError(f"{url} answered a request without Range with a partial response.")
+            # Single connection (no Range support): read the response as it arrives
+            self.size = int(response.headers.get("Content-Length") or 0) or None
+            self._response = response
+        # Opened only once the probe succeeded, so a failed request leaves no handle or .part file behind
+        try:
+            self._save = open(f"{save_to}.part", "wb") if save_to else None
+        except OSError:
+            if self._response is not None:
+                self._response.close()
+            raise
+        if self._response is None:  # Ranged download: start fetching the chunks after the first one
+            self._pool = ThreadPoolExecutor(self.connections)
+            self._schedule()
+
+    def _schedule(self):
+        """Keep up to 2 x connections Range requests queued ahead of the reader."""
+        while len(self._pending) < 2 * self.connections and self._next_offset < self.size:
+            end = min(self._next_offset + self.chunk_size, self.size)
+            self._pending.append(self._pool.submit(self._fetch_range, self._next_offset, end))
+            self._next_offset = end
+
+    def _fetch_range(self, start, end):
+        """Download bytes [start, end) of the file, retrying transient failures."""
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        if self._validator:
+            headers["If-Range"] = self._validator  # A changed file is answered with 200 instead of 206
+        for attempt in range(1, self.max_tries + 1):
+            try:
+                request = urllib.request.Request(self.url, headers=headers)
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    if response.status != 206:
+                        raise IOError(f"{self.url} changed during the download or ignored a Range request.")
+                    data = response.read()
+                if len(data) == end - start:
+                    return data
+                if attempt == self.max_tries:
+                    raise IOError(f"Short read for bytes {start}-{end - 1} of {self.url}.")
+            except urllib.error.HTTPError as e:
+                if e.code < 500 and e.code != 429 or attempt == self.max_tries:
+                    raise
+            except (urllib.error.URLError, OSError):
+                if attempt == self.max_tries:
+                    raise
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+
+    def _consume(self, data):
+        """Account for bytes handed to the reader (MD5, byte count, optional copy)."""
+        self.md5.update(data)
+        self.bytes_read += len(data)
+        if self._save:
+            self._save.write(data)
+        return data
+
+    def read(self, size=-1):
+        """Read up to size bytes (all remaining bytes if size < 0); b"" at the end of the download."""
+        if self._response is not None:
+            return self._consume(self._response.read() if size is None or size < 0 else self._response.read(size))
+        parts, wanted = [], size if size is not None and size >= 0 else float("inf")
+        while wanted > 0:
+            if self._position >= len(self._buffer):
+                if not self._pending:
+                    break
+                self._buffer, self._position = self._pending.popleft().result(), 0
+                self._schedule()
+            take = self._buffer[self._position:self._position + wanted] if wanted != float("inf") \
+                else self._buffer[self._position:]
+            self._position += len(take)
+            wanted -= len(take)
+            parts.append(take)
+        return self._consume(b"".join(parts))
+
+    def readable(self):
+        return True
+
+    def drain(self):
+        """Read what the consumer left (e.g. padding after a tar archive) so the MD5 covers the whole file."""
+        while self.read(BLOCK_SIZE):
+            pass
+        if self.size is not None and self.bytes_read != self.size:
+            raise EOFError(f"{self.url} ended after {self.bytes_read} of {self.size} bytes.")
+
+    def verify(self, md5=None):
+        """
+        Drain the download, check its MD5 and publish the saved copy.
+
+        Args:
+            md5 (str): Expected MD5 (None to skip the check).
+        """
+        self.drain()
+        if md5 and self.md5.hexdigest() != md5.lower():
+            raise ValueError(f"MD5 mismatch for {self.url}: expected {md5}, got {self.md5.hexdigest()}.")
+        if self._save:
+            self._save.close()
+            os.replace(f"{self._save_to}.part", self._save_to)
+            self._save = None
+
+    def close(self):
+        """Stop the download and release its connections (an unpublished saved copy is removed)."""
+        if self._pool:
+            for future in self._pending:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._response is not None:
+            self._response.close()
+        if self._save:
+            self._save.close()
+            os.remove(f"{self._save_to}.part")
+            self._save = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_download(url, connections=CONNECTIONS, chunk_size=CHUNK_SIZE, headers=None, save_to=None):
+    """
+    Open a URL as an in-order DownloadStream (parallel Range requests when the server supports them).
+
+    Args:
+        url (str): URL to download.
+        connections (int): Maximum number of concurrent Range requests.
+        chunk_size (int): Bytes per Range request.
+        headers (dict): Extra request headers; a 304 answer to conditional headers raises urllib.error.HTTPError.
+        save_to (str): Path to also save the downloaded (compressed) bytes to.
+    Returns:
+        DownloadStream: Binary file object over the download.
+    """
+    return DownloadStream(url, connections, chunk_size, headers, save_to)
+
+
+def save_file(stream, output_path, md5=None):
+    """
+    Save a download as is.
+
+    Args:
+        stream (DownloadStream): Open download.
+        output_path (str): Path of the file.
+        md5 (str): Expected MD5 of the download (None to skip the check).
+    """
+    with open(f"{output_path}.part", "wb") as out_file:
+        shutil.copyfileobj(stream, out_file, BLOCK_SIZE)
+    try:
+        stream.verify(md5)
+    except Exception:
+        os.remove(f"{output_path}.part")
+        raise
+    os.replace(f"{output_path}.part", output_path)
+
+
+def gunzip_to(stream, output_path, md5=None):
+    """
+    Decompress a gzipped download while it arrives; the output is published only if the MD5 matches.
+
+    Args:
+        stream (DownloadStream): Open download of a .gz file.
+        output_path (str): Path of the decompressed file.
+        md5 (str): Expected MD5 of the compressed download (None to skip the check).
+    """
+    with open(f"{output_path}.part", "wb") as out_file, gzip.GzipFile(fileobj=stream) as compressed:
+        shutil.copyfileobj(compressed, out_file, BLOCK_SIZE)
+    try:
+        stream.verify(md5)
+    except Exception:
+        os.remove(f"{output_path}.part")
+        raise
+    os.replace(f"{output_path}.part", output_path)
+
+
+def untar_to(stream, output_dir, md5=None):
+    """
+    Extract a .tar.gz download while it arrives. Members are extracted into a temporary directory and
+    moved into output_dir only if the MD5 matches.
+
+    Args:
+        stream (DownloadStream): Open download of a .tar.gz file.
+        output_dir (str): Directory to extract the archive into.
+        md5 (str): Expected MD5 of the compressed download (None to skip the check).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=output_dir, prefix=".extract")
+    try:
+        with tarfile.open(fileobj=stream, mode="r|gz") as archive:
+            if hasattr(tarfile, "data_filter"):
+                archive.extractall(staging, filter="data")
+            else:
+                archive.extractall(staging)
+        stream.verify(md5)
+        for name in os.listdir(staging):
+            target = os.path.join(output_dir, name)
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            os.replace(os.path.join(staging, name), target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+EXTRACTORS = {None: save_file, "gunzip": gunzip_to, "untar": untar_to}  # Ways to consume a download, by extract mode
+
+
+def download(url, output_path, extract=None, connections=CONNECTIONS, save_to=None, md5=None, headers=None):
+    """
+    Download a URL in-process and, optionally, decompress or extract it in the same pass.
+
+    Args:
+        url (str): URL to download.
+        output_path (str): Output file, or output directory when extract is 'untar'.
+        extract (str): None (save as is), 'gunzip' (decompress a .gz file) or 'untar' (extract a .tar.gz file).
+        connections (int): Maximum number of concurrent Range requests.
+        save_to (str): Path to also keep the downloaded (compressed) file.
+        md5 (str): Expected MD5 of the download (None to skip the check).
+        headers (dict): Extra request headers.
+    Returns:
+        DownloadStream: The finished download (headers, md5, bytes_read).
+    """
+    with open_download(url, connections, headers=headers, save_to=save_to) as stream:
+        EXTRACTORS[extract](stream, output_path, md5)
+    return stream
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download a file with parallel Range requests, decompressing it on the fly.")
+    parser.add_argument("url", help="URL to download.")
+    parser.add_argument("-o", "--output", required=True, help="Output file (output directory with --untar).")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--gunzip", action="store_true", help="Decompress a .gz download while it arrives.")
+    group.add_argument("--untar", action="store_true", help="Extract a .tar.gz download while it arrives.")
+    parser.add_argument("--keep", help="Also save the downloaded (compressed) file to this path.")
+    parser.add_argument("--md5", help="Expected MD5 of the download.")
+    parser.add_argument("-x", "--connections", type=int, default=CONNECTIONS,
+                        help=f"Maximum concurrent Range requests. Default: {CONNECTIONS}.")
+    args = parser.parse_args()
+
+    extract = "gunzip" if args.gunzip else "untar" if args.untar else None
+    try:
+        stream = download(args.url, args.output, extract, args.connections, args.keep, args.md5)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        sys.exit(f"Error downloading {args.url}: {e}")
+    print(f"Downloaded {stream.bytes_read} bytes from {args.url} (MD5 {stream.md5.hexdigest()}) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
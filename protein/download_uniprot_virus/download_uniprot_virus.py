@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import subprocess
 import argparse
 from tqdm import tqdm
 
+# Shared in-process downloader (../../parallel_download) for --downloader parallel
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "parallel_download"))
+try:
+    import parallel_download
+except ImportError:
+    parallel_download = None
+
 
 __author__ = "Patricia Agudelo-Romero, PhD."
 
@@ -55,7 +63,32 @@ def download_with_progress(url, output_folder, output_file):
     if not os.path.exists(gzipped_file):
         print(f"File not found: {gzipped_file}")
         return None
-    
+    return gzipped_file
+
+def stream_download(url, output_folder, output_file, keep_gz=False):
+    """
+    Download file in-process and decompress it while it arrives, so no second pass over the data is needed.
+
+    The UniProt stream endpoint cannot be split into Range requests, so parallel_download reads it over a
+    single connection (several connections are only used for servers that support ranges).
+
+    Args:
+        url (str): The URL to download.
+        output_folder (str): The folder to save the downloaded file.
+        output_file (str): The name of the output file without the .fasta extension.
+        keep_gz (bool): Also save the compressed .fasta.gz file.
+    Returns:
+        str: Path of the decompressed .fasta file.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    fasta_file = os.path.join(output_folder, f"{output_file}.fasta")
+    gzipped_file = f"{fasta_file}.gz" if keep_gz else None
+    with parallel_download.open_download(url, save_to=gzipped_file) as stream, \
+            tqdm.wrapattr(stream, "read", total=stream.size, desc="Downloading") as reader:
+        parallel_download.gunzip_to(reader, fasta_file)
+    print(f"Download and decompression completed: {fasta_file}")
+    return fasta_file
+
 def decompress_file(gzipped_file):
     """
     Decompress the downloaded .fasta.gz file into .fasta.
@@ -82,7 +115,21 @@ def main():
         default="./",  # Default to current directory
         help="Directory to save the downloaded files."
     )
+    parser.add_argument(
+        "--downloader",
+        choices=["aria2c", "parallel"],
+        default="aria2c",
+        help="Download with aria2c and then gunzip, or 'parallel': in-process download decompressed while it "
+             "arrives (needs ../../parallel_download). Default: aria2c."
+    )
+    parser.add_argument(
+        "--keep-gz",
+        action="store_true",
+        help="With --downloader parallel, also save the compressed .fasta.gz file."
+    )
     args = parser.parse_args()
+    if args.downloader == "parallel" and parallel_download is None:
+        parser.error("--downloader parallel needs parallel_download.py from the parallel_download directory of this repository.")
     
     # Determine the URL based on the selected database
     if args.db == "swissprot":
@@ -94,6 +141,10 @@ def main():
         output_folder = "trembl"
         output_file = "viral_proteomes_trembl"
     
+    if args.downloader == "parallel":
+        stream_download(url, output_folder, output_file, args.keep_gz)
+        return
+
     # Download the file with progress
     gzipped_file = download_with_progress(url, output_folder, output_file)
     
@@ -1,31 +1,34 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import gzip
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from tqdm import tqdm
 
+# Shared FASTA header scanner (../../fasta_scan)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "fasta_scan"))
+from fasta_scan import block_headers, scan_fasta_headers, parse_uniprot_header
 
 __author__ = "Patricia Agudelo-Romero, PhD."
 
+RANGE_SIZE = 16 * 1024 * 1024  # Bytes of FASTA parsed per worker task in parallel mode
+
 
 def parse_fasta_to_dataframe(file_path, output_file):
     """
     Parse a FASTA file and extract taxonomic IDs and sequence identifiers.
 
-    :param file_path: Path to the input FASTA file.
+    :param file_path: Path to the input FASTA file (plain or .gz).
     :param output_file: Path to the output TSV file.
     """
     rows = []
-    with open(file_path, 'r') as fasta_file:
-        for line in fasta_file:
-            if line.startswith(">"):  # Process header lines
-                parts = line.split('|')
-                between_pipes = parts[1] if len(parts) > 1 else "N/A"  # Extract string between pipes
-                
-                ox_index = line.find("OX=")
-                ox_string = line[ox_index + 3:].split()[0] if ox_index != -1 else "N/A"  # Extract "OX=" value
-                
-                rows.append([between_pipes, ox_string])  # Add to rows
+    with tqdm(total=os.path.getsize(file_path), unit="B", unit_scale=True, ncols=100, desc="Parsing headers") as pbar:
+        for header in scan_fasta_headers(file_path, pbar):
+            rows.append(parse_uniprot_header(header))
 
     # Create DataFrame and save it
     df = pd.DataFrame(rows)
@@ -34,6 +37,116 @@ def parse_fasta_to_dataframe(file_path, output_file):
     print(f"Output written to: {output_file}")
 
 
+def record_ranges(file_path, range_size=RANGE_SIZE):
+    """
+    Split an uncompressed FASTA file into byte ranges of about range_size that start at a header.
+
+    :param file_path: Path to the FASTA file.
+    :param range_size: Approximate size of each range in bytes.
+    :return: List of (start, end) byte offsets.
+    """
+    size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as fasta_file:
+        while bounds[-1] + range_size < size:
+            fasta_file.seek(bounds[-1] + range_size)
+            fasta_file.readline()  # Move to the start of the next line
+            while True:
+                line_start = fasta_file.tell()
+                line = fasta_file.readline()
+                if not line or line.startswith(b">"):
+                    break
+            if line_start >= size:
+                break
+            bounds.append(line_start)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def gzip_record_blocks(file_path, range_size=RANGE_SIZE):
+    """
+    Yield blocks of about range_size decompressed bytes from a gzipped FASTA file, each starting at a header.
+
+    :param file_path: Path to the .gz FASTA file.
+    :param range_size: Approximate size of each block in bytes.
+    """
+    with gzip.open(file_path, 'rb') as fasta_file:
+        remainder = b""
+        while True:
+            data = fasta_file.read(range_size)
+            if not data:
+                break
+            data = remainder + data
+            cut = data.rfind(b"\n>") + 1  # Split before the last header, which may be incomplete
+            if cut:
+                remainder = data[cut:]
+                yield data[:cut]
+            else:
+                remainder = data
+        if remainder:
+            yield remainder
+
+
+def tsv_lines(data):
+    """
+    Parse the headers of a block of FASTA and return the accession/taxid TSV lines.
+
+    :param data: Block of FASTA data that starts at the start of a line.
+    :return: Tuple (TSV lines as bytes, number of input bytes).
+    """
+    block = data if data.endswith(b"\n") else data + b"\n"
+    lines = "".join(f"{accession}\t{taxid}\n"
+                    for accession, taxid in map(parse_uniprot_header, block_headers(block, len(block) - 1)))
+    return lines.encode(), len(data)
+
+
+def parse_range(file_path, start, end):
+    """Read the byte range [start, end) of a FASTA file and return its TSV lines (see tsv_lines)."""
+    with open(file_path, 'rb') as fasta_file:
+        fasta_file.seek(start)
+        return tsv_lines(fasta_file.read(end - start))
+
+
+def parse_fasta_to_tsv(file_path, output_file, threads=None, range_size=RANGE_SIZE):
+    """
+    Parse a FASTA file in parallel and stream the sequence identifiers and taxonomic IDs to a TSV file.
+
+    The FASTA is split into byte ranges that start at a header, and the headers of each range are
+    parsed in a pool of worker processes. A gzipped FASTA is decompressed in the main process and
+    its header-aligned blocks are parsed by the workers. The TSV lines of each range are written as
+    soon as the range and every range before it are done, so the output is in input order and
+    memory use does not depend on the size of the input.
+
+    :param file_path: Path to the input FASTA file (plain or .gz).
+    :param output_file: Path to the output TSV file.
+    :param threads: Number of worker processes (default: number of CPUs).
+    :param range_size: Bytes of FASTA parsed per worker task.
+    """
+    threads = threads or os.cpu_count() or 1
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)  # Ensure output directory exists
+    with ProcessPoolExecutor(threads) as pool, open(output_file, 'wb') as output, \
+            tqdm(unit="B", unit_scale=True, ncols=100, desc="Parsing headers") as pbar:
+        if file_path.endswith(".gz"):
+            tasks = ((tsv_lines, block) for block in gzip_record_blocks(file_path, range_size))
+        else:
+            pbar.total = os.path.getsize(file_path)
+            tasks = ((parse_range, file_path, start, end) for start, end in record_ranges(file_path, range_size))
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(*task))
+            if len(pending) >= 2 * threads:  # Bound the number of ranges in flight
+                lines, n_bytes = pending.popleft().result()
+                output.write(lines)
+                pbar.update(n_bytes)
+        while pending:
+            lines, n_bytes = pending.popleft().result()
+            output.write(lines)
+            pbar.update(n_bytes)
+    print(f"Output written to: {output_file}")
+
+
 def main():
     """
     Main function to parse command-line arguments and process the FASTA file.
@@ -44,7 +157,7 @@ def main():
     parser.add_argument(
         "input_file",
         type=str,
-        help="Path to the input FASTA file (.fasta, .fna, or .fa).",
+        help="Path to the input FASTA file (.fasta, .fna, or .fa, optionally gzipped).",
     )
     parser.add_argument(
         "--output",
@@ -52,6 +165,12 @@ def main():
         default="taxid_aa/taxid_aa.tsv",
         help="Path to the output file (default: taxid_aa/taxid_aa.tsv).",
     )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="Parse the FASTA in byte ranges with this many worker processes and stream the TSV "
+             "(memory use independent of the input size).",
+    )
 
     args = parser.parse_args()
 
@@ -60,11 +179,14 @@ def main():
         print(f"Error: Input file '{args.input_file}' does not exist.")
         exit(1)
 
-    if not args.input_file.endswith((".fasta", ".fna", ".fa")):
-        print("Error: Input file must have a .fasta, .fna, or .fa extension.")
+    if not args.input_file.endswith((".fasta", ".fna", ".fa", ".fasta.gz", ".fna.gz", ".fa.gz")):
+        print("Error: Input file must have a .fasta, .fna, or .fa extension (optionally .gz).")
         exit(1)
 
-    parse_fasta_to_dataframe(args.input_file, args.output)
+    if args.threads:
+        parse_fasta_to_tsv(args.input_file, args.output, args.threads)
+    else:
+        parse_fasta_to_dataframe(args.input_file, args.output)
 
 
 if __name__ == "__main__":
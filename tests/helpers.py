@@ -0,0 +1,37 @@
+"""Helpers shared by the tests: load the standalone scripts as modules and run local HTTP stand-ins."""
+
+import os
+import sys
+import threading
+import importlib.util
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script(relative_path):
+    """Import a script of the repository by path (script names are not always valid module names)."""
+    path = os.path.join(REPO, relative_path)
+    name = os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def serve(handler_class):
+    """Run a threaded HTTP server on a free local port and yield its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
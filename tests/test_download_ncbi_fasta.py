@@ -0,0 +1,145 @@
+import io
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from helpers import load_script, serve
+
+ncbi_fasta = load_script("Download_fasta_with_ID/download_ncbi_fasta.py")
+
+RECORDS = {"NC_001802.1": "Human immunodeficiency virus 1", "MN908947.3": "Severe acute respiratory syndrome coronavirus 2",
+           "NC_045512.2": "Severe acute respiratory syndrome coronavirus 2 isolate Wuhan-Hu-1"}
+
+
+def fasta_record(accession):
+    return f">{accession} {RECORDS[accession]}, complete genome\nACGTACGTAC\nGTAC\n"
+
+
+class StubEfetch(BaseHTTPRequestHandler):
+    """Stub efetch: returns the RECORDS of the requested IDs; a request including an ID in `failing` gets a 503."""
+
+    lock = threading.Lock()
+    failing = set()
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, query):
+        ids = urllib.parse.parse_qs(query)["id"][0].split(",")
+        with self.lock:
+            StubEfetch.requests.append(ids)
+        if self.failing & set(ids):
+            self.send_error(503)
+            return
+        body = "".join(fasta_record(accession) for accession in RECORDS
+                       if accession in ids or accession.split(".")[0] in ids).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.reply(urllib.parse.urlparse(self.path).query)
+
+    def do_POST(self):
+        self.reply(self.rfile.read(int(self.headers["Content-Length"])).decode())
+
+
+@pytest.fixture
+def client():
+    StubEfetch.failing, StubEfetch.requests = set(), []
+    with serve(StubEfetch) as url:
+        yield ncbi_fasta.EutilsClient("me@example.org", rate=100, base_url=url, max_tries=2, backoff=0.01)
+
+
+def test_split_fasta_stream_writes_one_file_per_requested_id(tmp_path):
+    stream = io.StringIO("\n" + fasta_record("NC_001802.1") + fasta_record("MN908947.3") + ">XX000001.1 unrequested\nAC")
+    found = ncbi_fasta.split_fasta_stream(stream, ["NC_001802.1", "MN908947", "NC_045512.2"], str(tmp_path))
+
+    assert found == {"NC_001802.1", "MN908947"}  # The versionless ID matches MN908947.3
+    assert (tmp_path / "NC_001802.1.fasta").read_text() == fasta_record("NC_001802.1")
+    assert (tmp_path / "MN908947.fasta").read_text() == fasta_record("MN908947.3")
+    assert (tmp_path / "XX000001.1.fasta").read_text() == ">XX000001.1 unrequested\nAC"
+    assert not (tmp_path / "NC_045512.2.fasta").exists()
+
+
+def test_batch_reports_missing_and_failed_ids_separately(tmp_path, client):
+    StubEfetch.failing = {"FAIL000001.1"}
+    ids = ["NC_001802.1", "NC_000000.1", "MN908947.3", "NC_045512", "FAIL000001.1", "NC_999999.1"]
+
+    missing, failed = ncbi_fasta.download_fasta_batch(ids, "me@example.org", str(tmp_path), batch_size=4,
+                                                      client=client)
+
+    assert missing == ["NC_000000.1"]  # NCBI answered, but without this record
+    assert failed == ["FAIL000001.1", "NC_999999.1"]  # The whole second batch failed after all retries
+    assert (tmp_path / "missing_ids.txt").read_text() == "NC_000000.1\n"
+    assert (tmp_path / "failed_ids.txt").read_text() == "FAIL000001.1\nNC_999999.1\n"
+    assert (tmp_path / "NC_045512.fasta").read_text() == fasta_record("NC_045512.2")
+    assert len(StubEfetch.requests) == 3  # One request for the first batch, two attempts for the second
+
+
+def test_batch_streams_large_responses_through_a_spooled_file(tmp_path, client, monkeypatch):
+    monkeypatch.setattr(ncbi_fasta, "SPOOL_MAX_SIZE", 16)  # Every response rolls over to a temporary file
+    missing, failed = ncbi_fasta.download_fasta_batch(list(RECORDS), "me@example.org", str(tmp_path), batch_size=3,
+                                                      client=client)
+    assert (missing, failed) == ([], [])
+    for accession in RECORDS:
+        assert (tmp_path / f"{accession}.fasta").read_text() == fasta_record(accession)
+    assert not (tmp_path / "missing_ids.txt").exists() and not (tmp_path / "failed_ids.txt").exists()
+
+
+def test_cache_resolves_a_versionless_id_to_the_newest_version(tmp_path):
+    cache = ncbi_fasta.FastaCache(str(tmp_path / "cache.sqlite"))
+    for version in (2, 10, 3):  # Numeric, not lexical, order: .10 is the newest
+        cache.put(f">MN908947.{version} SARS-CoV-2 v{version}\nACGT\n")
+    assert cache.get("MN908947") == ">MN908947.10 SARS-CoV-2 v10\nACGT\n"
+    assert cache.get("MN908947.2") == ">MN908947.2 SARS-CoV-2 v2\nACGT\n"
+    assert cache.get("MN908947.4") is None
+    assert cache.get("NC_045512") is None
+    cache.close()
+
+
+def test_cache_entries_expire_after_max_age(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite")
+    now = [1000.0]
+    monkeypatch.setattr(ncbi_fasta.time, "time", lambda: now[0])
+    cache = ncbi_fasta.FastaCache(path, max_age=60)
+    cache.put(fasta_record("NC_001802.1"))
+    now[0] += 59
+    assert cache.get("NC_001802.1") == fasta_record("NC_001802.1")
+    now[0] += 2
+    assert cache.get("NC_001802.1") is None
+    assert cache.get("NC_001802") is None
+    cache.close()
+    assert ncbi_fasta.FastaCache(path).get("NC_001802.1") == fasta_record("NC_001802.1")  # No max_age: still cached
+
+
+def test_cache_evicts_least_recently_used_records_beyond_max_bytes(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite")
+    now = [1000.0]
+    monkeypatch.setattr(ncbi_fasta.time, "time", lambda: now[0])
+    records = [f">NC_00000{index}.1 virus {index}\n" + "ACGT" * 50 + "\n" for index in range(4)]
+    sizes = [len(ncbi_fasta.zlib.compress(record.encode())) for record in records]
+    cache = ncbi_fasta.FastaCache(path, max_bytes=sum(sizes[:3]))  # Room for exactly three records
+    for record in records[:3]:
+        now[0] += 1
+        cache.put(record)
+    now[0] += 1
+    assert cache.get("NC_000000.1") == records[0]  # Now the most recently used
+    now[0] += 1
+    cache.put(records[0])  # Replacing a record does not count its old size twice
+    now[0] += 1
+    cache.put(records[3])
+
+    assert cache.get("NC_000001.1") is None  # Least recently used: evicted
+    assert [cache.get(f"NC_00000{index}.1") for index in (0, 2, 3)] == [records[0], records[2], records[3]]
+    cache.close()
+
+    reopened = ncbi_fasta.FastaCache(path, max_bytes=max(sizes) * 2)  # The running total is restored from the table
+    now[0] += 1
+    reopened.put(records[1])
+    assert sum(reopened.get(f"NC_00000{index}.1") is not None for index in range(4)) == 2
+    reopened.close()
@@ -0,0 +1,134 @@
+import gzip
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from helpers import load_script, serve
+
+parallel_download = load_script("parallel_download/parallel_download.py")
+download_state = load_script("parallel_download/download_state.py")
+
+URL_PATH = "/pub/taxonomy/accession2taxid/nucl_gb.accession2taxid.gz"
+
+
+class FakeNCBIFile(BaseHTTPRequestHandler):
+    """Serves one gzipped file with an ETag and, when SIDECAR is set, its <file>.md5 sidecar."""
+
+    body = b""
+    etag = None
+    sidecar = None
+    requests = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            FakeNCBIFile.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == f"{URL_PATH}.md5" and self.sidecar is not None:
+            body = self.sidecar.encode()
+        elif self.path == URL_PATH:
+            if self.etag and self.headers.get("If-None-Match") == self.etag:
+                self.send_response(304)
+                self.send_header("ETag", self.etag)
+                self.end_headers()
+                return
+            body = self.body
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        if self.path == URL_PATH and self.etag:
+            self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def publish(text, etag=None, sidecar=True):
+    """Publish a new version of the file; the sidecar holds its MD5 unless sidecar is False."""
+    FakeNCBIFile.body = gzip.compress(text.encode())
+    FakeNCBIFile.etag = etag
+    FakeNCBIFile.sidecar = f"{hashlib.md5(FakeNCBIFile.body).hexdigest()}  nucl_gb.accession2taxid.gz\n" \
+        if sidecar else None
+    FakeNCBIFile.requests = []
+
+
+def file_downloads():
+    return [headers for path, headers in FakeNCBIFile.requests if path == URL_PATH]
+
+
+def sync(url, output_dir, force=False):
+    """One run of the conditional download, as download_nucl_gb_taxid.py does it."""
+    output = os.path.join(output_dir, "nucl_gb.accession2taxid")
+    downloaded = download_state.download_if_changed(url, output_dir, [output], force, ("gunzip", output), 2)
+    if downloaded is not None:
+        download_state.save_download_state(output_dir, url, downloaded[1])
+    return downloaded
+
+
+@pytest.fixture
+def file_url():
+    with serve(FakeNCBIFile) as url:
+        yield url + URL_PATH
+
+
+def test_unchanged_sidecar_skips_the_second_run(file_url, tmp_path):
+    publish("accession\ttaxid\nA1\t10\n")
+    assert sync(file_url, str(tmp_path)) is not None
+    assert (tmp_path / "nucl_gb.accession2taxid").read_text() == "accession\ttaxid\nA1\t10\n"
+    state = download_state.load_download_state(str(tmp_path))[file_url]
+    assert state["md5"] == hashlib.md5(FakeNCBIFile.body).hexdigest()
+
+    FakeNCBIFile.requests = []
+    assert sync(file_url, str(tmp_path)) is None
+    assert file_downloads() == []  # Only the sidecar was fetched
+
+    os.remove(tmp_path / "nucl_gb.accession2taxid")  # A missing output is downloaded again
+    assert sync(file_url, str(tmp_path)) is not None
+    assert (tmp_path / "nucl_gb.accession2taxid").exists()
+
+
+def test_changed_sidecar_downloads_again(file_url, tmp_path):
+    publish("accession\ttaxid\nA1\t10\n")
+    sync(file_url, str(tmp_path))
+    publish("accession\ttaxid\nA1\t10\nA2\t20\n")
+    assert sync(file_url, str(tmp_path)) is not None
+    assert len(file_downloads()) == 1
+    assert (tmp_path / "nucl_gb.accession2taxid").read_text() == "accession\ttaxid\nA1\t10\nA2\t20\n"
+    assert download_state.load_download_state(str(tmp_path))[file_url]["md5"] == \
+        hashlib.md5(FakeNCBIFile.body).hexdigest()
+
+
+def test_etag_decides_without_a_sidecar(file_url, tmp_path):
+    publish("accession\ttaxid\nA1\t10\n", etag='"v1"', sidecar=False)
+    sync(file_url, str(tmp_path))
+    assert download_state.load_download_state(str(tmp_path))[file_url]["etag"] == '"v1"'
+
+    FakeNCBIFile.requests = []
+    assert sync(file_url, str(tmp_path)) is None
+    assert file_downloads() == ['"v1"']  # Conditional request answered with 304
+
+    publish("accession\ttaxid\nA2\t20\n", etag='"v2"', sidecar=False)
+    assert sync(file_url, str(tmp_path)) is not None
+    assert file_downloads() == ['"v1"']
+    assert (tmp_path / "nucl_gb.accession2taxid").read_text() == "accession\ttaxid\nA2\t20\n"
+    assert download_state.load_download_state(str(tmp_path))[file_url]["etag"] == '"v2"'
+
+
+def test_force_and_md5_mismatch(file_url, tmp_path):
+    publish("accession\ttaxid\nA1\t10\n")
+    sync(file_url, str(tmp_path))
+    FakeNCBIFile.requests = []
+    assert sync(file_url, str(tmp_path), force=True) is not None
+    assert len(file_downloads()) == 1
+
+    FakeNCBIFile.sidecar = "0" * 32  # Sidecar that does not match the file
+    with pytest.raises(ValueError, match="MD5 mismatch"):
+        sync(file_url, str(tmp_path))
+    assert (tmp_path / "nucl_gb.accession2taxid").read_text() == "accession\ttaxid\nA1\t10\n"
+    assert not (tmp_path / "nucl_gb.accession2taxid.part").exists()
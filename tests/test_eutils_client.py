@@ -0,0 +1,122 @@
+import time
+import threading
+import urllib.error
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from helpers import load_script, serve
+
+eutils_client = load_script("eutils_client/eutils_client.py")
+
+
+class StubEutils(BaseHTTPRequestHandler):
+    """Stub E-utilities server: records when each request arrived and fails the first `failures` requests."""
+
+    lock = threading.Lock()
+    arrivals = []
+    params = []
+    failures = []  # Status codes returned, in order, before requests succeed
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def handle_request(self, query):
+        with self.lock:
+            self.arrivals.append(time.monotonic())
+            self.params.append(urllib.parse.parse_qs(query))
+            status = self.failures.pop(0) if self.failures else 200
+        time.sleep(self.delay)
+        body = b"<eSearchResult><Count>0</Count></eSearchResult>" if status == 200 else b"busy"
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.handle_request(urllib.parse.urlparse(self.path).query)
+
+    def do_POST(self):
+        self.handle_request(self.rfile.read(int(self.headers["Content-Length"])).decode())
+
+
+@pytest.fixture
+def stub():
+    StubEutils.arrivals, StubEutils.params, StubEutils.failures, StubEutils.delay = [], [], [], 0.0
+    with serve(StubEutils) as url:
+        yield url
+
+
+def max_per_second(arrivals, jitter=0.05):
+    """Largest number of requests that arrived within any one-second window (less a little network jitter)."""
+    return max(sum(1 for t in arrivals if start <= t < start + 1.0 - jitter) for start in arrivals)
+
+
+def test_token_bucket_caps_requests_per_second(stub):
+    StubEutils.delay = 0.3  # Slow responses: the client must keep several requests in flight
+    client = eutils_client.EutilsClient("me@example.org", rate=5, base_url=stub)
+    start = time.monotonic()
+    results = list(client.imap(lambda i: client.request("esearch", term=f"q{i}"), range(15)))
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 15
+    assert max_per_second(StubEutils.arrivals) <= 5
+    assert elapsed >= 14 / 5 * 0.95  # No faster than the rate
+    assert elapsed < 15 * StubEutils.delay  # Faster than one request at a time
+
+
+def test_api_key_raises_default_rate_and_is_sent(stub):
+    client = eutils_client.EutilsClient("me@example.org", api_key="KEY", tool="test_tool", base_url=stub)
+    assert client.rate == 10 and client.max_workers == 10
+    client.request("esearch", db="nuccore", term="txid10239", retmax=None)
+    params = StubEutils.params[0]
+    assert params["api_key"] == ["KEY"] and params["tool"] == ["test_tool"] and params["email"] == ["me@example.org"]
+    assert "retmax" not in params
+
+
+def test_long_id_lists_are_posted(stub):
+    client = eutils_client.EutilsClient("me@example.org", rate=50, base_url=stub)
+    client.request("efetch", db="nuccore", id=",".join(str(i) for i in range(300)))
+    assert len(StubEutils.params[0]["id"][0].split(",")) == 300
+
+
+def test_retries_back_off_exponentially(stub):
+    StubEutils.failures = [503, 503]
+    client = eutils_client.EutilsClient("me@example.org", rate=100, base_url=stub, backoff=0.2)
+    assert client.request("esearch", term="q").startswith(b"<eSearchResult>")
+    first, second, third = StubEutils.arrivals
+    assert second - first >= 0.2
+    assert third - second >= 0.4
+
+
+def test_client_errors_are_not_retried(stub):
+    StubEutils.failures = [400]
+    client = eutils_client.EutilsClient("me@example.org", rate=100, base_url=stub, backoff=0.01)
+    with pytest.raises(urllib.error.HTTPError):
+        client.request("esearch", term="q")
+    assert len(StubEutils.arrivals) == 1
+
+
+def test_gives_up_after_max_tries(stub):
+    StubEutils.failures = [429, 429, 429]
+    client = eutils_client.EutilsClient("me@example.org", rate=100, base_url=stub, backoff=0.01)
+    with pytest.raises(urllib.error.HTTPError):
+        client.request("esearch", term="q")
+    assert len(StubEutils.arrivals) == 3
+
+
+def test_retry_delay_doubles_and_honours_retry_after():
+    assert [eutils_client.retry_delay(attempt, 1.0) for attempt in (1, 2, 3)] == [1.0, 2.0, 4.0]
+    assert eutils_client.retry_delay(1, 1.0, "5") == 5.0
+    assert eutils_client.retry_delay(20, 1.0) == eutils_client.MAX_BACKOFF
+
+
+def test_retry_delay_jitter_only_lengthens_the_delay():
+    delays = [eutils_client.retry_delay(2, 1.0, jitter=0.5) for _ in range(50)]
+    assert all(2.0 <= delay <= 3.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert eutils_client.retry_delay(1, 1.0, "5", jitter=0.5) >= 5.0  # Never earlier than Retry-After
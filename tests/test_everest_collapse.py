@@ -0,0 +1,64 @@
+import pytest
+
+from helpers import load_script
+
+everest = load_script("EVEREST/protein/EVEREST_uniprot_mmseqdb.py")
+
+# 1 root -> 10239 Viruses -> 2559587 Riboviria -> {11118 Coronaviridae -> {694009, 2697049}, 11320 Influenza A}
+NODES = {1: 1, 10239: 1, 2559587: 10239, 11118: 2559587, 694009: 11118, 2697049: 11118, 11320: 2559587,
+         10292: 10239}
+MERGED = {999999: 2697049}
+
+
+@pytest.fixture
+def taxonomy_dir(tmp_path):
+    directory = tmp_path / "TAX"
+    directory.mkdir()
+    (directory / "nodes.dmp").write_text("".join(f"{taxid}\t|\t{parent}\t|\tspecies\t|\n"
+                                                 for taxid, parent in NODES.items()))
+    (directory / "merged.dmp").write_text("".join(f"{old}\t|\t{new}\t|\n" for old, new in MERGED.items()))
+    return directory
+
+
+def test_load_taxonomy_tree(taxonomy_dir):
+    assert everest.load_taxonomy_tree(str(taxonomy_dir)) == (NODES, MERGED)
+
+
+@pytest.mark.parametrize("taxids, lca", [
+    ({"694009", "2697049"}, "11118"),
+    ({"694009", "11320"}, "2559587"),
+    ({"2697049", "10292"}, "10239"),
+    ({"2697049", "11118"}, "11118"),  # An ancestor of the other taxid
+    ({"999999", "694009"}, "11118"),  # Merged taxid resolved first
+    ({"2697049", "123456", "N/A"}, "2697049"),  # Unknown taxids ignored
+    ({"123456", "N/A"}, "123456"),  # None known: smallest unchanged
+])
+def test_lowest_common_ancestor(taxonomy_dir, taxids, lca):
+    parents, merged = everest.load_taxonomy_tree(str(taxonomy_dir))
+    assert everest.lowest_common_ancestor(taxids, parents, merged) == lca
+
+
+def test_iter_fasta_records_joins_sequence_lines_across_blocks(tmp_path):
+    path = tmp_path / "proteins.fasta"
+    path.write_bytes(b">sp|A|X OX=1\nMKT\r\nLL\n>sp|B|Y OX=2\nMA\n\n>sp|C|Z OX=3\nQQ")
+    for block_size in (1, 5, 1 << 20):
+        assert list(everest.iter_fasta_records(str(path), block_size=block_size)) == [
+            (b"sp|A|X OX=1", b"MKTLL"), (b"sp|B|Y OX=2", b"MA"), (b"sp|C|Z OX=3", b"QQ")]
+
+
+def test_collapse_identical_proteins_maps_representatives_to_the_lca(tmp_path, taxonomy_dir):
+    fasta = tmp_path / "uniprot.fasta"
+    fasta.write_text(">sp|P1|S1 Spike OX=2697049\nMFVF\nLVLL\n"
+                     ">tr|P2|S2 Spike OX=694009\nmfvflvll\n"
+                     ">tr|P3|N1 Nucleoprotein OX=11320\nMASQ\n"
+                     ">tr|P4|S3 Spike OX=999999\nMFVFLVLL\n"
+                     ">tr|P5|N2 Nucleoprotein OX=11320\nMASQ\n")
+    out = tmp_path / "out"
+
+    everest.collapse_identical_proteins(str(fasta), str(taxonomy_dir), str(out / "collapsed.fasta"),
+                                        str(out / "collapsed.tsv"), str(out / "members.tsv"))
+
+    assert (out / "collapsed.fasta").read_text() == (">sp|P1|S1 Spike OX=2697049\nMFVFLVLL\n"
+                                                     ">tr|P3|N1 Nucleoprotein OX=11320\nMASQ\n")
+    assert (out / "collapsed.tsv").read_text() == "P1\t11118\nP3\t11320\n"
+    assert (out / "members.tsv").read_text().splitlines() == ["representative\tmember", "P1\tP2", "P1\tP4", "P3\tP5"]
@@ -0,0 +1,57 @@
+import io
+import gzip
+
+import pytest
+
+from helpers import load_script
+
+everest = load_script("EVEREST/protein/EVEREST_uniprot_mmseqdb.py")
+uniprot_parser = load_script("protein/parse_taxid_uniprot/parse_taxid_uniprot.py")
+
+FASTA = b"".join(b">sp|P%05d|PROT%d_VIRUS Protein %d OS=Virus OX=%d\nMKTAYIAKQRQISFVKSHFSRQ\nLEERLGLIEVQ\n"
+                 % (index, index, index, 10239 + index) for index in range(50)) + b">tr|A0A000|A0A000_9VIRU No taxid\nMKT"
+MEMBERS = gzip.compress(FASTA[:1000]) + gzip.compress(FASTA[1000:])  # Concatenated gzip members, as UniProt streams
+
+
+def decompress_then_parse(tmp_path):
+    """The previous two-pass path: decompress the .fasta.gz to disk, then parse the FASTA headers."""
+    (tmp_path / "old").mkdir()
+    fasta = tmp_path / "old" / "viral.fasta"
+    fasta.write_bytes(gzip.decompress(MEMBERS))
+    uniprot_parser.parse_fasta_to_dataframe(str(fasta), str(tmp_path / "old" / "taxid.tsv"))
+    return fasta.read_bytes(), (tmp_path / "old" / "taxid.tsv").read_bytes()
+
+
+@pytest.mark.parametrize("buffer_size", [7, 100, everest.STREAM_BUFFER_SIZE])
+def test_fused_stage_matches_decompress_then_parse(tmp_path, monkeypatch, buffer_size):
+    monkeypatch.setattr(everest, "STREAM_BUFFER_SIZE", buffer_size)
+    fasta, taxid, gz = tmp_path / "viral.fasta", tmp_path / "taxid" / "taxid.tsv", tmp_path / "viral.fasta.gz"
+
+    everest.stream_fasta_and_taxids(io.BytesIO(MEMBERS), str(fasta), str(taxid), str(gz), len(MEMBERS))
+
+    assert (fasta.read_bytes(), taxid.read_bytes()) == decompress_then_parse(tmp_path)
+    assert gz.read_bytes() == MEMBERS
+    assert taxid.read_text().splitlines()[-1] == "A0A000\tN/A"
+
+
+class FailingStream(io.BytesIO):
+    """Compressed stream whose connection drops after `limit` bytes."""
+
+    def __init__(self, data, limit):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise ConnectionResetError("connection reset by peer")
+        return super().read(min(size, self.limit - self.tell()))
+
+
+@pytest.mark.parametrize("stream", [io.BytesIO(MEMBERS[:-20]), FailingStream(MEMBERS, 500)],
+                         ids=["truncated", "connection reset"])
+def test_failed_stream_leaves_no_temporary_files(tmp_path, monkeypatch, stream):
+    monkeypatch.setattr(everest, "STREAM_BUFFER_SIZE", 100)
+    with pytest.raises((EOFError, ConnectionResetError)):
+        everest.stream_fasta_and_taxids(stream, str(tmp_path / "viral.fasta"), str(tmp_path / "taxid.tsv"),
+                                        str(tmp_path / "viral.fasta.gz"))
+    assert list(tmp_path.iterdir()) == []
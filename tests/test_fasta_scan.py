@@ -0,0 +1,50 @@
+import gzip
+
+import pytest
+
+from helpers import load_script
+
+fasta_scan = load_script("fasta_scan/fasta_scan.py")
+
+FASTA = (b">sp|P0DTC2|SPIKE_SARS2 Spike glycoprotein OX=2697049 GN=S\n"
+         b"MFVFLVLLPLVSSQCVNLT>not a header\n"
+         b">tr|A0A000|A0A000_9VIRU Uncharacterized protein OX=10239\r\n"
+         b"MKT\n"
+         b"\n"
+         b">no pipes here\n"
+         b"ACGT")
+HEADERS = [b"sp|P0DTC2|SPIKE_SARS2 Spike glycoprotein OX=2697049 GN=S",
+           b"tr|A0A000|A0A000_9VIRU Uncharacterized protein OX=10239",
+           b"no pipes here"]
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, fasta_scan.SCAN_BLOCK_SIZE])
+def test_headers_are_found_across_block_boundaries(tmp_path, block_size):
+    path = tmp_path / "proteins.fasta"
+    path.write_bytes(FASTA)
+    assert list(fasta_scan.scan_fasta_headers(str(path), block_size=block_size)) == HEADERS
+
+
+def test_gzipped_fasta_and_last_header_without_line_end(tmp_path):
+    path = tmp_path / "proteins.fasta.gz"
+    path.write_bytes(gzip.compress(FASTA + b"\n>last"))
+    assert list(fasta_scan.scan_fasta_headers(str(path), block_size=16)) == HEADERS + [b"last"]
+
+
+def test_block_headers_ignores_headers_after_the_cut():
+    data = b"\n>a\nAC\n>b\nGT\n>partial"
+    assert list(fasta_scan.block_headers(data, data.rfind(b"\n"))) == [b"a", b"b"]
+
+
+def test_parse_uniprot_header():
+    assert fasta_scan.parse_uniprot_header(HEADERS[0]) == ("P0DTC2", "2697049")
+    assert fasta_scan.parse_uniprot_header(HEADERS[2]) == ("N/A", "N/A")
+
+
+@pytest.mark.parametrize("script, name", [
+    ("create_viral_taxid_mapping_from_files/create_viral_taxid_mapping_from_files.py", "scan_fasta_headers"),
+    ("protein/parse_taxid_uniprot/parse_taxid_uniprot.py", "scan_fasta_headers"),
+    ("EVEREST/protein/EVEREST_uniprot_mmseqdb.py", "block_headers"),
+])
+def test_scripts_use_the_shared_scanner(script, name):
+    assert getattr(load_script(script), name) is getattr(fasta_scan, name)
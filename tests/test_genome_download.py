@@ -0,0 +1,371 @@
+import io
+import gzip
+import os
+import sys
+import hashlib
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from helpers import REPO, load_script, serve
+
+SCRIPT = os.path.join(REPO, "ViralGenomes_ncbi-genome-download", "PAR_ncbi-genome-download.py")
+par = load_script("ViralGenomes_ncbi-genome-download/PAR_ncbi-genome-download.py")
+
+COLUMNS = ["assembly_accession", "bioproject", "assembly_level", "seq_rel_date", "ftp_path"]
+
+
+class FakeGenomesTree(BaseHTTPRequestHandler):
+    """Serves FILES (path -> bytes) like the NCBI genomes tree; /moved/<path> redirects to /genomes/<path>."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, as PooledHTTPClient expects
+    files = {}
+    requests = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            FakeGenomesTree.requests.append(self.path)
+        if self.path.startswith("/moved/"):
+            self.send_response(301 if len(self.requests) % 2 else 302)
+            self.send_header("Location", "/genomes/" + self.path[len("/moved/"):])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def assembly_dir(accession):
+    return f"/genomes/all/{accession[:3]}/{accession[4:7]}/{accession[7:10]}/{accession[10:13]}/{accession}_ASM"
+
+
+def publish(assemblies, database="refseq", dates=None):
+    """
+    Publish a fake tree: assemblies is a list of (accession, level, FASTA text or None for a missing file).
+    dates gives the seq_rel_date of some accessions (default 2024/01/01), to change their summary row.
+    """
+    files = {}
+    rows = ["# See ftp://ftp.ncbi.nlm.nih.gov/genomes/README_assembly_summary.txt", "# " + "\t".join(COLUMNS)]
+    for accession, level, fasta in assemblies:
+        directory = assembly_dir(accession)
+        rows.append("\t".join([accession, "PRJNA1", level, (dates or {}).get(accession, "2024/01/01"),
+                                f"https://ftp.ncbi.nlm.nih.gov{directory}"]))
+        if fasta is not None:
+            name = f"{os.path.basename(directory)}_genomic.fna.gz"
+            data = gzip.compress(fasta.encode())
+            files[f"{directory}/{name}"] = data
+            files[f"{directory}/md5checksums.txt"] = f"{hashlib.md5(data).hexdigest()}  ./{name}\n".encode()
+    files[f"/genomes/{database}/viral/assembly_summary.txt"] = ("\n".join(rows) + "\n").encode()
+    FakeGenomesTree.files = files
+    FakeGenomesTree.requests = []
+
+
+@pytest.fixture
+def tree_url():
+    with serve(FakeGenomesTree) as url:
+        yield url
+
+
+ASSEMBLIES = [
+    ("GCF_000000003.1", "Complete Genome", ">NC_3.1 virus three\nACGT\nAC"),  # No final line end
+    ("GCF_000000001.1", "Complete Genome", ">NC_1.1 virus one\nAAAA\n"),
+    ("GCF_000000002.1", "Scaffold", ">NZ_2.1 virus two\nCCCC\n"),
+    ("GCF_000000004.1", "Complete Genome", None),  # Listed, but its file is missing
+]
+
+
+@pytest.mark.parametrize("base", ["genomes", "moved"])
+def test_native_engine_streams_selected_assemblies_in_accession_order(tmp_path, tree_url, base):
+    publish(ASSEMBLIES)
+    metadata_table = tmp_path / "metadata.tsv"
+
+    missing = par.download_viral_genomes_native("refseq", str(tmp_path), 2, metadata_table=str(metadata_table),
+                                                base_url=f"{tree_url}/{base}")
+
+    fasta = (tmp_path / "viral_complete_genomes_refseq.fna").read_text()
+    assert fasta == ">NC_1.1 virus one\nAAAA\n>NC_3.1 virus three\nACGT\nAC\n"
+    assert [line.split("\t")[0] for line in metadata_table.read_text().splitlines()] == [
+        "assembly_accession", "GCF_000000001.1", "GCF_000000003.1", "GCF_000000004.1"]
+    assert missing == ["GCF_000000004.1"]
+    assert (tmp_path / "viral_complete_genomes_refseq.missing.tsv").read_text().splitlines() == [
+        "assembly_accession\turl",
+        f"GCF_000000004.1\t{tree_url}/{base}/all/GCF/000/000/004/GCF_000000004.1_ASM/GCF_000000004.1_ASM_genomic.fna.gz"]
+    assert sorted(os.listdir(tmp_path)) == ["metadata.tsv", "viral_complete_genomes_refseq.fna",
+                                            "viral_complete_genomes_refseq.missing.tsv"]
+    if base == "moved":  # Every request was redirected once
+        assert sum(path.startswith("/moved/") for path in FakeGenomesTree.requests) == 4
+
+
+def test_native_engine_selects_several_levels(tmp_path, tree_url):
+    publish(ASSEMBLIES)
+    par.download_viral_genomes_native("refseq", str(tmp_path), 2, "complete,scaffold", base_url=f"{tree_url}/genomes")
+    headers = [line for line in open(tmp_path / "viral_complete_genomes_refseq.fna") if line.startswith(">")]
+    assert headers == [">NC_1.1 virus one\n", ">NZ_2.1 virus two\n", ">NC_3.1 virus three\n"]
+
+
+def test_redirect_loop_gives_up(tree_url):
+    class Loop(FakeGenomesTree):
+        def do_GET(self):
+            self.send_response(302)
+            self.send_header("Location", self.path)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    with serve(Loop) as url, pytest.raises(par.urllib.error.HTTPError) as error:
+        par.PooledHTTPClient().request(f"{url}/loop", lambda response: response.read())
+    assert error.value.code == 302
+
+
+def test_md5_mismatch_is_an_error(tmp_path, tree_url):
+    publish(ASSEMBLIES[:1])
+    url = par.genome_url(f"https://ftp.ncbi.nlm.nih.gov{assembly_dir('GCF_000000003.1')}", f"{tree_url}/genomes")
+    client = par.PooledHTTPClient()
+    assert par.fetch_genome(client, url, str(tmp_path), md5=par.fetch_md5(client, url)).startswith(b">NC_3.1")
+    with pytest.raises(ValueError, match="MD5 mismatch"):
+        par.fetch_genome(client, url, str(tmp_path), md5="0" * 32)
+
+
+def test_unknown_assembly_level_is_a_value_error():
+    with pytest.raises(ValueError, match="unknown assembly level"):
+        par.read_assembly_summary(["# assembly_accession\tassembly_level\tftp_path\n"], "complete,plasmid")
+
+
+@pytest.mark.parametrize("arguments, message", [
+    (["--assembly-levels", "complete,plasmid"], "unknown assembly level(s) plasmid"),
+    (["--engine", "native", "--formats", "genbank"], "--engine native only downloads genomic FASTA"),
+    (["--engine", "native", "--stream-concat"], "--stream-concat and --workers apply to"),
+    (["--engine", "native", "--workers", "4"], "--stream-concat and --workers apply to"),
+])
+def test_command_line_rejects_options_the_engine_would_ignore(arguments, message):
+    result = subprocess.run([sys.executable, SCRIPT, "-d", "refseq", "--dry-run"] + arguments,
+                            capture_output=True, text=True)
+    assert result.returncode == 2
+    assert message in result.stderr
+
+
+def genome_requests():
+    return sorted(os.path.basename(path) for path in FakeGenomesTree.requests if path.endswith(".fna.gz"))
+
+
+def sync(tmp_path, tree_url):
+    FakeGenomesTree.requests = []
+    par.download_viral_genomes_native("refseq", str(tmp_path), 2, "all", base_url=f"{tree_url}/genomes",
+                                      incremental=True)
+    return (tmp_path / "viral_complete_genomes_refseq.fna").read_text()
+
+
+def md5_requests():
+    return sorted(path.split("/")[-2] for path in FakeGenomesTree.requests if path.endswith("/md5checksums.txt"))
+
+
+def read_manifest_rows(tmp_path):
+    lines = (tmp_path / "viral_complete_genomes_refseq.manifest.tsv").read_text().splitlines()
+    return [line.split("\t") for line in lines]
+
+
+def test_incremental_sync_downloads_only_new_and_changed_assemblies(tmp_path, tree_url):
+    publish([("GCF_000000001.1", "Complete Genome", ">A\nAAAA\n"),
+             ("GCF_000000002.1", "Complete Genome", ">B\nCCCC\n"),
+             ("GCF_000000003.1", "Contig", ">C\nGGGG\n")])
+    assert sync(tmp_path, tree_url) == ">A\nAAAA\n>B\nCCCC\n>C\nGGGG\n"
+    assert len(genome_requests()) == 3
+    rows = read_manifest_rows(tmp_path)
+    assert rows[0] == ["assembly_accession", "md5", "offset", "length", "sha256", "row_sha256"]
+    assert [(row[0], row[2], row[3]) for row in rows[1:]] == [("GCF_000000001.1", "0", "8"),
+                                                              ("GCF_000000002.1", "8", "8"),
+                                                              ("GCF_000000003.1", "16", "8")]
+    assert rows[1][4] == hashlib.sha256(b">A\nAAAA\n").hexdigest()
+
+    # 1 unchanged, 2 changed (with a new seq_rel_date in its summary row), 3 withdrawn, 4 new
+    publish([("GCF_000000001.1", "Complete Genome", ">A\nAAAA\n"),
+             ("GCF_000000002.1", "Complete Genome", ">B version 2\nCCCCTT\n"),
+             ("GCF_000000004.1", "Complete Genome", ">D\nTTTT\n")], dates={"GCF_000000002.1": "2024/06/01"})
+    assert sync(tmp_path, tree_url) == ">A\nAAAA\n>B version 2\nCCCCTT\n>D\nTTTT\n"
+    assert genome_requests() == ["GCF_000000002.1_ASM_genomic.fna.gz", "GCF_000000004.1_ASM_genomic.fna.gz"]
+    assert md5_requests() == ["GCF_000000002.1_ASM", "GCF_000000004.1_ASM"]  # Not for the unchanged row of 1
+    assert [row[0] for row in read_manifest_rows(tmp_path)[1:]] == ["GCF_000000001.1", "GCF_000000002.1",
+                                                                    "GCF_000000004.1"]
+    assert sorted(os.listdir(tmp_path)) == ["viral_complete_genomes_refseq.fna",
+                                            "viral_complete_genomes_refseq.manifest.tsv"]
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data.replace(b">B", b"xB"),  # A range no longer starts with a header
+    lambda data: data.replace(b"CCCC", b"CCCA"),  # Same size and headers, different bytes
+])
+def test_incremental_sync_does_not_reuse_a_modified_file(tmp_path, tree_url, corrupt):
+    assemblies = [("GCF_000000001.1", "Complete Genome", ">A\nAAAA\n"),
+                  ("GCF_000000002.1", "Complete Genome", ">B\nCCCC\n")]
+    publish(assemblies)
+    sync(tmp_path, tree_url)
+    fasta = tmp_path / "viral_complete_genomes_refseq.fna"
+    fasta.write_bytes(corrupt(fasta.read_bytes()))
+
+    assert sync(tmp_path, tree_url) == ">A\nAAAA\n>B\nCCCC\n"
+    assert len(genome_requests()) == 2
+
+
+def test_read_manifest_accepts_manifests_without_digests(tmp_path):
+    fasta, manifest = tmp_path / "genomes.fna", tmp_path / "genomes.manifest.tsv"
+    fasta.write_bytes(b">A\nAAAA\n>B\nCC\n")
+    manifest.write_text("assembly_accession\tmd5\toffset\tlength\nGCF_1\tabc\t0\t8\nGCF_2\tdef\t8\t6\n")
+    assert par.read_manifest(str(manifest), str(fasta)) == {"GCF_1": ("abc", 0, 8, None, None),
+                                                            "GCF_2": ("def", 8, 6, None, None)}
+    manifest.write_text("assembly_accession\tmd5\toffset\tlength\nGCF_1\tabc\t0\t8\nGCF_2\tdef\t9\t5\n")
+    assert par.read_manifest(str(manifest), str(fasta)) == {}
+
+
+GENOMES = {
+    "GCF_000000002.1": b">NC_2.1 virus two\n" + b"ACGT" * 300 + b"\n",
+    "GCF_000000001.1": b">NC_1.1 virus one\nAAAA\n>NC_1.2 segment two\nCCCC\n",
+    "GCF_000000010.1": b">NC_10.1 virus ten\n" + b"GGTTAC\n" * 200,
+}
+
+
+def write_downloads(output_dir, database="refseq"):
+    """Lay out GENOMES as ncbi-genome-download does; GCF_000000010.1 is a multi-member gzip file."""
+    for accession, fasta in GENOMES.items():
+        directory = output_dir / database / "viral" / accession
+        directory.mkdir(parents=True)
+        middle = len(fasta) // 2
+        data = gzip.compress(fasta[:middle]) + gzip.compress(fasta[middle:]) if accession.endswith("10.1") \
+            else gzip.compress(fasta)
+        (directory / f"{accession}_ASM_genomic.fna.gz").write_bytes(data)
+
+
+def split_records(fasta):
+    return sorted(record.rstrip(b"\n") for record in (b"\n" + fasta).split(b"\n>")[1:])
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("max_in_memory", [64, par.MAX_IN_MEMORY])  # Spooled to segment files, or kept in memory
+def test_stream_concat_matches_decompress_then_cat(tmp_path, workers, max_in_memory):
+    stream_dir, old_dir = tmp_path / "stream", tmp_path / "old"
+    write_downloads(stream_dir)
+    write_downloads(old_dir)
+    gz_files = sorted(str(path) for path in stream_dir.glob("refseq/viral/*/*.fna.gz"))
+    expected = b"".join(gzip.open(path).read() for path in gz_files)  # Decompress, then cat in accession order
+
+    output = stream_dir / "viral_complete_genomes_refseq.fna"
+    par.stream_concatenate(gz_files, str(output), workers, max_in_memory)
+    assert output.read_bytes() == expected
+    assert sorted(path.name for path in stream_dir.iterdir()) == ["refseq", "viral_complete_genomes_refseq.fna"]
+
+    # The gunzip + cat path of process_downloaded_files writes the same records (in glob order)
+    par.process_downloaded_files(str(old_dir), "refseq")
+    assert split_records((old_dir / "viral_complete_genomes_refseq.fna").read_bytes()) == split_records(expected)
+
+
+def test_process_downloaded_files_stream_concat_orders_by_accession(tmp_path):
+    write_downloads(tmp_path)
+    par.process_downloaded_files(str(tmp_path), "refseq", stream_concat=True, workers=2)
+    assert (tmp_path / "viral_complete_genomes_refseq.fna").read_bytes() == \
+        GENOMES["GCF_000000001.1"] + GENOMES["GCF_000000002.1"] + GENOMES["GCF_000000010.1"]
+    assert os.listdir(tmp_path) == ["viral_complete_genomes_refseq.fna"]
+
+
+def test_decompress_stream_reads_every_gzip_member(tmp_path):
+    data = gzip.compress(b">a\nAC") + gzip.compress(b"GT\n") + gzip.compress(b">b\nTT\n")
+    assert par.decompress_stream(io.BytesIO(data), str(tmp_path)) == b">a\nACGT\n>b\nTT\n"
+    segment = par.decompress_stream(io.BytesIO(data), str(tmp_path), max_in_memory=4)
+    assert open(segment, "rb").read() == b">a\nACGT\n>b\nTT\n"
+
+
+class Flaky(FakeGenomesTree):
+    """FakeGenomesTree whose first `failures` requests get a 503 (with `retry_after` as Retry-After, if set)."""
+
+    failures = 0
+    retry_after = None
+
+    def do_GET(self):
+        with self.lock:
+            fail = Flaky.failures > 0
+            Flaky.failures -= fail
+        if not fail:
+            return super().do_GET()
+        self.send_response(503)
+        if self.retry_after:
+            self.send_header("Retry-After", self.retry_after)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def test_failed_requests_are_retried_after_a_jittered_backoff(monkeypatch):
+    publish(ASSEMBLIES[:1])
+    sleeps = []
+    monkeypatch.setattr(par.time, "sleep", sleeps.append)
+    Flaky.failures, Flaky.retry_after = 2, None
+    with serve(Flaky) as url:
+        client = par.PooledHTTPClient(max_tries=3, backoff=1.0)
+        assert client.request(f"{url}/genomes/refseq/viral/assembly_summary.txt", lambda r: r.read()).startswith(b"#")
+    assert len(sleeps) == 2
+    assert 1.0 <= sleeps[0] <= 1.0 * (1 + par.RETRY_JITTER) and 2.0 <= sleeps[1] <= 2.0 * (1 + par.RETRY_JITTER)
+
+    sleeps.clear()
+    Flaky.failures, Flaky.retry_after = 1, "7"
+    with serve(Flaky) as url:
+        par.PooledHTTPClient(backoff=1.0).request(f"{url}/genomes/refseq/viral/assembly_summary.txt", lambda r: r.read())
+    assert len(sleeps) == 1 and sleeps[0] >= 7.0  # The server's Retry-After wins over the backoff
+
+    sleeps.clear()
+    with serve(Flaky) as url, pytest.raises(par.urllib.error.HTTPError):
+        par.PooledHTTPClient(backoff=1.0).request(f"{url}/genomes/missing", lambda r: r.read())
+    assert sleeps == []  # A 404 is not retried
+
+
+def test_incremental_sync_reports_missing_genomes(tmp_path, tree_url):
+    publish([("GCF_000000001.1", "Complete Genome", ">A\nAAAA\n"), ("GCF_000000002.1", "Complete Genome", None)])
+    missing = par.download_viral_genomes_native("refseq", str(tmp_path), 2, "all", base_url=f"{tree_url}/genomes",
+                                                incremental=True)
+    assert missing == ["GCF_000000002.1"]
+    assert "GCF_000000002.1\t" in (tmp_path / "viral_complete_genomes_refseq.missing.tsv").read_text()
+
+    publish([("GCF_000000001.1", "Complete Genome", ">A\nAAAA\n"), ("GCF_000000002.1", "Complete Genome", ">B\nCC\n")])
+    assert par.download_viral_genomes_native("refseq", str(tmp_path), 2, "all", base_url=f"{tree_url}/genomes",
+                                             incremental=True) == []
+    assert not (tmp_path / "viral_complete_genomes_refseq.missing.tsv").exists()  # The stale report is removed
+
+
+def test_command_line_exits_nonzero_when_genomes_are_missing(tmp_path, tree_url):
+    publish(ASSEMBLIES)
+    result = subprocess.run([sys.executable, SCRIPT, "-d", "refseq", "-o", str(tmp_path), "--engine", "native",
+                             "--base-url", f"{tree_url}/genomes"], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "1 genome files were not found" in result.stdout
+
+    publish(ASSEMBLIES[:3])
+    result = subprocess.run([sys.executable, SCRIPT, "-d", "refseq", "-o", str(tmp_path), "--engine", "native",
+                             "--base-url", f"{tree_url}/genomes"], capture_output=True, text=True)
+    assert result.returncode == 0
+
+
+def test_unchanged_summary_rows_skip_md5checksums(tmp_path, tree_url):
+    assemblies = [("GCF_000000001.1", "Complete Genome", ">A\nAAAA\n"),
+                  ("GCF_000000002.1", "Complete Genome", ">B\nCCCC\n")]
+    publish(assemblies)
+    sync(tmp_path, tree_url)
+    assert md5_requests() == ["GCF_000000001.1_ASM", "GCF_000000002.1_ASM"]
+
+    publish(assemblies)
+    assert sync(tmp_path, tree_url) == ">A\nAAAA\n>B\nCCCC\n"
+    assert md5_requests() == [] and genome_requests() == []  # Nothing but assembly_summary.txt was requested
+
+    # A manifest written before row digests were recorded: every md5checksums.txt is checked once
+    manifest = tmp_path / "viral_complete_genomes_refseq.manifest.tsv"
+    manifest.write_text("".join("\t".join(row[:5]) + "\n" for row in read_manifest_rows(tmp_path)))
+    publish(assemblies, dates={"GCF_000000001.1": "2024/02/01"})
+    assert sync(tmp_path, tree_url) == ">A\nAAAA\n>B\nCCCC\n"
+    assert md5_requests() == ["GCF_000000001.1_ASM", "GCF_000000002.1_ASM"] and genome_requests() == []
+    assert all(len(row) == 6 and row[5] for row in read_manifest_rows(tmp_path)[1:])
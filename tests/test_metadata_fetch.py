@@ -0,0 +1,494 @@
+import io
+import os
+import sys
+import time
+import subprocess
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from helpers import REPO, load_script, serve
+
+fetch = load_script("Download_fasta_metadata_fetch/download_viral_genomes_metadata_NCBI_fetch.py")
+
+
+class StubEfetch(BaseHTTPRequestHandler):
+    """Stub efetch: one FASTA record per requested ID; the first `short` responses drop their last record."""
+
+    lock = threading.Lock()
+    short = 0
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, query):
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(query).items()}
+        ids = params["id"].split(",")
+        with self.lock:
+            StubEfetch.requests += 1
+            if StubEfetch.short:
+                StubEfetch.short -= 1
+                ids = ids[:-1]
+        body = "".join(f">{uid}.1 virus {uid}, complete genome\nACGTACGT\nACG\n\n" for uid in ids).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.reply(urllib.parse.urlparse(self.path).query)
+
+    def do_POST(self):
+        self.reply(self.rfile.read(int(self.headers["Content-Length"])).decode())
+
+
+@pytest.fixture
+def efetch_client():
+    StubEfetch.short, StubEfetch.requests = 0, 0
+    with serve(StubEfetch) as url:
+        yield fetch.EutilsClient("me@example.org", rate=100, base_url=url, backoff=0.01)
+
+
+def test_copy_fasta_stream_counts_records_and_ends_lines():
+    out = io.BytesIO()
+    assert fetch.copy_fasta_stream(io.BytesIO(b">a\nAC\n>b\nGT"), out, buffer_size=3) == 2
+    assert out.getvalue() == b">a\nAC\n>b\nGT\n"
+
+
+def test_copy_fasta_stream_rejects_non_fasta():
+    with pytest.raises(ValueError):
+        fetch.copy_fasta_stream(io.BytesIO(b"<error>busy</error>"), io.BytesIO())
+
+
+def test_short_chunk_is_rolled_back_and_retried(tmp_path, efetch_client):
+    ids = [str(i) for i in range(12)]
+    output = tmp_path / "genomes.fasta"
+    StubEfetch.short = 1
+
+    unresolved = fetch.download_chunks(
+        ids, str(output),
+        lambda chunk: efetch_client.stream("efetch", io.BytesIO(), db="nuccore", rettype="fasta", **chunk),
+        _write_checked,
+        efetch_client, chunk_size=5, backoff=0.01)
+
+    assert unresolved == []
+    headers = [line for line in output.read_text().splitlines() if line.startswith(">")]
+    # Nothing lost or doubled (a retried chunk is appended after the chunks that succeeded first)
+    assert sorted(headers) == sorted(f">{i}.1 virus {i}, complete genome" for i in range(12))
+    assert StubEfetch.requests == 4  # Three chunks plus one retry
+
+
+def test_failed_chunks_are_retried_concurrently(tmp_path, efetch_client):
+    lock, calls, active, peak = threading.Lock(), {}, [0], [0]
+
+    def fetch_chunk(chunk):
+        with lock:
+            calls[chunk["id"]] = calls.get(chunk["id"], 0) + 1
+            if calls[chunk["id"]] == 1:
+                raise OSError("connection reset")
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.2)
+        with lock:
+            active[0] -= 1
+        return io.BytesIO("".join(f">{uid}\nACGT\n" for uid in chunk["id"].split(",")).encode())
+
+    unresolved = fetch.download_chunks([str(i) for i in range(15)], str(tmp_path / "genomes.fasta"),
+                                       fetch_chunk, _write_checked, efetch_client, chunk_size=5, backoff=0.01)
+
+    assert unresolved == []
+    assert sorted(calls.values()) == [2, 2, 2]
+    assert peak[0] > 1  # The three retries overlapped instead of running one after another
+
+
+def test_empty_id_list_leaves_no_journal(tmp_path, efetch_client):
+    output = tmp_path / "genomes.fasta"
+    assert fetch.download_chunks([], str(output), None, _write_checked, efetch_client) == []
+    assert output.exists()
+    assert not (tmp_path / "genomes.fasta.journal").exists()
+
+
+def test_partition_is_skipped_while_superset_records_are_unresolved(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(fetch, "download_group", lambda *args: ["NC_000001 (index 0)"])
+    monkeypatch.setattr(fetch, "partition_group_files", lambda *args: pytest.fail("partitioned an incomplete superset"))
+    groups = {"dsDnaViruses": "35237", "ssRnaViruses": "439488", "allViruses": fetch.VIRUSES_TAXID}
+
+    unresolved = fetch.download_viral_genomes(groups, "genbank", "me@example.org", "complete genome",
+                                              str(tmp_path), client=object(), partition=True)
+
+    assert unresolved == ["NC_000001 (index 0)"]
+    assert "dsDnaViruses, ssRnaViruses were not updated" in capsys.readouterr().out
+
+
+def _write_checked(data, expected, out_f):
+    records = fetch.copy_fasta_stream(data, out_f)
+    if records != expected:
+        raise ValueError(f"returned {records} of {expected} sequences")
+
+
+def _write_group(tmp_path, name, records):
+    fasta, metadata = tmp_path / f"{name}.fasta", tmp_path / f"{name}.csv"
+    fasta.write_text("".join(f">{accession} virus\nACGT\n" for accession, _ in records))
+    metadata.write_text("Accession,UpdateDate\n" + "".join(f"{accession},{date}\n" for accession, date in records))
+    return str(fasta), str(metadata)
+
+
+def test_merge_updates_replaces_old_versions_and_appends_new_records(tmp_path):
+    fasta, metadata = _write_group(tmp_path, "group", [("A.1", "2024/01/01"), ("B.1", "2024/01/01")])
+    update_fasta, update_metadata = _write_group(tmp_path, "update", [("B.2", "2024/06/01"), ("C.1", "2024/06/01")])
+
+    assert fetch.merge_updates(fasta, metadata, update_fasta, update_metadata) == (1, 1)
+
+    assert [line for line in open(fasta) if line.startswith(">")] == [">A.1 virus\n", ">B.2 virus\n", ">C.1 virus\n"]
+    assert open(metadata).read().split() == ["Accession,UpdateDate", "A.1,2024/01/01", "B.2,2024/06/01", "C.1,2024/06/01"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["group.csv", "group.fasta", "update.csv", "update.fasta"]
+
+
+def test_interrupted_merge_is_completed_on_the_next_run(tmp_path, monkeypatch):
+    fasta, metadata = _write_group(tmp_path, "group", [("A.1", "2024/01/01")])
+    update_fasta, update_metadata = _write_group(tmp_path, "update", [("A.2", "2024/06/01")])
+    replace = fetch.os.replace
+
+    def crash_before_metadata(src, dst):
+        if dst == metadata:
+            raise KeyboardInterrupt
+        replace(src, dst)
+
+    monkeypatch.setattr(fetch.os, "replace", crash_before_metadata)
+    with pytest.raises(KeyboardInterrupt):
+        fetch.merge_updates(fasta, metadata, update_fasta, update_metadata)
+    monkeypatch.setattr(fetch.os, "replace", replace)
+    assert ">A.2 virus" in open(fasta).read() and "A.1" in open(metadata).read()  # Half-applied
+
+    assert fetch.finish_merge(metadata)
+    assert "A.2" in open(metadata).read() and "A.1" not in open(metadata).read()
+    assert not (tmp_path / "group.csv.merge").exists()
+    assert not fetch.finish_merge(metadata)
+
+
+@pytest.mark.parametrize("flag", ["--stream", "--json-summary"])
+def test_single_pass_rejects_flags_it_would_ignore(flag):
+    script = os.path.join(REPO, "Download_fasta_metadata_fetch", "download_viral_genomes_metadata_NCBI_fetch.py")
+    result = subprocess.run([sys.executable, script, "-e", "me@example.org", "--single-pass", flag],
+                            capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--single-pass cannot be combined" in result.stderr
+
+
+def _fetch_fasta(calls=None, fail=()):
+    """fetch_chunk stand-in: one record per ID; IDs in `fail` make their chunk raise."""
+    def fetch_chunk(chunk):
+        ids = chunk["id"].split(",")
+        if calls is not None:
+            calls.append(ids)
+        if set(ids) & set(fail):
+            raise ValueError(f"bad ID in {ids}")
+        return io.BytesIO("".join(f">{uid}\nACGT\n" for uid in ids).encode())
+    return fetch_chunk
+
+
+def _headers(path):
+    return [line[1:] for line in open(path).read().splitlines() if line.startswith(">")]
+
+
+def test_interrupted_run_resumes_from_the_journal(tmp_path):
+    ids = [str(i) for i in range(10)]
+    output = tmp_path / "genomes.fasta"
+    calls = []
+
+    def interrupt_after_two(chunk):
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return _fetch_fasta(calls)(chunk)
+
+    client = fetch.EutilsClient("me@example.org", rate=100, max_workers=1)
+    with pytest.raises(KeyboardInterrupt):
+        fetch.download_chunks(ids, str(output), interrupt_after_two, _write_checked, client, chunk_size=2)
+    assert (tmp_path / "genomes.fasta.journal").exists()
+    assert _headers(output) == ids[:4]
+
+    calls.clear()
+    assert fetch.download_chunks(ids, str(output), _fetch_fasta(calls), _write_checked, client, chunk_size=2) == []
+    assert calls == [ids[4:6], ids[6:8], ids[8:10]]  # Only the chunks missing from the journal
+    assert _headers(output) == ids
+    assert not (tmp_path / "genomes.fasta.journal").exists()
+
+
+def test_deleted_output_is_rebuilt_instead_of_trusting_the_journal(tmp_path):
+    ids = [str(i) for i in range(10)]
+    output = tmp_path / "genomes.fasta"
+    client = fetch.EutilsClient("me@example.org", rate=100, max_workers=1)
+    fetch.download_chunks(ids, str(output), _fetch_fasta(fail=["9"]), _write_checked, client, chunk_size=1,
+                          max_attempts=1, backoff=0)
+    assert (tmp_path / "genomes.fasta.journal").exists()  # ID 9 is unresolved
+    os.remove(output)
+
+    assert fetch.download_chunks(ids, str(output), _fetch_fasta(), _write_checked, client, chunk_size=1) == []
+    assert _headers(output) == ids
+
+
+def test_verify_truncates_a_torn_tail(tmp_path):
+    ids = [str(i) for i in range(6)]
+    output = tmp_path / "genomes.fasta"
+    client = fetch.EutilsClient("me@example.org", rate=100, max_workers=1)
+    journal = fetch.ChunkJournal(f"{output}.journal", ids)
+    with open(output, "w+b") as out_f:
+        for start in range(0, 6, 2):
+            offset = out_f.tell()
+            sink = fetch.HashingWriter(out_f)
+            _write_checked(_fetch_fasta()({"id": ",".join(ids[start:start + 2])}), 2, sink)
+            journal.record(start, start + 2, "done", [offset], [sink.length], [sink.sha256.hexdigest()])
+    third = journal.chunks["4-6"]["offset"][0]
+    with open(output, "r+b") as out_f:  # Crash while the third chunk was being rewritten
+        out_f.truncate(third + 3)
+
+    calls = []
+    assert fetch.download_chunks(ids, str(output), _fetch_fasta(calls), _write_checked, client, chunk_size=2) == []
+    assert calls == [ids[4:6]]
+    assert _headers(output) == ids
+    assert output.read_text().count("ACGT") == 6
+
+
+def test_failing_chunk_is_bisected_down_to_the_bad_ids(tmp_path, efetch_client):
+    ids = [str(i) for i in range(8)]
+    output = tmp_path / "genomes.fasta"
+    calls = []
+
+    unresolved = fetch.download_chunks(ids, str(output), _fetch_fasta(calls, fail=["2", "5"]), _write_checked,
+                                       efetch_client, chunk_size=8, max_attempts=1, backoff=0)
+
+    assert unresolved == ["ID 2", "ID 5"]
+    assert sorted(_headers(output), key=int) == ["0", "1", "3", "4", "6", "7"]
+    assert ["2"] in calls and ["5"] in calls
+    assert (tmp_path / "genomes.fasta.journal").exists()  # Kept for the rerun
+
+
+ESEARCH = ('<?xml version="1.0" encoding="UTF-8" ?>\n'
+           '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+           '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n'
+           '<eSearchResult><Count>{count}</Count><RetMax>0</RetMax><RetStart>0</RetStart>'
+           '<QueryKey>1</QueryKey><WebEnv>{webenv}</WebEnv><IdList></IdList></eSearchResult>\n')
+
+
+class StubHistory(BaseHTTPRequestHandler):
+    """Stub history server: esearch stores `count` records under a WebEnv; efetch pages them by retstart/retmax."""
+
+    lock = threading.Lock()
+    count = 12
+    webenv = "MCID_stub_webenv"
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, path, query):
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(query).items()}
+        with self.lock:
+            StubHistory.requests.append((os.path.basename(path), params))
+        if path.endswith("esearch.fcgi"):
+            body = ESEARCH.format(count=self.count, webenv=self.webenv).encode()
+        elif params.get("WebEnv") != self.webenv or params.get("query_key") != "1" or "id" in params:
+            self.send_error(400)
+            return
+        else:
+            start = int(params["retstart"])
+            end = min(start + int(params["retmax"]), self.count)
+            body = "".join(f">HS{index:06d}.1 virus {index}\nACGT\n" for index in range(start, end)).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        self.reply(url.path, url.query)
+
+    def do_POST(self):
+        self.reply(urllib.parse.urlparse(self.path).path, self.rfile.read(int(self.headers["Content-Length"])).decode())
+
+
+def test_history_search_pages_efetch_by_retstart_and_retmax(tmp_path):
+    StubHistory.requests = []
+    with serve(StubHistory) as url:
+        client = fetch.EutilsClient("me@example.org", rate=100, base_url=url, backoff=0.01)
+        search = fetch.search_history("txid10239[Organism]", "me@example.org", client=client, mindate="2024/01/01")
+        assert (search.webenv, search.query_key, len(search)) == (StubHistory.webenv, "1", 12)
+
+        output = tmp_path / "genomes.fasta"
+        unresolved = fetch.download_chunks(
+            search, str(output),
+            lambda chunk: client.stream("efetch", io.BytesIO(), db="nuccore", rettype="fasta", **chunk),
+            _write_checked, client, chunk_size=5)
+
+    assert unresolved == []
+    assert _headers(output) == [f"HS{index:06d}.1 virus {index}" for index in range(12)]  # In order, none doubled
+    (endpoint, esearch), *efetches = StubHistory.requests
+    assert endpoint == "esearch.fcgi"
+    assert (esearch["usehistory"], esearch["retmax"], esearch["mindate"]) == ("y", "0", "2024/01/01")
+    assert sorted((int(params["retstart"]), int(params["retmax"])) for _, params in efetches) == [(0, 5), (5, 5), (10, 2)]
+    assert all(params["WebEnv"] == StubHistory.webenv and params["query_key"] == "1" for _, params in efetches)
+
+
+def test_chunk_params_select_ids_or_history_windows():
+    search = fetch.HistorySearch("query", "webenv", "3", 7)
+    assert fetch.chunk_params(search, 5, 7) == {"WebEnv": "webenv", "query_key": "3", "retstart": 5, "retmax": 2}
+    assert fetch.chunk_params(["a", "b", "c"], 1, 3) == {"id": "b,c"}
+    assert fetch.describe_record(search, 5) == "record 5 of 'query'"
+
+
+PARTITION_RECORDS = [("NC_000001.1", "10001"), ("NC_000002.1", "20001"), ("NC_000003.1", "10002"),
+                     ("NC_000004.1", "99999"), ("NC_000005.1", "10239")]
+NODES_DMP = "".join(f"{child}\t|\t{parent}\t|\tspecies\t|\n" for child, parent in [
+    ("1", "1"), ("10239", "1"), ("35237", "10239"), ("439488", "10239"),
+    ("10001", "35237"), ("10002", "35237"), ("20001", "439488")])
+
+
+def test_partition_assigns_records_by_lineage_and_reports_unknown_taxids(tmp_path):
+    fasta, metadata = tmp_path / "all.fasta", tmp_path / "all.csv"
+    fasta.write_text("".join(f">{accession} virus\nACGT\nAC\n" for accession, _ in PARTITION_RECORDS))
+    metadata.write_text("Accession,Taxonomy ID\n" + "".join(f"{accession},{taxid}\n"
+                                                            for accession, taxid in PARTITION_RECORDS))
+    (tmp_path / "nodes.dmp").write_text(NODES_DMP)
+    lineages = fetch.lookup_lineages({taxid for _, taxid in PARTITION_RECORDS}, None, str(tmp_path / "nodes.dmp"))
+    assert lineages["10001"] == {"10001", "35237", "10239", "1"}
+    group_files = {taxid: (str(tmp_path / f"{taxid}.fasta"), str(tmp_path / f"{taxid}.csv"))
+                   for taxid in ("35237", "439488")}
+
+    counts, unassigned = fetch.partition_group_files(str(fasta), str(metadata), group_files, lineages)
+
+    assert counts == {"35237": 2, "439488": 1}
+    assert _headers(tmp_path / "35237.fasta") == ["NC_000001.1 virus", "NC_000003.1 virus"]
+    assert _headers(tmp_path / "439488.fasta") == ["NC_000002.1 virus"]
+    assert (tmp_path / "439488.fasta").read_text() == ">NC_000002.1 virus\nACGT\nAC\n"
+    assert (tmp_path / "35237.csv").read_text().split() == ["Accession,Taxonomy", "ID", "NC_000001.1,10001",
+                                                            "NC_000003.1,10002"]
+    assert unassigned == ["NC_000004.1", "NC_000005.1"]  # Unknown taxid, and a lineage outside every group
+
+
+def test_partition_mode_lists_unassigned_records(tmp_path, monkeypatch, capsys):
+    def download_superset(group, taxon_id, database, *args):
+        (tmp_path / f"{group}_{database}_genomes.fasta").write_text(
+            "".join(f">{accession} virus\nACGT\n" for accession, _ in PARTITION_RECORDS))
+        (tmp_path / f"{group}_{database}_metadata.csv").write_text(
+            "Accession,Taxonomy ID\n" + "".join(f"{accession},{taxid}\n" for accession, taxid in PARTITION_RECORDS))
+        return []
+
+    monkeypatch.setattr(fetch, "download_group", download_superset)
+    (tmp_path / "nodes.dmp").write_text(NODES_DMP)
+    groups = {"dsDnaViruses": "35237", "ssRnaViruses": "439488", "allViruses": fetch.VIRUSES_TAXID}
+
+    assert fetch.download_viral_genomes(groups, "genbank", "me@example.org", "complete genome", str(tmp_path),
+                                        client=object(), partition=True, nodes_dmp=str(tmp_path / "nodes.dmp")) == []
+
+    assert (tmp_path / "allViruses_genbank_unassigned.txt").read_text() == "NC_000004.1\nNC_000005.1\n"
+    assert "2 allViruses records matched no group" in capsys.readouterr().out
+    assert _headers(tmp_path / "ssRnaViruses_genbank_genomes.fasta") == ["NC_000002.1 virus"]
+
+
+GENBANK_RECORDS = {
+    "NC_001802": ("Human immunodeficiency virus 1, complete genome", "11676", "25-JAN-2024", "ACGTACGTACGTAA"),
+    "MN908947": ("Severe acute respiratory syndrome coronavirus 2 isolate Wuhan-Hu-1, complete genome",
+                 "2697049", "18-MAR-2020", "ATTAAAGGTTTATACC"),
+    "OK091006": ("Unclassified virus isolate X, complete genome", None, "03-OCT-2021", "GGCCTTAA"),
+}
+
+
+def genbank_record(accession):
+    title, taxid, date, sequence = GENBANK_RECORDS[accession]
+    xref = f'                     /db_xref="taxon:{taxid}"\n' if taxid else ""
+    bases = " ".join(sequence[i:i + 10].lower() for i in range(0, len(sequence), 10))
+    return (f"LOCUS       {accession:<16}{len(sequence):>12} bp    RNA     linear   VRL {date}\n"
+            f"DEFINITION  {title}.\n"
+            f"ACCESSION   {accession}\n"
+            f"VERSION     {accession}.1\n"
+            f"SOURCE      {title.split(',')[0]}\n"
+            f"  ORGANISM  {title.split(',')[0]}\n"
+            f"            Viruses.\n"
+            f"FEATURES             Location/Qualifiers\n"
+            f"     source          1..{len(sequence)}\n"
+            f'                     /organism="{title.split(",")[0]}"\n'
+            f"{xref}"
+            f"ORIGIN\n"
+            f"        1 {bases}\n"
+            f"//\n")
+
+
+class StubGenBank(StubEfetch):
+    """Stub efetch (rettype=gbwithparts): one GenBank flat-file record per requested ID."""
+
+    def reply(self, query):
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(query).items()}
+        assert params["rettype"] == "gbwithparts"
+        body = "".join(genbank_record(uid) for uid in params["id"].split(",")).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_single_pass_writes_fasta_and_metadata_from_the_same_records(tmp_path):
+    output, metadata = tmp_path / "genomes.fasta", tmp_path / "metadata.csv"
+    with serve(StubGenBank) as url:
+        client = fetch.EutilsClient("me@example.org", rate=100, base_url=url, backoff=0.01)
+        assert fetch.download_genbank(list(GENBANK_RECORDS), str(output), str(metadata), client) == []
+
+    with open(metadata, newline="") as in_csv:
+        rows = list(fetch.csv.DictReader(in_csv))
+    fasta = list(fetch.SeqIO.parse(str(output), "fasta"))
+    assert [record.id for record in fasta] == [row["Accession"] for row in rows] == \
+        ["NC_001802.1", "MN908947.1", "OK091006.1"]
+    for record, row, (title, taxid, _, sequence) in zip(fasta, rows, GENBANK_RECORDS.values()):
+        assert str(record.seq) == sequence and row["Length"] == str(len(sequence))
+        assert record.description == f"{record.id} {title}"
+        assert row["Title"] == title  # The trailing '.' of DEFINITION is dropped, as in esummary Titles
+        assert row["Taxonomy ID"] == (taxid or "N/A")  # From the source feature's taxon db_xref
+        assert row["Organism"] == title.split(",")[0]
+    assert [row["UpdateDate"] for row in rows] == ["2024/01/25", "2020/03/18", "2021/10/03"]
+
+
+benchmark = load_script("Download_fasta_metadata_fetch/benchmark_esummary.py")
+
+
+def test_json_and_xml_summaries_give_identical_rows():
+    xml, json_data = benchmark.make_responses(5)
+    xml_rows, json_rows = fetch.summary_rows_xml(xml), fetch.summary_rows_json(json_data)
+    assert json_rows == xml_rows
+    assert [{field: type(value) for field, value in row.items()} for row in json_rows] == \
+        [{field: type(value) for field, value in row.items()} for row in xml_rows]
+    assert xml_rows[1] == {"Accession": "PX000001.1", "Taxonomy ID": 10240, "Title": "Synthetic phage 1, complete genome",
+                           "Organism": "N/A", "Length": 150000, "UpdateDate": "2024/03/05"}
+    assert type(xml_rows[1]["Taxonomy ID"]) is int and type(xml_rows[1]["Title"]) is str
+
+
+def test_json_summary_error_is_raised():
+    data = fetch.json.dumps({"result": {"uids": ["1"], "1": {"uid": "1", "error": "cannot get document summary"}}})
+    with pytest.raises(ValueError):
+        fetch.summary_rows_json(data.encode())
+
+
+def test_parquet_round_trips_the_csv_columns_and_types(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    metadata, parquet = tmp_path / "metadata.csv", tmp_path / "metadata.parquet"
+    rows = fetch.summary_rows_json(benchmark.make_responses(5)[1])
+    rows.append({"Accession": "PX999999.1", "Taxonomy ID": "N/A", "Title": "No summary", "Organism": "N/A",
+                 "Length": "", "UpdateDate": "N/A"})
+    with open(metadata, "w", newline="") as out_csv:
+        writer = fetch.csv.DictWriter(out_csv, fieldnames=fetch.METADATA_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    assert fetch.write_metadata_parquet(str(metadata), str(parquet), row_group_size=4) == 6
+
+    table = pq.read_table(str(parquet))
+    assert table.column_names == fetch.METADATA_FIELDS
+    assert [str(field.type) for field in table.schema] == ["string", "int64", "string", "string", "int64", "date32[day]"]
+    assert pq.ParquetFile(str(parquet)).num_row_groups == 2
+    assert table.to_pylist()[0] == {"Accession": "PX000000.1", "Taxonomy ID": 10239,
+                                    "Title": "Synthetic phage 0, complete genome", "Organism": "N/A",
+                                    "Length": 150000, "UpdateDate": fetch.datetime(2024, 3, 5).date()}
+    assert table.to_pylist()[-1] == {"Accession": "PX999999.1", "Taxonomy ID": None, "Title": "No summary",
+                                     "Organism": "N/A", "Length": None, "UpdateDate": None}
+    assert not (tmp_path / "metadata.parquet.tmp").exists()
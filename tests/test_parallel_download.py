@@ -0,0 +1,166 @@
+import io
+import os
+import gzip
+import hashlib
+import tarfile
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from helpers import load_script, serve
+
+parallel_download = load_script("parallel_download/parallel_download.py")
+
+CHUNK = 64  # Small ranges, so a few hundred bytes take several Range requests
+
+
+class RangeServer(BaseHTTPRequestHandler):
+    """
+    Serves BODY at /file with an ETag. Range requests are honoured when RANGES is set; If-Range with a
+    stale ETag is answered with the whole file (200), like a server whose file changed. The next
+    FAILURES requests for ranges after the first one get a 503. With UNKNOWN_SIZE, ranges are answered
+    with Content-Range bytes start-end/* (total size not given).
+    """
+
+    body = b""
+    etag = '"v1"'
+    ranges = True
+    failures = 0
+    unknown_size = False
+    requests = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        with self.lock:
+            RangeServer.requests.append(range_header)
+            fail = bool(range_header) and not range_header.startswith("bytes=0-") and RangeServer.failures > 0
+            if fail:
+                RangeServer.failures -= 1
+        if self.path != "/file":
+            self.send_error(404)
+            return
+        if fail:
+            self.send_error(503)
+            return
+        if_range = self.headers.get("If-Range")
+        if self.ranges and range_header and (if_range is None or if_range == self.etag):
+            start, end = (int(value) for value in range_header[len("bytes="):].split("-"))
+            end = min(end, len(self.body) - 1)
+            body = self.body[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{'*' if self.unknown_size else len(self.body)}")
+        else:
+            body = self.body
+            self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def publish(body, ranges=True, failures=0, unknown_size=False):
+    RangeServer.body = body
+    RangeServer.etag = '"v1"'
+    RangeServer.ranges = ranges
+    RangeServer.failures = failures
+    RangeServer.unknown_size = unknown_size
+    RangeServer.requests = []
+
+
+def tar_gz(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def file_url():
+    with serve(RangeServer) as url:
+        yield url + "/file"
+
+
+TEXT = b"".join(b">seq%d\nACGTACGTAC\n" % index for index in range(100))
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_gunzip_with_and_without_range_support(file_url, tmp_path, ranges):
+    data = gzip.compress(TEXT)
+    publish(data, ranges)
+    output, kept = tmp_path / "out.fna", tmp_path / "out.fna.gz"
+    with parallel_download.open_download(file_url, connections=3, chunk_size=CHUNK, save_to=str(kept)) as stream:
+        parallel_download.gunzip_to(stream, str(output), hashlib.md5(data).hexdigest())
+    assert output.read_bytes() == TEXT
+    assert kept.read_bytes() == data
+    assert stream.bytes_read == len(data)
+    assert sorted(os.listdir(tmp_path)) == ["out.fna", "out.fna.gz"]
+    if ranges:
+        assert len(RangeServer.requests) == -(-len(data) // CHUNK)  # One request per chunk
+    else:
+        assert len(RangeServer.requests) == 1
+
+
+def test_untar_extracts_while_downloading(file_url, tmp_path):
+    data = tar_gz({"nodes.dmp": b"1\t|\t1\n" * 50, "names.dmp": b"1\t|\troot\n" * 50})
+    publish(data)
+    with parallel_download.open_download(file_url, connections=2, chunk_size=CHUNK) as stream:
+        parallel_download.untar_to(stream, str(tmp_path / "TAX"), hashlib.md5(data).hexdigest())
+    assert sorted(os.listdir(tmp_path / "TAX")) == ["names.dmp", "nodes.dmp"]
+    assert (tmp_path / "TAX" / "nodes.dmp").read_bytes() == b"1\t|\t1\n" * 50
+
+
+def test_md5_mismatch_publishes_nothing(file_url, tmp_path):
+    publish(gzip.compress(TEXT))
+    with pytest.raises(ValueError, match="MD5 mismatch"):
+        parallel_download.download(file_url, str(tmp_path / "out.fna"), "gunzip", 2, str(tmp_path / "out.fna.gz"),
+                                   md5="0" * 32)
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_probe_leaves_no_part_file(file_url, tmp_path):
+    with pytest.raises(urllib.error.HTTPError):
+        parallel_download.open_download(file_url.replace("/file", "/missing"), save_to=str(tmp_path / "out.gz"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_file_changed_during_download_fails(file_url, tmp_path):
+    publish(gzip.compress(TEXT))
+    with parallel_download.open_download(file_url, connections=1, chunk_size=CHUNK) as stream:
+        RangeServer.etag = '"v2"'  # The ranges not yet requested now fail If-Range
+        with pytest.raises(IOError, match="changed during the download"):
+            stream.read()
+
+
+def test_transient_errors_are_retried_with_backoff(file_url, monkeypatch):
+    data = gzip.compress(TEXT)
+    publish(data, failures=2)
+    delays = []
+    monkeypatch.setattr(parallel_download.time, "sleep", delays.append)
+    with parallel_download.DownloadStream(file_url, connections=1, chunk_size=CHUNK, backoff=0.25) as stream:
+        assert stream.read() == data
+    assert delays == [0.25, 0.5]
+
+    publish(data, failures=3)  # MAX_TRIES failures in a row give up
+    with parallel_download.DownloadStream(file_url, connections=1, chunk_size=CHUNK, backoff=0) as stream:
+        with pytest.raises(urllib.error.HTTPError):
+            stream.read()
+
+
+def test_range_of_unknown_total_size_is_refetched_whole(file_url, tmp_path):
+    data = gzip.compress(TEXT)
+    assert len(data) > CHUNK
+    publish(data, unknown_size=True)
+    output, kept = tmp_path / "out.fna", tmp_path / "out.fna.gz"
+    with parallel_download.open_download(file_url, connections=3, chunk_size=CHUNK, save_to=str(kept)) as stream:
+        parallel_download.gunzip_to(stream, str(output), hashlib.md5(data).hexdigest())
+    assert output.read_bytes() == TEXT and kept.read_bytes() == data
+    assert RangeServer.requests == [f"bytes=0-{CHUNK - 1}", None]  # The probe, then the whole file
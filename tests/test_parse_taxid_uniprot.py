@@ -0,0 +1,49 @@
+import gzip
+
+import pytest
+
+from helpers import load_script
+
+parser = load_script("protein/parse_taxid_uniprot/parse_taxid_uniprot.py")
+
+RECORDS = [(f"sp|P{index:05d}|PROT{index}_VIRUS Protein {index} OS=Virus OX={10239 + index} GN=g{index}",
+            "MKTAYIAKQRQISFVKSHFSRQ" * (index % 4 + 1)) for index in range(40)]
+RECORDS.append(("tr|A0A000|A0A000_9VIRU Protein without a taxid", "MKT"))
+FASTA = "".join(f">{header}\n{sequence[:30]}\n{sequence[30:]}\n" for header, sequence in RECORDS).encode()
+RANGE_SIZE = FASTA.index(b">sp|P00007|")  # The first range (or gzip block) is cut exactly at header 7
+
+
+@pytest.fixture(params=["proteins.fasta", "proteins.fasta.gz"])
+def fasta_path(request, tmp_path):
+    path = tmp_path / request.param
+    path.write_bytes(gzip.compress(FASTA) if request.param.endswith(".gz") else FASTA)
+    return path
+
+
+def test_record_ranges_start_at_headers(tmp_path):
+    path = tmp_path / "proteins.fasta"
+    path.write_bytes(FASTA)
+    ranges = parser.record_ranges(str(path), RANGE_SIZE)
+    assert len(ranges) > 3
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(FASTA)
+    for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start and FASTA[next_start:next_start + 1] == b">"
+
+
+def test_threads_give_identical_tsv(fasta_path, tmp_path):
+    outputs = []
+    for threads in (1, 4):
+        output = tmp_path / f"threads{threads}" / "taxid_aa.tsv"
+        parser.parse_fasta_to_tsv(str(fasta_path), str(output), threads, range_size=RANGE_SIZE)
+        outputs.append(output.read_bytes())
+    assert outputs[0] == outputs[1]
+    lines = outputs[0].decode().splitlines()
+    assert lines[:2] == ["P00000\t10239", "P00001\t10240"]
+    assert lines[-1] == "A0A000\tN/A"
+    assert len(lines) == len(RECORDS)
+
+
+def test_parallel_tsv_matches_the_dataframe_parser(fasta_path, tmp_path):
+    parser.parse_fasta_to_dataframe(str(fasta_path), str(tmp_path / "serial" / "taxid_aa.tsv"))
+    parser.parse_fasta_to_tsv(str(fasta_path), str(tmp_path / "parallel" / "taxid_aa.tsv"), 3, range_size=RANGE_SIZE)
+    assert (tmp_path / "parallel" / "taxid_aa.tsv").read_bytes() == (tmp_path / "serial" / "taxid_aa.tsv").read_bytes()
@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pytest
+
+from helpers import load_script
+
+refseq = load_script("Downloading_RefSeq_Viral_Genomes_from_the_NCBI_Website/refseq_viral_genomes_website.py")
+
+
+def random_genome(rng, length):
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+def mutate(rng, sequence, rate):
+    return "".join(rng.choice("ACGT".replace(base, "")) if rng.random() < rate else base for base in sequence)
+
+
+def reverse_complement(sequence):
+    return sequence[::-1].translate(str.maketrans("ACGT", "TGCA"))
+
+
+@pytest.mark.parametrize("kmer_size", [1, 5, 16, 21, 32])
+def test_pack_kmers_matches_naive_packing(kmer_size):
+    codes = np.array([random.Random(kmer_size).randrange(4) for _ in range(100)], dtype=np.uint64)
+    expected = [sum(int(code) << 2 * (kmer_size - 1 - j) for j, code in enumerate(codes[i:i + kmer_size]))
+                for i in range(len(codes) - kmer_size + 1)]
+    assert refseq.pack_kmers(codes, kmer_size).tolist() == expected
+
+
+def test_sketch_is_strand_and_case_independent():
+    genome = random_genome(random.Random(1), 3000)
+    sketch = refseq.minhash_sketch(f">a\n{genome}\n".encode())
+    assert (sketch != refseq.EMPTY_BIN).sum() > 200
+    assert np.array_equal(refseq.minhash_sketch(f">b\n{reverse_complement(genome)}\n".encode()), sketch)
+    assert np.array_equal(refseq.minhash_sketch(f">c\n{genome.lower()}\n".encode()), sketch)
+
+
+def test_sketch_skips_kmers_with_ambiguous_bases():
+    assert (refseq.minhash_sketch(b">short\nACGT\n") == refseq.EMPTY_BIN).all()
+    assert (refseq.minhash_sketch(b">gaps\n" + b"ACGTACGTNN" * 50 + b"\n") == refseq.EMPTY_BIN).all()
+
+
+def test_ani_and_jaccard_conversions_are_inverse():
+    for ani in (0.8, 0.9, 0.95, 0.99, 1.0):
+        assert refseq.jaccard_to_ani(refseq.ani_to_jaccard(ani, 21), 21) == pytest.approx(ani)
+    assert refseq.jaccard_to_ani(0.0, 21) == 0
+
+
+def test_cluster_genomes_keeps_the_longest_member_of_each_cluster(tmp_path):
+    rng = random.Random(5)
+    base, other = random_genome(rng, 6000), random_genome(rng, 5000)
+    genomes = [
+        ("close_1", mutate(rng, base, 0.005)[:5500]),
+        ("base", base),  # Longest of the cluster
+        ("close_rc", reverse_complement(mutate(rng, base, 0.005))),
+        ("other", other),
+        ("distant", mutate(rng, base, 0.25)),
+        ("tiny", "ACGT"),
+    ]
+    path = tmp_path / "viral_filtered.fna"
+    path.write_text("".join(f">{name} virus\n{sequence}\n" for name, sequence in genomes))
+
+    output = refseq.cluster_genomes(str(path), ani=0.95, threads=2)
+
+    assert output == str(tmp_path / "viral_filtered_clustered.fna")
+    assert [line.split()[0] for line in open(output) if line.startswith(">")] == [">base", ">other", ">distant",
+                                                                                  ">tiny"]
+    rows = [line.split("\t") for line in open(tmp_path / "clusters.tsv").read().splitlines()]
+    assert rows[0] == ["member_id", "representative_id", "ani"]
+    members = {member: (representative, float(ani)) for member, representative, ani in rows[1:]}
+    assert members["close_1"][0] == members["close_rc"][0] == "base"
+    assert 0.97 < members["close_1"][1] < 1 and 0.97 < members["close_rc"][1] < 1
+    assert {members[name] for name in ("base", "other", "distant", "tiny")} == {
+        (name, 1.0) for name in ("base", "other", "distant", "tiny")}
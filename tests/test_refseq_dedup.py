@@ -0,0 +1,120 @@
+import random
+
+import numpy as np
+import pytest
+
+from helpers import load_script
+
+refseq = load_script("Downloading_RefSeq_Viral_Genomes_from_the_NCBI_Website/refseq_viral_genomes_website.py")
+
+
+def reverse_complement(sequence):
+    return sequence[::-1].translate(str.maketrans("ACGT", "TGCA"))
+
+
+@pytest.mark.parametrize("prefix", [b"", b"\n", b"\n\n\n", b"\r\n \n", b"stray text\n\n"])
+def test_split_records_skips_everything_before_the_first_header(prefix):
+    records = list(refseq.split_records(prefix + b">a one\nAC\nGT\n\n>b\nTT"))
+    assert records == [b">a one\nAC\nGT\n\n", b">b\nTT\n"]
+
+
+def test_split_records_without_a_header_yields_nothing():
+    assert list(refseq.split_records(b"\n\nACGT\n")) == []
+
+
+def test_iter_fasta_records_across_blocks(tmp_path):
+    path = tmp_path / "viral.fna"
+    path.write_bytes(b"\n\n>a\nACGT\nACGT\n>b\nGG\n>c\nTTTT")
+    for block_size in (1, 3, 8, 1 << 20):
+        records = list(refseq.iter_fasta_records(str(path), block_size))
+        assert records == [b">a\nACGT\nACGT\n", b">b\nGG\n", b">c\nTTTT\n"]
+
+
+def test_sequence_digest_ignores_case_line_breaks_and_strand():
+    forward = refseq.sequence_digest(b">x\nACGGT\nACN\n")
+    assert refseq.sequence_digest(b">y\nacggtacn\r\n")[:2] == forward[:2]
+    assert refseq.sequence_digest(b">z\nNGTACCGT\n")[:2] == forward[:2]  # Reverse complement
+
+
+def test_rna_is_not_merged_with_its_dna_reverse_complement():
+    rna, dna_reverse_complement = b">r\nAACGU\n", b">d\nACGTT\n"
+    assert refseq.sequence_digest(rna)[:2] != refseq.sequence_digest(dna_reverse_complement)[:2]
+    assert refseq.sequence_digest(rna)[2] is False
+    assert refseq.sequence_digest(b">r2\naacgu\n")[:2] == refseq.sequence_digest(rna)[:2]
+
+
+def test_digest_table_matches_dict_setdefault_through_growth():
+    rng = random.Random(7)
+    table, expected = refseq.DigestTable(capacity=8), {}
+    for batch in range(40):
+        n = rng.randint(1, 500)
+        hi = [rng.choice([0, 1, 2 ** 64 - 1]) for _ in range(n)]
+        lo = [rng.randrange(3000) * rng.choice([1, 8, 2 ** 40]) % 2 ** 64 for _ in range(n)]  # Colliding slots
+        values = list(range(batch * 1000, batch * 1000 + n))
+        assert table.setdefault(hi, lo, values).tolist() == [expected.setdefault(key, value)
+                                                             for key, value in zip(zip(hi, lo), values)]
+    assert len(table) == len(expected)
+    assert 2 * len(table) <= len(table.values)
+
+
+def test_native_engine_keeps_first_record_and_logs_duplicates(tmp_path):
+    path = tmp_path / "viral.fna"
+    path.write_text(">NC_1 phage\nACGTTGCA\nGG\n"
+                    ">NC_2 same\nacgttgcagg\n"
+                    f">NC_3 reverse\n{reverse_complement('ACGTTGCAGG')}\n"
+                    ">NC_4 other\nTTTTTTTT\n")
+
+    output = refseq.filter_duplicates_native(str(path))
+
+    assert [line for line in open(output) if line.startswith(">")] == [">NC_1 phage\n", ">NC_4 other\n"]
+    assert open(tmp_path / "dedupe.log").read().splitlines() == [
+        "removed_id\tkept_id\tmatch", "NC_2\tNC_1\texact", "NC_3\tNC_1\treverse_complement"]
+
+
+def test_native_engine_batches_match_record_by_record(tmp_path, monkeypatch):
+    rng = random.Random(3)
+    sequences = ["".join(rng.choice("ACGT") for _ in range(30)) for _ in range(50)]
+    path = tmp_path / "viral.fna"
+    path.write_text("".join(f">r{i}\n{rng.choice([s, reverse_complement(s)])}\n"
+                            for i, s in enumerate(rng.choice(sequences) for _ in range(700))))
+    monkeypatch.setattr(refseq, "DIGEST_BATCH", 64)
+    refseq.filter_duplicates_native(str(path))
+
+    seen, kept = {}, []
+    for record in refseq.iter_fasta_records(str(path)):
+        key = refseq.sequence_digest(record)[:2]
+        if key not in seen:
+            seen[key] = record
+            kept.append(record)
+    assert open(refseq.filtered_path(str(path)), "rb").read() == b"".join(kept)
+
+
+@pytest.mark.parametrize("shards", [1, 7])
+def test_sharded_engine_matches_native_engine(tmp_path, monkeypatch, shards):
+    rng = random.Random(11)
+    sequences = ["".join(rng.choice("ACGT") for _ in range(rng.randint(5, 80))) for _ in range(40)]
+    fasta = "\n" + "".join(f">r{i} genome\n{rng.choice([s, s.lower(), reverse_complement(s)])}\n"
+                           for i, s in enumerate(rng.choice(sequences) for _ in range(600)))
+    for engine in ("native", "sharded"):
+        (tmp_path / engine).mkdir()
+        (tmp_path / engine / "viral.fna").write_text(fasta)
+    record_ranges = refseq.record_ranges
+    monkeypatch.setattr(refseq, "record_ranges", lambda path: record_ranges(path, 1000))  # Many small ranges
+
+    refseq.filter_duplicates_native(str(tmp_path / "native" / "viral.fna"))
+    refseq.filter_duplicates_sharded(str(tmp_path / "sharded" / "viral.fna"), threads=2, shards=shards)
+
+    for name in ("viral_filtered.fna", "dedupe.log"):
+        assert (tmp_path / "sharded" / name).read_bytes() == (tmp_path / "native" / name).read_bytes()
+    assert sorted(path.name for path in (tmp_path / "sharded").iterdir()) == ["dedupe.log", "viral.fna",
+                                                                              "viral_filtered.fna"]
+
+
+def test_record_ranges_start_at_records_and_cover_the_file(tmp_path):
+    path = tmp_path / "viral.fna"
+    path.write_bytes(b"".join(b">r%d\n%s\n" % (i, b"ACGT" * (i % 13)) for i in range(300)))
+    ranges = refseq.record_ranges(str(path), 100)
+    data = path.read_bytes()
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    assert all(data[start:start + 1] == b">" for start, _ in ranges)
@@ -0,0 +1,76 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from helpers import load_script, serve
+
+refseq = load_script("Downloading_RefSeq_Viral_Genomes_from_the_NCBI_Website/refseq_viral_genomes_website.py")
+
+PARTS = {"viral.1.1.genomic.fna": b">NC_000001.1 virus 1\nACGTACGT\nACG\n>NC_000002.1 virus 2\nTTTT\n",
+         "viral.2.1.genomic.fna": b">NC_000003.1 virus 3\nGGGGCCCC\n",
+         "viral.10.1.genomic.fna": b">NC_000004.1 virus 4\nAAAA\n"}
+# Listed out of order, with other files of the release directory in between
+INDEX = ('<html><body><a href="viral.10.1.genomic.fna.gz">viral.10.1.genomic.fna.gz</a>\n'
+         '<a href="viral.1.protein.faa.gz">viral.1.protein.faa.gz</a>\n'
+         '<a href="viral.2.1.genomic.fna.gz">viral.2.1.genomic.fna.gz</a>\n'
+         '<a href="viral.1.1.genomic.fna.gz">viral.1.1.genomic.fna.gz</a>\n'
+         '<a href="RELEASE_NUMBER">RELEASE_NUMBER</a></body></html>\n').encode()
+
+
+class ReleaseServer(BaseHTTPRequestHandler):
+    """Serves the release index at / and each part as a .fna.gz; parts in `missing` get a 404."""
+
+    lock = threading.Lock()
+    missing = set()
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        name = self.path.lstrip("/")
+        with self.lock:
+            ReleaseServer.requests.append(name)
+        if name == "":
+            body = INDEX
+        elif name.endswith(".gz") and name[:-len(".gz")] in PARTS and name not in self.missing:
+            body = gzip.compress(PARTS[name[:-len(".gz")]])
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def release_url():
+    ReleaseServer.missing, ReleaseServer.requests = set(), []
+    with serve(ReleaseServer) as url:
+        yield url + "/"
+
+
+def test_release_parts_are_listed_in_part_order(release_url):
+    assert refseq.list_release_parts(release_url) == [
+        f"{release_url}viral.1.1.genomic.fna.gz", f"{release_url}viral.2.1.genomic.fna.gz",
+        f"{release_url}viral.10.1.genomic.fna.gz"]
+
+
+def test_release_is_merged_in_part_order(tmp_path, release_url):
+    output = refseq.download_release(release_url, str(tmp_path), threads=3, downloader="parallel")
+
+    assert output == str(tmp_path / "viral.genomic.fna")
+    assert (tmp_path / "viral.genomic.fna").read_bytes() == b"".join(
+        PARTS[name] for name in ("viral.1.1.genomic.fna", "viral.2.1.genomic.fna", "viral.10.1.genomic.fna"))
+    assert [path.name for path in tmp_path.iterdir()] == ["viral.genomic.fna"]  # The parts were removed
+
+
+def test_failed_part_leaves_no_partial_release(tmp_path, release_url):
+    ReleaseServer.missing = {"viral.2.1.genomic.fna.gz"}
+    with pytest.raises(OSError):
+        refseq.download_release(release_url, str(tmp_path), threads=3, downloader="parallel")
+    assert list(tmp_path.iterdir()) == []
+    assert "viral.2.1.genomic.fna.gz" in ReleaseServer.requests
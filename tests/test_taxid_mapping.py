@@ -0,0 +1,106 @@
+import gzip
+
+import pytest
+
+from helpers import load_script
+
+mapping = load_script("create_viral_taxid_mapping_from_files/create_viral_taxid_mapping_from_files.py")
+
+ACCESSION2TAXID = (
+    "accession\taccession.version\ttaxid\tgi\n"
+    "AB000001\tAB000001.1\t11111\t1001\n"
+    "NC_001802\tNC_001802.1\t11676\t1002\n"
+    "MN908947\tMN908947.2\t694009\t1003\n"
+    "MN908947\tMN908947.3\t2697049\t1004\n"
+    "XX999999\tXX999999.1\t55555\t1005\n"
+    "NC_045512\tNC_045512.2\t2697049\t1006\n"
+    "OK091006\tOK091006.1\t10239\t1007\n"
+)
+FASTA = (">NC_001802.1 Human immunodeficiency virus 1, complete genome\nACGT\n"
+         ">MN908947.3 Severe acute respiratory syndrome coronavirus 2\nACGT\n"
+         ">NC_045512.2 Severe acute respiratory syndrome coronavirus 2\nAC\nGT\n"
+         ">ZZ000000.1 Virus with no taxid in the mapping\nACGT\n"
+         ">OK091006.1 Unclassified virus\nACGT\n")
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    fasta = tmp_path / "viral.fasta"
+    fasta.write_text(FASTA)
+    genbank = tmp_path / "nucl_gb.accession2taxid"
+    genbank.write_text(ACCESSION2TAXID)
+    (tmp_path / "nucl_gb.accession2taxid.gz").write_bytes(gzip.compress(ACCESSION2TAXID.encode()))
+    return tmp_path
+
+
+def two_step_mapping(directory):
+    """Output of the default filter_seq_ids / filter_taxid_mapping / create_taxid_mapping path."""
+    mapping.filter_seq_ids(str(directory / "viral.fasta"), str(directory / "seq_ids.txt"))
+    mapping.filter_taxid_mapping(str(directory / "nucl_gb.accession2taxid"), str(directory / "filtered.txt"), 2, 3)
+    mapping.create_taxid_mapping(str(directory / "seq_ids.txt"), str(directory / "filtered.txt"),
+                                 str(directory / "two_step.txt"))
+    return (directory / "two_step.txt").read_text()
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+@pytest.mark.parametrize("genbank", ["nucl_gb.accession2taxid", "nucl_gb.accession2taxid.gz"])
+def test_fused_join_matches_the_two_step_path(inputs, genbank, threads):
+    expected = two_step_mapping(inputs)
+    assert expected.split("\n") == ["NC_001802.1 11676", "MN908947.3 2697049", "NC_045512.2 2697049",
+                                    "OK091006.1 10239", ""]  # ZZ000000.1 has no taxid and is left out
+
+    block_size = ACCESSION2TAXID.index("MN908947.3") + 3  # Cuts the MN908947.3 line in the middle
+    output = inputs / "fused.txt"
+    mapped = mapping.join_taxid_mapping(str(inputs / "viral.fasta"), str(inputs / genbank), str(output),
+                                        threads=threads, block_size=block_size)
+    assert output.read_text() == expected
+    assert mapped == 4
+
+
+def test_line_ranges_end_on_line_boundaries(inputs):
+    path = str(inputs / "nucl_gb.accession2taxid")
+    ranges = mapping._line_ranges(path, 50)
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(ACCESSION2TAXID)
+    data = ACCESSION2TAXID.encode()
+    for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start and data[end - 1:end] == b"\n"
+
+
+def test_gzip_blocks_are_line_aligned(inputs):
+    blocks = list(mapping._gzip_blocks(str(inputs / "nucl_gb.accession2taxid.gz"), 50))
+    assert len(blocks) > 1
+    assert b"".join(blocks) == ACCESSION2TAXID.encode()
+    assert all(block.endswith(b"\n") for block in blocks)
+
+
+@pytest.fixture
+def index_file(inputs):
+    path = inputs / "nucl_gb.taxid.idx"
+    assert mapping.build_taxid_index(str(inputs / "nucl_gb.accession2taxid"), str(path), chunksize=3) == 7
+    return path
+
+
+def test_index_lookup_of_versioned_versionless_and_missing_accessions(index_file):
+    index = mapping.TaxidIndex(str(index_file))
+    assert len(index) == 7
+    # A versionless accession resolves to its latest version (MN908947.3 -> 2697049, not MN908947.2)
+    assert index.lookup(["NC_001802.1", "MN908947.2", "MN908947", "NC_045512", "NC_001802.2", "ZZ000000.1",
+                         "ZZ000000", "A" * 40, ""]) == [11676, 694009, 2697049, 2697049, None, None, None, None, None]
+    assert index.lookup([]) == []
+
+
+def test_saved_index_is_reopened_without_the_source_file(inputs, index_file):
+    (inputs / "nucl_gb.accession2taxid").unlink()
+    reopened = mapping.TaxidIndex(str(index_file))
+    assert reopened.lookup(["XX999999.1", "AB000001", "OK091006.1"]) == [55555, 11111, 10239]
+
+    not_an_index = inputs / "viral.fasta"
+    with pytest.raises(ValueError):
+        mapping.TaxidIndex(str(not_an_index))
+
+
+def test_index_mapping_agrees_with_the_dict_based_mapping(inputs, index_file):
+    expected = two_step_mapping(inputs)
+    mapping.create_taxid_mapping_from_index(str(inputs / "seq_ids.txt"), str(index_file), str(inputs / "indexed.txt"))
+    assert (inputs / "indexed.txt").read_text() == expected